@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from decimal import Decimal, InvalidOperation
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from psycopg import AsyncCursor, Cursor
+
+    from Leverage.dbstats import StatementStats
+
+
+class LRUCache[K: Hashable, V]:
+    """
+    A bounded mapping that evicts the least recently used entry when full.
+    """
+
+    def __init__(self, maxsize: int):
+        if maxsize <= 0:
+            raise ValueError("LRUCache maxsize must be positive.")
+        self.maxsize = maxsize
+        self.data: OrderedDict[K, V] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: K) -> V | None:
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key: K) -> V | None:
+        return self.data.pop(key, None)
+
+
+def _normalize(value: object) -> object:
+    # Items carry strings ("2", "1200") or JSON numbers, the database returns
+    # Decimals and ints. Compare them as numbers where possible.
+    if value is None or isinstance(value, bool):
+        return value
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return str(value)
+
+
+def attributes_hash(*values: object) -> int:
+    """
+    Hash row attributes so that equal values from an item and from the database
+    produce the same hash.
+    """
+    return hash(tuple(_normalize(value) for value in values))
+
+
+class IdentityMap:
+    """
+    In-process cache of database IDs for properties, floorplans and units.
+
+    Floorplan and unit entries store the ID together with a hash of the row
+    attributes, so callers can skip upserts when nothing has changed. Entries
+    for a property are bulk-loaded with one query the first time it is seen.
+
+    With load_prices (PRICE_HISTORY_MODE = "interval"), the open price interval
+    of each unit is loaded alongside, as its last known price state.
+    """
+
+    WARM_QUERY = """
+        SELECT
+            p.property_id,
+            f.floorplan_id,
+            f.plan_name,
+            f.bedrooms,
+            f.bathrooms,
+            f.square_footage,
+            u.unit_id,
+            u.building_name,
+            u.unit_number,
+            u.floor_number,
+            u.is_on_top_floor{price_columns}
+        FROM properties p
+        LEFT JOIN floorplans f ON f.property_id = p.property_id
+        LEFT JOIN apartment_units u ON u.floorplan_id = f.floorplan_id{price_join}
+        WHERE p.url = %s;
+    """
+
+    # Only joined in "interval" mode, price_intervals may not exist otherwise
+    PRICE_COLUMNS = """,
+            i.valid_from,
+            i.rent_usd,
+            i.deposit_usd,
+            i.min_lease_term_months,
+            i.is_available,
+            i.available_date"""
+
+    PRICE_JOIN = """
+        LEFT JOIN price_intervals i ON (
+            i.unit_id = u.unit_id
+            AND i.valid_to IS NULL
+        )"""
+
+    def __init__(
+        self,
+        maxsize: int,
+        db_stats: StatementStats | None = None,
+        load_prices: bool = False,
+    ):
+        self.db_stats = db_stats
+        self.load_prices = load_prices
+        self.warm_query = self.WARM_QUERY.format(
+            price_columns=self.PRICE_COLUMNS if load_prices else "",
+            price_join=self.PRICE_JOIN if load_prices else "",
+        )
+        # url -> property_id
+        self.properties: LRUCache[str, int] = LRUCache(maxsize)
+        # (property_id, plan_name) -> (floorplan_id, attributes hash)
+        self.floorplans: LRUCache[tuple, tuple[int, int]] = LRUCache(maxsize)
+        # (property_id, building_name, unit_number) -> (unit_id, attributes hash)
+        self.units: LRUCache[tuple, tuple[int, int]] = LRUCache(maxsize)
+        # unit_id -> (price state hash, valid_from of the open interval)
+        self.price_states: LRUCache[int, tuple[int, object]] = LRUCache(maxsize)
+
+    @staticmethod
+    def floorplan_hash(bedrooms, bathrooms, square_footage) -> int:
+        return attributes_hash(bedrooms, bathrooms, square_footage)
+
+    @staticmethod
+    def unit_hash(floorplan_id, floor_number, is_on_top_floor) -> int:
+        return attributes_hash(floorplan_id, floor_number, is_on_top_floor)
+
+    @staticmethod
+    def price_hash(
+        rent_usd, deposit_usd, min_lease_term_months, is_available, available_date
+    ) -> int:
+        return attributes_hash(
+            rent_usd, deposit_usd, min_lease_term_months, is_available, available_date
+        )
+
+    def property_id(self, cur: Cursor, url: str) -> int | None:
+        """
+        Get the property_id for a URL, warming the cache for that property on a miss.
+        """
+        property_id = self.properties.get(url)
+        if property_id is None:
+            property_id = self.warm(cur, url)
+        return property_id
+
+    def warm(self, cur: Cursor, url: str) -> int | None:
+        if self.db_stats is not None:
+            self.db_stats.execute(cur, "warm_identity_map", self.warm_query, (url,))
+        else:
+            cur.execute(self.warm_query, (url,))
+        return self.load_rows(url, cur.fetchall())
+
+    async def property_id_async(self, cur: AsyncCursor, url: str) -> int | None:
+        property_id = self.properties.get(url)
+        if property_id is None:
+            property_id = await self.warm_async(cur, url)
+        return property_id
+
+    async def warm_async(self, cur: AsyncCursor, url: str) -> int | None:
+        if self.db_stats is not None:
+            await self.db_stats.execute_async(
+                cur, "warm_identity_map", self.warm_query, (url,)
+            )
+        else:
+            await cur.execute(self.warm_query, (url,))
+        return self.load_rows(url, await cur.fetchall())
+
+    def load_rows(self, url: str, rows: list[tuple]) -> int | None:
+        if not rows:
+            return None
+
+        for row in rows:
+            self.load_row(row)
+
+        property_id = rows[0][0]
+        self.properties.put(url, property_id)
+        return property_id
+
+    def load_row(self, row: tuple) -> None:
+        (
+            property_id,
+            floorplan_id,
+            plan_name,
+            bedrooms,
+            bathrooms,
+            square_footage,
+            unit_id,
+            building_name,
+            unit_number,
+            floor_number,
+            is_on_top_floor,
+            *price_columns,
+        ) = row
+
+        if floorplan_id is not None:
+            self.floorplans.put(
+                (property_id, plan_name),
+                (
+                    floorplan_id,
+                    self.floorplan_hash(bedrooms, bathrooms, square_footage),
+                ),
+            )
+        if unit_id is not None:
+            self.units.put(
+                (property_id, building_name, unit_number),
+                (
+                    unit_id,
+                    self.unit_hash(floorplan_id, floor_number, is_on_top_floor),
+                ),
+            )
+        if price_columns and price_columns[0] is not None:
+            valid_from, *price_state = price_columns
+            self.price_states.put(unit_id, (self.price_hash(*price_state), valid_from))
+
+    def cached_id(
+        self, cache: LRUCache[tuple, tuple[int, int]], key: tuple, attrs: int
+    ) -> int | None:
+        """
+        Return the cached ID for key if its stored attributes hash matches attrs.
+        """
+        entry = cache.get(key)
+        if entry is None or entry[1] != attrs:
+            return None
+        return entry[0]
@@ -0,0 +1,345 @@
+"""
+Postgres-backed crawl task queue shared by every process running a spider.
+
+Tasks are queued in rounds. The first worker to find the spider's latest
+round finished (no pending or leased tasks left) seeds a new round with the
+planned properties (see Leverage.planner); later workers join the open round.
+Workers then claim small batches with FOR UPDATE SKIP LOCKED, so no two
+workers lease the same task, and hold each task for CRAWL_TASK_LEASE_SECONDS.
+A task is done once its property's first request gets a successful response,
+whether or not it yields items. Tasks of a crashed worker become claimable
+again when their lease expires, until CRAWL_TASK_MAX_ATTEMPTS is reached.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from collections.abc import AsyncIterator, Callable, Iterable
+from dataclasses import dataclass
+from itertools import batched
+from typing import TYPE_CHECKING
+
+import psycopg
+from scrapy import signals
+
+from Leverage.planner import property_response_url
+
+if TYPE_CHECKING:
+    from psycopg import AsyncConnection, Connection
+    from scrapy import Request, Spider
+    from scrapy.crawler import Crawler
+    from scrapy.http import Response
+    from scrapy.statscollectors import StatsCollector
+
+
+@dataclass
+class CrawlTask:
+    task_id: int
+    property_id: int
+    url: str
+    site_id: str | None = None
+    template_engine: str | None = None
+
+
+class CrawlTaskQueue:
+    """
+    Claims and completes crawl_tasks rows for one spider on behalf of one worker.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Held while checking for open tasks and seeding, so concurrent workers
+    # seed a round only once
+    SEED_LOCK_QUERY = "SELECT pg_advisory_xact_lock(hashtext('crawl_tasks:' || %s));"
+
+    # The spider's latest round and whether it still has tasks to crawl
+    LATEST_ROUND_QUERY = """
+        SELECT round_id, bool_or(status IN ('pending', 'leased'))
+        FROM crawl_tasks
+        WHERE spider = %s
+            AND round_id = (SELECT max(round_id) FROM crawl_tasks WHERE spider = %s)
+        GROUP BY round_id;
+    """
+
+    # Tasks inserted per executemany() while seeding
+    SEED_BATCH_SIZE = 500
+
+    SEED_QUERY = """
+        INSERT INTO crawl_tasks (spider, round_id, property_id, url, priority)
+        VALUES (%(spider)s, %(round_id)s, %(property_id)s, %(url)s, %(priority)s)
+        ON CONFLICT (spider, round_id, property_id)
+            WHERE status IN ('pending', 'leased')
+        DO NOTHING;
+    """
+
+    # Expired leases that used up their attempts are given up on
+    EXPIRE_QUERY = """
+        UPDATE crawl_tasks
+        SET status = 'failed', finished_at = now(), last_error = 'lease expired'
+        WHERE spider = %(spider)s
+            AND round_id = %(round_id)s
+            AND status = 'leased'
+            AND leased_until < now()
+            AND attempts >= %(max_attempts)s;
+    """
+
+    CLAIM_QUERY = """
+        WITH claimable AS (
+            SELECT task_id
+            FROM crawl_tasks
+            WHERE spider = %(spider)s
+                AND round_id = %(round_id)s
+                AND (
+                    status = 'pending'
+                    OR (status = 'leased' AND leased_until < now())
+                )
+                AND attempts < %(max_attempts)s
+            ORDER BY priority DESC, task_id
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE crawl_tasks t
+        SET status = 'leased',
+            leased_by = %(worker)s,
+            leased_until = now() + make_interval(secs => %(lease_seconds)s),
+            attempts = t.attempts + 1
+        FROM claimable c, properties p
+        WHERE t.task_id = c.task_id AND p.property_id = t.property_id
+        RETURNING t.task_id, t.property_id, t.url, p.site_id, p.template_engine;
+    """
+
+    # Keep the leases of tasks still being crawled by this worker
+    RENEW_QUERY = """
+        UPDATE crawl_tasks
+        SET leased_until = now() + make_interval(secs => %(lease_seconds)s)
+        WHERE task_id = ANY(%(task_ids)s)
+            AND status = 'leased'
+            AND leased_by = %(worker)s;
+    """
+
+    DONE_QUERY = """
+        UPDATE crawl_tasks
+        SET status = 'done', finished_at = now(), leased_until = NULL
+        WHERE task_id = ANY(%(task_ids)s)
+            AND status = 'leased'
+            AND leased_by = %(worker)s;
+    """
+
+    # Leased tasks without a successful response when the worker closes. After
+    # a finished crawl their requests failed (RetryMiddleware already retried
+    # them), so they fail with the round; otherwise (shutdown, timeout) they
+    # go back to the round as if never claimed.
+    RELEASE_QUERY = """
+        UPDATE crawl_tasks
+        SET status = CASE
+                WHEN %(failed)s THEN 'failed'
+                ELSE 'pending'
+            END::crawl_task_status,
+            attempts = CASE WHEN %(failed)s THEN attempts ELSE attempts - 1 END,
+            finished_at = CASE WHEN %(failed)s THEN now() END,
+            last_error = CASE WHEN %(failed)s THEN 'no successful response' END,
+            leased_by = NULL,
+            leased_until = NULL
+        WHERE task_id = ANY(%(task_ids)s)
+            AND status = 'leased'
+            AND leased_by = %(worker)s;
+    """
+
+    # Live leases held by other workers, which may still expire and need a retry
+    LEASED_ELSEWHERE_QUERY = """
+        SELECT EXISTS (
+            SELECT 1 FROM crawl_tasks
+            WHERE spider = %(spider)s
+                AND round_id = %(round_id)s
+                AND status = 'leased'
+                AND leased_by <> %(worker)s
+                AND attempts < %(max_attempts)s
+        );
+    """
+
+    def __init__(
+        self,
+        db_dsn: str,
+        spider_name: str,
+        stats: StatsCollector | None = None,
+        worker: str | None = None,
+        batch_size: int = 10,
+        lease_seconds: float = 900,
+        max_attempts: int = 3,
+        poll_seconds: float = 30,
+    ):
+        self.db_dsn = db_dsn
+        self.spider_name = spider_name
+        self.stats = stats
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+
+        # Round this worker claims from, set by seed()
+        self.round_id: int | None = None
+        # Property URL -> task_id of tasks leased and not yet done
+        self.leased: dict[str, int] = {}
+        # Done since the last write, written on the next claim or at close
+        self.done: list[int] = []
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, spider_name: str) -> CrawlTaskQueue:
+        settings = crawler.settings
+        queue = cls(
+            settings.get("DB_DSN"),
+            spider_name,
+            crawler.stats,
+            batch_size=settings.getint("CRAWL_TASK_BATCH_SIZE", 10),
+            lease_seconds=settings.getfloat("CRAWL_TASK_LEASE_SECONDS", 900),
+            max_attempts=settings.getint("CRAWL_TASK_MAX_ATTEMPTS", 3),
+            poll_seconds=settings.getfloat("CRAWL_TASK_POLL_SECONDS", 30),
+        )
+        crawler.signals.connect(
+            queue.response_received, signal=signals.response_received
+        )
+        crawler.signals.connect(queue.spider_closed, signal=signals.spider_closed)
+        return queue
+
+    def inc_stat(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(f"crawl_tasks/{key}", count)
+
+    def params(self, **kwargs) -> dict:
+        return {
+            "spider": self.spider_name,
+            "round_id": self.round_id,
+            "worker": self.worker,
+            "max_attempts": self.max_attempts,
+            "lease_seconds": self.lease_seconds,
+            "batch_size": self.batch_size,
+            **kwargs,
+        }
+
+    def seed(
+        self, conn: Connection, load_properties: Callable[[], Iterable[dict]]
+    ) -> int:
+        """
+        Join the spider's latest round if it still has tasks to crawl, or
+        queue the properties from load_properties() as a new round. Properties
+        carry property_id, url and optionally a score, used as the task
+        priority. They are inserted as they are read, so load_properties()
+        may stream them from a server-side cursor on conn. Returns the number
+        of tasks queued.
+        """
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(self.SEED_LOCK_QUERY, (self.spider_name,))
+            cur.execute(self.LATEST_ROUND_QUERY, (self.spider_name,) * 2)
+            latest_round, is_open = cur.fetchone() or (0, False)
+            if is_open:
+                self.round_id = latest_round
+                self.logger.info(
+                    f"Joining crawl task round {latest_round} of {self.spider_name}."
+                )
+                return 0
+
+            self.round_id = latest_round + 1
+            params = (
+                self.params(
+                    property_id=entry["property_id"],
+                    url=entry["url"],
+                    priority=entry.get("score", 0),
+                )
+                for entry in load_properties()
+                if entry.get("url")
+            )
+            seeded = 0
+            for batch in batched(params, self.SEED_BATCH_SIZE):
+                cur.executemany(self.SEED_QUERY, batch)
+                seeded += len(batch)
+
+        self.logger.info(
+            f"Queued {seeded} crawl tasks for {self.spider_name}, "
+            f"round {self.round_id}."
+        )
+        self.inc_stat("seeded", seeded)
+        return seeded
+
+    async def claim(self, conn: AsyncConnection) -> list[CrawlTask]:
+        async with conn.transaction(), conn.cursor() as cur:
+            await cur.execute(self.EXPIRE_QUERY, self.params())
+            if cur.rowcount > 0:
+                self.inc_stat("expired", cur.rowcount)
+
+            if self.done:
+                await cur.execute(self.DONE_QUERY, self.params(task_ids=self.done))
+                self.done = []
+            if self.leased:
+                await cur.execute(
+                    self.RENEW_QUERY, self.params(task_ids=list(self.leased.values()))
+                )
+
+            await cur.execute(self.CLAIM_QUERY, self.params())
+            tasks = [CrawlTask(*row) for row in await cur.fetchall()]
+
+        for task in tasks:
+            self.leased[task.url] = task.task_id
+        self.inc_stat("claimed", len(tasks))
+        return tasks
+
+    async def leased_elsewhere(self, conn: AsyncConnection) -> bool:
+        async with conn.cursor() as cur:
+            await cur.execute(self.LEASED_ELSEWHERE_QUERY, self.params())
+            return (await cur.fetchone())[0]
+
+    async def tasks(self) -> AsyncIterator[CrawlTask]:
+        """
+        Claim tasks lease by lease until the queue is drained.
+
+        The next batch is claimed once the engine asks for more start requests,
+        so a worker only leases what it is about to crawl. While other workers
+        hold leases that may still expire, keep polling instead of stopping.
+        """
+        async with await psycopg.AsyncConnection.connect(
+            self.db_dsn, autocommit=True
+        ) as conn:
+            while True:
+                tasks = await self.claim(conn)
+                for task in tasks:
+                    yield task
+                if tasks:
+                    continue
+                if not await self.leased_elsewhere(conn):
+                    return
+                await asyncio.sleep(self.poll_seconds)
+
+    def response_received(
+        self, response: Response, request: Request, spider: Spider
+    ) -> None:
+        task_id = self.leased.pop(property_response_url(response, request), None)
+        if task_id is not None:
+            self.done.append(task_id)
+            self.inc_stat("done")
+
+    def spider_closed(self, spider: Spider, reason: str) -> None:
+        failed = reason == "finished"
+        try:
+            with (
+                psycopg.connect(self.db_dsn, autocommit=True) as conn,
+                conn.cursor() as cur,
+            ):
+                if self.done:
+                    cur.execute(self.DONE_QUERY, self.params(task_ids=self.done))
+                    self.done = []
+                if self.leased:
+                    cur.execute(
+                        self.RELEASE_QUERY,
+                        self.params(task_ids=list(self.leased.values()), failed=failed),
+                    )
+        except psycopg.Error as e:
+            # Leases expire on their own, other workers will retry
+            self.logger.error(f"Failed to complete crawl tasks: {e}")
+            return
+
+        if self.leased:
+            self.inc_stat("failed" if failed else "released", len(self.leased))
+            self.leased = {}
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+
+import psycopg
+from scrapy import signals
+
+if TYPE_CHECKING:
+    from psycopg import AsyncCursor, Cursor
+    from scrapy import Spider
+    from scrapy.crawler import Crawler
+    from scrapy.statscollectors import StatsCollector
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with a fixed memory footprint.
+
+    Bucket bounds grow by 5%, so reported percentiles are within 5% of the
+    exact value.
+    """
+
+    GROWTH = 1.05
+    # Smallest tracked latency, in seconds
+    FLOOR = 1e-5
+
+    def __init__(self):
+        self.buckets: dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.buckets[self.bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def bucket(self, seconds: float) -> int:
+        if seconds <= self.FLOOR:
+            return 0
+        return math.ceil(math.log(seconds / self.FLOOR, self.GROWTH))
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th percentile, in seconds.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q / 100 * self.count)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.FLOOR * self.GROWTH**index, self.max)
+        return self.max
+
+
+class StatementStats:
+    """
+    Times named database statements and records the results in the stats.
+
+    Per statement: call count, rows affected and p50/p95/p99/max latency.
+    Statements slower than slow_ms are sampled with their parameters and,
+    when explain is enabled, an EXPLAIN (ANALYZE, BUFFERS) plan. The plan is
+    taken by re-running the statement in a transaction that is rolled back.
+
+    One instance is shared per crawler (see from_crawler) and dumped into the
+    stats when the spider closes.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        stats: StatsCollector | None = None,
+        slow_ms: float = 250,
+        explain: bool = False,
+        max_slow_samples: int = 5,
+    ):
+        self.stats = stats
+        self.slow_seconds = slow_ms / 1000
+        self.explain = explain
+        self.max_slow_samples = max_slow_samples
+
+        self.histograms: dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.rows: dict[str, int] = defaultdict(int)
+        self.slow_samples: dict[str, list[dict]] = defaultdict(list)
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> StatementStats:
+        # Shared by every pipeline of the crawler
+        db_stats = getattr(crawler, "statement_stats", None)
+        if db_stats is None:
+            settings = crawler.settings
+            db_stats = cls(
+                crawler.stats,
+                slow_ms=settings.getfloat("DB_STATS_SLOW_MS", 250),
+                explain=settings.getbool("DB_STATS_EXPLAIN_SLOW", False),
+                max_slow_samples=settings.getint("DB_STATS_SLOW_SAMPLES", 5),
+            )
+            crawler.statement_stats = db_stats
+            # After every pipeline's close_spider, so final flushes are included
+            crawler.signals.connect(
+                db_stats.spider_closed, signal=signals.spider_closed
+            )
+        return db_stats
+
+    def execute(
+        self, cur: Cursor, name: str, query: str, params: Any = None, **kwargs
+    ) -> Cursor:
+        started = time.perf_counter()
+        cur.execute(query, params, **kwargs)
+        elapsed = time.perf_counter() - started
+
+        self.record(name, elapsed, cur.rowcount)
+        if self.is_sampled(name, elapsed):
+            plan = self.explain_plan(cur, query, params) if self.explain else None
+            self.add_slow_sample(name, elapsed, params, plan)
+        return cur
+
+    def executemany(
+        self, cur: Cursor, name: str, query: str, params_seq: list, **kwargs
+    ) -> Cursor:
+        started = time.perf_counter()
+        cur.executemany(query, params_seq, **kwargs)
+        self.record(name, time.perf_counter() - started, cur.rowcount)
+        return cur
+
+    async def execute_async(
+        self, cur: AsyncCursor, name: str, query: str, params: Any = None, **kwargs
+    ) -> AsyncCursor:
+        started = time.perf_counter()
+        await cur.execute(query, params, **kwargs)
+        elapsed = time.perf_counter() - started
+
+        self.record(name, elapsed, cur.rowcount)
+        if self.is_sampled(name, elapsed):
+            plan = None
+            if self.explain:
+                plan = await self.explain_plan_async(cur, query, params)
+            self.add_slow_sample(name, elapsed, params, plan)
+        return cur
+
+    def record(self, name: str, seconds: float, rowcount: int) -> None:
+        self.histograms[name].add(seconds)
+        if rowcount > 0:
+            self.rows[name] += rowcount
+
+    def is_sampled(self, name: str, seconds: float) -> bool:
+        return (
+            seconds >= self.slow_seconds
+            and len(self.slow_samples[name]) < self.max_slow_samples
+        )
+
+    def add_slow_sample(
+        self, name: str, seconds: float, params: Any, plan: str | None
+    ) -> None:
+        sample = {"ms": round(seconds * 1000, 2), "params": repr(params)[:1000]}
+        if plan is not None:
+            sample["plan"] = plan
+        self.slow_samples[name].append(sample)
+        self.logger.warning(f"Slow statement {name}: {sample['ms']} ms.")
+
+    def explain_plan(self, cur: Cursor, query: str, params: Any) -> str | None:
+        # EXPLAIN ANALYZE runs the statement again; never keep its writes
+        # Use a separate cursor so the caller can still fetch its own results
+        try:
+            with (
+                cur.connection.transaction(force_rollback=True),
+                cur.connection.cursor() as explain_cur,
+            ):
+                explain_cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+                return "\n".join(row[0] for row in explain_cur.fetchall())
+        except psycopg.Error as e:
+            self.logger.warning(f"Failed to EXPLAIN slow statement: {e}")
+            return None
+
+    async def explain_plan_async(
+        self, cur: AsyncCursor, query: str, params: Any
+    ) -> str | None:
+        try:
+            async with (
+                cur.connection.transaction(force_rollback=True),
+                cur.connection.cursor() as explain_cur,
+            ):
+                await explain_cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+                return "\n".join(row[0] for row in await explain_cur.fetchall())
+        except psycopg.Error as e:
+            self.logger.warning(f"Failed to EXPLAIN slow statement: {e}")
+            return None
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        summary = {}
+        for name, histogram in sorted(self.histograms.items()):
+            summary[name] = {
+                "count": histogram.count,
+                "rows": self.rows[name],
+                "p50_ms": round(histogram.percentile(50) * 1000, 3),
+                "p95_ms": round(histogram.percentile(95) * 1000, 3),
+                "p99_ms": round(histogram.percentile(99) * 1000, 3),
+                "max_ms": round(histogram.max * 1000, 3),
+                "total_ms": round(histogram.total * 1000, 3),
+            }
+        return summary
+
+    def dump(self) -> None:
+        if self.stats is None:
+            return
+        for name, values in self.summary().items():
+            for key, value in values.items():
+                self.stats.set_value(f"dbstats/{name}/{key}", value)
+        for name, samples in self.slow_samples.items():
+            self.stats.set_value(f"dbstats/{name}/slow_samples", samples)
+
+        for name, samples in self.slow_samples.items():
+            for sample in samples:
+                if "plan" in sample:
+                    self.logger.info(
+                        f"Slow {name} ({sample['ms']} ms, params={sample['params']}):\n"
+                        f"{sample['plan']}"
+                    )
+
+    def spider_closed(self, spider: Spider):
+        self.dump()
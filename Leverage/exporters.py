@@ -0,0 +1,207 @@
+# Define your feed exporters here
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/exporters.html
+from __future__ import annotations
+
+from collections.abc import Callable
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from scrapy.exporters import BaseItemExporter
+
+from Leverage.items import PromoItem, PropertyItem, UnitItem
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+if TYPE_CHECKING:
+    from scrapy import Item
+
+
+def _to_str(value: Any) -> str | None:
+    if value is None:
+        return None
+    return str(value).strip()
+
+
+def _to_decimal(value: Any) -> Decimal | None:
+    if value is None or isinstance(value, bool):
+        return None
+    text = str(value).replace("$", "").replace(",", "").strip()
+    try:
+        return Decimal(text).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return None
+
+
+def _to_int(value: Any) -> int | None:
+    number = _to_decimal(value)
+    return int(number) if number is not None else None
+
+
+def _to_float(value: Any) -> float | None:
+    number = _to_decimal(value)
+    return float(number) if number is not None else None
+
+
+def _to_bool(value: Any) -> bool | None:
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes"):
+        return True
+    if text in ("false", "0", "no"):
+        return False
+    return None
+
+
+def _to_date(value: Any) -> date | None:
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _to_timestamp(value: Any) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _schemas() -> dict[type, dict[str, tuple[pa.DataType, Callable]]]:
+    # Fields missing here are exported as strings
+    money = (pa.decimal128(10, 2), _to_decimal)
+    timestamp = (pa.timestamp("us", tz="UTC"), _to_timestamp)
+    return {
+        PropertyItem: {
+            "scraped_at": timestamp,
+        },
+        UnitItem: {
+            "scraped_at": timestamp,
+            "rent_usd": money,
+            "deposit_usd": money,
+            "application_fee": money,
+            "available_date": (pa.date32(), _to_date),
+            "is_available": (pa.bool_(), _to_bool),
+            "min_lease_term_months": (pa.int16(), _to_int),
+            "floor_number": (pa.int32(), _to_int),
+            "top_floor": (pa.bool_(), _to_bool),
+            "num_bedrooms": (pa.float32(), _to_float),
+            "num_bathrooms": (pa.float32(), _to_float),
+            "square_footage": (pa.int32(), _to_int),
+        },
+        PromoItem: {
+            "scraped_at": timestamp,
+            "has_available_units": (pa.bool_(), _to_bool),
+        },
+    }
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """
+    Writes items of a single class to a typed Parquet file.
+
+    Rows are buffered per column and written as one row group every
+    row_group_size items. Repetitive string columns are dictionary encoded.
+    Use the "item_classes" feed option to send each item class to its own file.
+    """
+
+    DICTIONARY_COLUMNS = (
+        "company_name",
+        "template_engine",
+        "city",
+        "state",
+        "property_url",
+        "floorplan_name",
+        "floorplan_id",
+        "building_name",
+    )
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        *,
+        row_group_size: int = 50_000,
+        compression: str = "zstd",
+        **kwargs: Any,
+    ):
+        if pa is None:
+            raise ImportError(
+                "ParquetItemExporter requires pyarrow, install the 'parquet' extra."
+            )
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+        self.item_class: type | None = None
+        self.converters: dict[str, Callable] = {}
+        self.schema: pa.Schema | None = None
+        self.writer: pq.ParquetWriter | None = None
+        self.columns: dict[str, list] = {}
+        self.buffered = 0
+
+    def export_item(self, item: Item) -> None:
+        if self.item_class is None:
+            self.configure_schema(type(item))
+        elif type(item) is not self.item_class:
+            raise ValueError(
+                f"ParquetItemExporter got {type(item).__name__} in a "
+                f"{self.item_class.__name__} file, set item_classes on the feed."
+            )
+
+        for name, convert in self.converters.items():
+            self.columns[name].append(convert(item.get(name)))
+        self.buffered += 1
+
+        if self.buffered >= self.row_group_size:
+            self.write_row_group()
+
+    def finish_exporting(self) -> None:
+        if self.buffered:
+            self.write_row_group()
+        if self.writer is not None:
+            self.writer.close()
+
+    def configure_schema(self, item_class: type) -> None:
+        self.item_class = item_class
+        types = _schemas().get(item_class, {})
+
+        if self.fields_to_export:
+            names = list(self.fields_to_export)
+        else:
+            names = list(item_class.fields)
+
+        fields = []
+        for name in names:
+            data_type, convert = types.get(name, (pa.string(), _to_str))
+            fields.append(pa.field(name, data_type))
+            self.converters[name] = convert
+            self.columns[name] = []
+        self.schema = pa.schema(fields)
+
+        self.writer = pq.ParquetWriter(
+            self.file,
+            self.schema,
+            compression=self.compression,
+            use_dictionary=[name for name in names if name in self.DICTIONARY_COLUMNS],
+        )
+
+    def write_row_group(self) -> None:
+        batch = pa.record_batch(
+            [self.columns[name] for name in self.schema.names], schema=self.schema
+        )
+        self.writer.write_batch(batch, row_group_size=self.buffered)
+        for values in self.columns.values():
+            values.clear()
+        self.buffered = 0
@@ -0,0 +1,222 @@
+# Define your feed storages here
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/feed-exports.html#storages
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import queue
+import threading
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+from twisted.internet.threads import deferToThread
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from scrapy import Spider
+    from scrapy.crawler import Crawler
+    from scrapy.statscollectors import StatsCollector
+    from twisted.internet.defer import Deferred
+
+
+logger = logging.getLogger(__name__)
+
+PART_SUFFIX = ".part"
+
+
+def _open_compressed(path: str, compression: str, level: int | None) -> BinaryIO:
+    if compression == "zstd":
+        return zstandard.open(
+            path, "wb", cctx=zstandard.ZstdCompressor(level=level or 3)
+        )
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=level or 6)
+    return open(path, "wb")
+
+
+class RotatingFile:
+    """
+    File-like object handed to the feed exporter.
+
+    write() only queues the data; a background thread compresses it into the
+    current segment and starts a new segment once rotate_bytes (uncompressed) or
+    rotate_items writes are reached. Rotation only happens between writes, and
+    the jsonlines exporter writes one item per call, so every segment holds
+    whole items and is a complete compressed stream on its own.
+
+    Segments are written as "<name>.part" and renamed when complete. Finished
+    segments are listed in `segments`; RotatingFeedStorage counts them in the
+    stats once the thread is done, from the reactor thread.
+    """
+
+    # What the writer thread can hit on disk or in the compressor
+    WRITE_ERRORS: tuple[type[Exception], ...] = (OSError, ValueError, zlib.error)
+    if zstandard is not None:
+        WRITE_ERRORS += (zstandard.ZstdError,)
+
+    def __init__(
+        self,
+        path: str,
+        compression: str,
+        level: int | None = None,
+        rotate_bytes: int = 0,
+        rotate_items: int = 0,
+        queue_size: int = 10_000,
+    ):
+        self.path = path
+        self.compression = compression
+        self.level = level
+        self.rotate_bytes = rotate_bytes
+        self.rotate_items = rotate_items
+
+        # Bounded, so a stalled disk eventually pushes back instead of growing memory
+        self.queue: queue.Queue[bytes | None] = queue.Queue(maxsize=queue_size)
+        self.error: Exception | None = None
+        self.closed = False
+        self.segments: list[str] = []
+
+        self.thread = threading.Thread(
+            target=self.run, name=f"RotatingFile({path})", daemon=True
+        )
+        self.thread.start()
+
+    def write(self, data: bytes) -> int:
+        if self.error is not None:
+            raise OSError(f"Writing feed {self.path} failed") from self.error
+        self.queue.put(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """
+        Finish the current segment and wait for the writer thread. Blocking.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise OSError(f"Writing feed {self.path} failed") from self.error
+
+    def segment_path(self, index: int) -> str:
+        base, ext = os.path.splitext(self.path)
+        suffix = {"zstd": ".zst", "gzip": ".gz"}.get(self.compression, "")
+        return f"{base}.{index:05d}{ext}{suffix}"
+
+    def run(self) -> None:
+        segment: BinaryIO | None = None
+        segment_path = ""
+        segment_bytes = segment_items = 0
+        try:
+            while (data := self.queue.get()) is not None:
+                if segment is None:
+                    segment_path = self.segment_path(len(self.segments))
+                    segment = _open_compressed(
+                        segment_path + PART_SUFFIX, self.compression, self.level
+                    )
+                    segment_bytes = segment_items = 0
+
+                segment.write(data)
+                segment_bytes += len(data)
+                segment_items += 1
+
+                if (self.rotate_bytes and segment_bytes >= self.rotate_bytes) or (
+                    self.rotate_items and segment_items >= self.rotate_items
+                ):
+                    self.finish_segment(segment, segment_path)
+                    segment = None
+
+            if segment is not None:
+                self.finish_segment(segment, segment_path)
+        except self.WRITE_ERRORS as e:
+            logger.error(f"Writing feed segment {segment_path} failed: {e}")
+            self.error = e
+            # Keep draining so write() never blocks on a full queue
+            while self.queue.get() is not None:
+                pass
+
+    def finish_segment(self, segment: BinaryIO, path: str) -> None:
+        segment.close()
+        os.replace(path + PART_SUFFIX, path)
+        self.segments.append(path)
+        logger.info(f"Finished feed segment {path}.")
+
+
+class RotatingFeedStorage:
+    """
+    Feed storage for "rotating:<path>" URIs.
+
+    Output is split into independently readable, compressed segments next to
+    <path>. Feed options:
+
+    - compression: "zstd" (needs zstandard), "gzip" or "none". Defaults to zstd
+      when available, gzip otherwise.
+    - compression_level: passed to the compressor
+    - rotate_bytes: start a new segment after this many uncompressed bytes
+    - rotate_items: start a new segment after this many items
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        *,
+        feed_options: dict[str, Any] | None = None,
+        stats: StatsCollector | None = None,
+    ):
+        feed_options = feed_options or {}
+        self.path = uri.split(":", 1)[1]
+        self.stats = stats
+
+        self.compression = feed_options.get(
+            "compression", "zstd" if zstandard is not None else "gzip"
+        )
+        if self.compression not in ("zstd", "gzip", "none"):
+            raise ValueError(
+                f"Invalid feed compression={self.compression!r}, "
+                "expected 'zstd', 'gzip' or 'none'."
+            )
+        if self.compression == "zstd" and zstandard is None:
+            raise ValueError("zstd feed compression requires the zstandard package.")
+
+        self.level = feed_options.get("compression_level")
+        self.rotate_bytes = int(feed_options.get("rotate_bytes", 0))
+        self.rotate_items = int(feed_options.get("rotate_items", 0))
+
+    @classmethod
+    def from_crawler(
+        cls, crawler: Crawler, uri: str, *, feed_options: dict[str, Any] | None = None
+    ):
+        return cls(uri, feed_options=feed_options, stats=crawler.stats)
+
+    def open(self, spider: Spider) -> RotatingFile:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        return RotatingFile(
+            self.path,
+            self.compression,
+            level=self.level,
+            rotate_bytes=self.rotate_bytes,
+            rotate_items=self.rotate_items,
+        )
+
+    def store(self, file: RotatingFile) -> Deferred:
+        # Wait for the writer thread without blocking the reactor
+        d = deferToThread(file.close)
+        d.addBoth(self.record_segments, file)
+        return d
+
+    def record_segments(self, result: Any, file: RotatingFile) -> Any:
+        # Back on the reactor thread, the stats collector is not thread-safe
+        if self.stats is not None and file.segments:
+            self.stats.inc_value("feedstorage/segments", len(file.segments))
+        return result
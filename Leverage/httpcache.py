@@ -0,0 +1,72 @@
+# Define your HTTP cache policies here
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from scrapy.extensions.httpcache import RFC2616Policy
+
+if TYPE_CHECKING:
+    from scrapy.http import Request, Response
+    from scrapy.settings import BaseSettings
+
+
+class URLTTLPolicy(RFC2616Policy):
+    """
+    RFC 2616 cache policy limited to the URLs listed in HTTPCACHE_URL_TTLS.
+
+    HTTPCACHE_URL_TTLS maps URL regexes (searched, first match wins) to a TTL in
+    seconds. Requests to other URLs always go to the network.
+
+    A cached response stays fresh for as long as its own max-age or Expires
+    says. Without either, it is fresh for the URL's TTL. After that it is
+    revalidated with If-None-Match / If-Modified-Since when the server sent an
+    ETag or Last-Modified header, and downloaded again otherwise.
+
+    Cache keys are request fingerprints, which cover the method and body, so
+    POST requests are cached per form payload.
+    """
+
+    def __init__(self, settings: BaseSettings):
+        super().__init__(settings)
+        self.url_ttls = [
+            (re.compile(pattern), int(ttl))
+            for pattern, ttl in settings.getdict("HTTPCACHE_URL_TTLS").items()
+        ]
+        self._ttls: WeakKeyDictionary[Request, int | None] = WeakKeyDictionary()
+
+    def url_ttl(self, request: Request) -> int | None:
+        if request not in self._ttls:
+            self._ttls[request] = next(
+                (ttl for regex, ttl in self.url_ttls if regex.search(request.url)),
+                None,
+            )
+        return self._ttls[request]
+
+    def should_cache_request(self, request: Request) -> bool:
+        if self.url_ttl(request) is None:
+            return False
+        return super().should_cache_request(request)
+
+    def should_cache_response(self, response: Response, request: Request) -> bool:
+        if super().should_cache_response(response, request):
+            return True
+        # No validators or expiry info, keep it for the configured TTL instead
+        cc = self._parse_cachecontrol(response)
+        return (
+            response.status == 200
+            and b"no-store" not in cc
+            and bool(self.url_ttl(request))
+        )
+
+    def _compute_freshness_lifetime(
+        self, response: Response, request: Request, now: float
+    ) -> float:
+        cc = self._parse_cachecontrol(response)
+        if b"max-age" in cc or b"Expires" in response.headers:
+            return super()._compute_freshness_lifetime(response, request, now)
+        return self.url_ttl(request) or 0
@@ -24,6 +24,13 @@ class PropertyItem(Item):
     postal_code = Field()
 
 
+class PropertySiteItem(Item):
+    # Identifiers
+    property_url = Field()
+    # Template engine site identifier, e.g. the Repli360 site_id
+    site_id = Field()
+
+
 class UnitItem(Item):
     # Metadata
     scraped_at = Field()
@@ -0,0 +1,232 @@
+"""
+Run one spider in several processes, each crawling a shard of the properties.
+
+    python -m Leverage.launcher dolben --processes 4 [-a NAME=VALUE] [-s NAME=VALUE]
+
+A Scrapy process uses one core, and parsing plus the pipelines' database
+calls fill it before the network does. Process i crawls the properties with
+property_id % processes == i, with its own reactor and database connections.
+Feed URIs get a ".shard<i>" suffix so the processes never write the same file.
+A request_budget argument and the HOST_RATE_LIMITS budgets are split evenly
+between the shards, so together they make as many requests as one process.
+
+When every process has exited, their stats are merged into one report:
+counters are summed, maxima and percentiles take the largest value, and
+rates are averaged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import pprint
+import queue
+from typing import TYPE_CHECKING, Any
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+
+logger = logging.getLogger(__name__)
+
+# Stats merged by taking the largest value instead of the sum
+MAX_STAT_MARKERS = ("max", "/p50", "/p95", "/p99", "elapsed_time_seconds")
+# Stats merged by averaging
+MEAN_STAT_SUFFIXES = ("_rate", "/rate")
+
+
+def shard_uri(uri: str, shard: int) -> str:
+    """
+    Feed URI for one shard: "output/a_%(time)s.jsonl" -> "output/a_%(time)s.shard0.jsonl".
+    """
+    base, ext = os.path.splitext(uri)
+    return f"{base}.shard{shard}{ext}"
+
+
+def shard_rate_limit(config: dict, shards: int) -> dict:
+    """
+    One shard's part of a HOST_RATE_LIMITS budget. Bursts stay at least 1,
+    the smallest budget a bucket accepts.
+    """
+    return {
+        **config,
+        "rate": float(config["rate"]) / shards,
+        "burst": max(float(config.get("burst", 1)) / shards, 1.0),
+    }
+
+
+def shard_settings(settings: dict, shard: int, shards: int) -> dict:
+    """
+    Setting overrides for one shard's process, given the "-s" overrides.
+    """
+    effective = get_project_settings()
+    effective.setdict(settings, "cmdline")
+    overrides = {
+        **settings,
+        # Shards already split the properties between processes
+        "CRAWL_TASK_QUEUE": False,
+        "FEEDS": {
+            shard_uri(uri, shard): options
+            for uri, options in effective.getdict("FEEDS").items()
+        },
+        # Every process has its own buckets
+        "HOST_RATE_LIMITS": {
+            name: shard_rate_limit(config, shards)
+            for name, config in effective.getdict("HOST_RATE_LIMITS").items()
+        },
+        "LOG_FORMAT": (
+            f"%(asctime)s [shard {shard}/{shards}] [%(name)s] %(levelname)s: %(message)s"
+        ),
+    }
+    if effective.get("HOST_RATE_LIMIT_DEFAULT") is not None:
+        overrides["HOST_RATE_LIMIT_DEFAULT"] = shard_rate_limit(
+            effective.getdict("HOST_RATE_LIMIT_DEFAULT"), shards
+        )
+    return overrides
+
+
+def shard_arguments(arguments: dict, shard: int, shards: int) -> dict:
+    """
+    Spider arguments for one shard's process.
+    """
+    arguments = {**arguments, "shard": shard, "shards": shards}
+    if budget := arguments.get("request_budget"):
+        arguments["request_budget"] = float(budget) / shards
+    return arguments
+
+
+def run_shard(
+    spider: str,
+    shard: int,
+    shards: int,
+    arguments: dict,
+    settings: dict,
+    results: Queue,
+) -> None:
+    project_settings = get_project_settings()
+    project_settings.setdict(shard_settings(settings, shard, shards), "cmdline")
+
+    process = CrawlerProcess(project_settings)
+    crawler = process.create_crawler(spider)
+    process.crawl(crawler, **shard_arguments(arguments, shard, shards))
+    process.start()
+    results.put((shard, crawler.stats.get_stats()))
+
+
+def merge_stats(shard_stats: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Combine the stats of several crawls into one.
+    """
+    values: dict[str, list] = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            values.setdefault(key, []).append(value)
+
+    merged: dict[str, Any] = {}
+    for key, items in sorted(values.items()):
+        if all(isinstance(item, datetime.datetime) for item in items):
+            merged[key] = min(items) if "start" in key else max(items)
+        elif all(
+            isinstance(item, (int, float)) and not isinstance(item, bool)
+            for item in items
+        ):
+            if any(marker in key for marker in MAX_STAT_MARKERS):
+                merged[key] = max(items)
+            elif key.endswith(MEAN_STAT_SUFFIXES):
+                merged[key] = round(sum(items) / len(items), 4)
+            else:
+                merged[key] = sum(items)
+        else:
+            distinct = sorted({str(item) for item in items})
+            merged[key] = distinct[0] if len(distinct) == 1 else distinct
+    return merged
+
+
+def parse_pairs(pairs: list[str], option: str) -> dict[str, str]:
+    parsed = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid {option} value {pair!r}, use NAME=VALUE.")
+        parsed[name] = value
+    return parsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("spider")
+    parser.add_argument(
+        "-n", "--processes", type=int, default=multiprocessing.cpu_count()
+    )
+    parser.add_argument(
+        "-a", dest="arguments", action="append", default=[], metavar="NAME=VALUE"
+    )
+    parser.add_argument(
+        "-s", dest="settings", action="append", default=[], metavar="NAME=VALUE"
+    )
+    parser.add_argument("--stats-file", help="Also write the merged stats as JSON.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=get_project_settings().get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    )
+    if args.processes < 1:
+        raise ValueError("--processes must be at least 1.")
+    arguments = parse_pairs(args.arguments, "-a")
+    settings = parse_pairs(args.settings, "-s")
+
+    # A fresh interpreter per shard, Twisted reactors do not survive a fork
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=run_shard,
+            args=(args.spider, shard, args.processes, arguments, settings, results),
+            name=f"{args.spider}-shard{shard}",
+        )
+        for shard in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} {args.spider} shards.")
+
+    # Drain results before joining, a child blocks on exit until its put is read
+    shard_stats = {}
+    while len(shard_stats) < len(processes):
+        try:
+            shard, stats = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        shard_stats[shard] = stats
+    for process in processes:
+        process.join()
+
+    failed = sorted(
+        shard
+        for shard, process in enumerate(processes)
+        # A crawl that failed to start has no finish_reason
+        if process.exitcode != 0 or "finish_reason" not in shard_stats.get(shard, {})
+    )
+    merged = merge_stats([shard_stats[shard] for shard in sorted(shard_stats)])
+    merged["launcher/shards"] = len(processes)
+    merged["launcher/failed_shards"] = failed
+
+    logger.info(f"Merged stats of {len(shard_stats)} shards:\n{pprint.pformat(merged)}")
+    if args.stats_file:
+        with open(args.stats_file, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2, default=str)
+    if failed:
+        raise SystemExit(f"Shards {failed} did not finish cleanly.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,23 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from email.utils import parsedate_to_datetime
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.httpobj import urlparse_cached
+from typing import TYPE_CHECKING
 
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
+if TYPE_CHECKING:
+    from scrapy import Spider
+    from scrapy.crawler import Crawler
+    from scrapy.http import Request, Response
+    from scrapy.statscollectors import StatsCollector
 
 
 class LeverageSpiderMiddleware:
@@ -98,3 +111,260 @@ class LeverageDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class TokenBucket:
+    """
+    Request budget of one host or host group.
+
+    Refills at `rate` requests per second up to `burst` tokens. The rate is
+    cut by backoff() and grows back by `recovery` (a fraction of the configured
+    rate) with every successful response.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float = 1,
+        min_rate: float = 0.01,
+        recovery: float = 0.05,
+    ):
+        if rate <= 0 or burst < 1:
+            raise ValueError(
+                f"Rate limit {name!r} needs rate > 0 and burst >= 1, "
+                f"got rate={rate}, burst={burst}."
+            )
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.recovery = recovery
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # Set from Retry-After, no request starts before this
+        self.blocked_until = 0.0
+        self.last_backoff = float("-inf")
+        self.waiting = 0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token and return how long to wait before using it.
+
+        Tokens may go negative: each waiting request holds a reservation, so
+        requests leave in arrival order at the bucket rate.
+        """
+        self.refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(delay, self.blocked_until - now)
+
+    def backoff(self, now: float, factor: float, retry_after: float | None) -> bool:
+        """
+        Slow down after a throttling response. Returns whether the rate was cut.
+        """
+        self.refill(now)
+        # Drop the saved-up burst, the server wants fewer requests now
+        self.tokens = min(self.tokens, 0)
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+        # Responses to requests sent before the last cut don't cut again
+        if now - self.last_backoff < 1 / self.rate:
+            return False
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.last_backoff = now
+        return True
+
+    def cancel(self) -> None:
+        """
+        Give back the token of a reservation that will not be used.
+        """
+        self.tokens += 1
+
+    def recover(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+
+class HostRateLimitMiddleware:
+    """
+    Token-bucket rate limit per host, or per group of hosts.
+
+    HOST_RATE_LIMITS maps a bucket name to {"hosts": [...], "rate": ...,
+    "burst": ...}; "hosts" defaults to the name itself, and a host also matches
+    its subdomains. Hosts in no group get their own bucket configured by
+    HOST_RATE_LIMIT_DEFAULT (None to leave them unlimited). A group's requests
+    share one downloader slot.
+
+    429 and 503 responses multiply the bucket's rate by HOST_RATE_LIMIT_BACKOFF
+    and honor Retry-After; successful responses restore it step by step.
+    Requests wait in process_request, before they reach the downloader slot,
+    but still count against CONCURRENT_REQUESTS. Beyond
+    HOST_RATE_LIMIT_MAX_WAITING waiting requests per bucket, a request is
+    dropped with IgnoreRequest and a copy goes back to the scheduler when its
+    turn would have come, so a backlog on one bucket never takes the
+    concurrency other hosts need.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        groups: dict[str, dict],
+        default: dict | None = None,
+        backoff: float = 0.5,
+        recovery: float = 0.05,
+        max_retry_after: float = 600,
+        max_waiting: int = 8,
+        crawler: Crawler | None = None,
+    ):
+        self.stats = stats
+        self.default = default
+        self.backoff_factor = backoff
+        self.recovery = recovery
+        self.max_retry_after = max_retry_after
+        self.max_waiting = max_waiting
+        # Its engine takes the requests back, see defer()
+        self.crawler = crawler
+
+        self.buckets: dict[str, TokenBucket] = {}
+        self.group_names = set(groups)
+        # host -> bucket name, for hosts and suffixes listed in groups
+        self.group_hosts: dict[str, str] = {}
+        for name, config in groups.items():
+            self.buckets[name] = self.make_bucket(name, config)
+            for host in config.get("hosts", [name]):
+                self.group_hosts[host.lower()] = name
+        self.host_buckets: dict[str, str | None] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        settings = crawler.settings
+        return cls(
+            crawler.stats,
+            settings.getdict("HOST_RATE_LIMITS"),
+            default=settings.get("HOST_RATE_LIMIT_DEFAULT"),
+            backoff=settings.getfloat("HOST_RATE_LIMIT_BACKOFF", 0.5),
+            recovery=settings.getfloat("HOST_RATE_LIMIT_RECOVERY", 0.05),
+            max_retry_after=settings.getfloat("HOST_RATE_LIMIT_MAX_RETRY_AFTER", 600),
+            max_waiting=settings.getint("HOST_RATE_LIMIT_MAX_WAITING", 8),
+            crawler=crawler,
+        )
+
+    def make_bucket(self, name: str, config: dict) -> TokenBucket:
+        return TokenBucket(
+            name,
+            float(config["rate"]),
+            burst=float(config.get("burst", 1)),
+            min_rate=float(config.get("min_rate", 0.01)),
+            recovery=self.recovery,
+        )
+
+    def bucket_for(self, request: Request) -> TokenBucket | None:
+        host = (urlparse_cached(request).hostname or "").lower()
+        if host not in self.host_buckets:
+            name = None
+            # app.repli360.com, then repli360.com, then com
+            labels = host.split(".")
+            for i in range(len(labels)):
+                if (name := self.group_hosts.get(".".join(labels[i:]))) is not None:
+                    break
+            if name is None and self.default:
+                name = host
+                self.buckets[name] = self.make_bucket(name, self.default)
+            self.host_buckets[host] = name
+        name = self.host_buckets[host]
+        return self.buckets[name] if name is not None else None
+
+    async def process_request(
+        self, request: Request, spider: Spider | None = None
+    ) -> None:
+        bucket = self.bucket_for(request)
+        if bucket is None:
+            return
+        if bucket.name in self.group_names:
+            # Grouped hosts share a downloader slot, and its concurrency
+            request.meta.setdefault("download_slot", bucket.name)
+
+        self.stats.inc_value(f"ratelimit/{bucket.name}/requests")
+        delay = bucket.reserve(time.monotonic())
+        if delay <= 0:
+            return
+        if bucket.waiting >= self.max_waiting and self.crawler is not None:
+            self.defer(request, bucket, delay)
+
+        bucket.waiting += 1
+        self.stats.set_value(f"ratelimit/{bucket.name}/queue_depth", bucket.waiting)
+        self.stats.max_value(f"ratelimit/{bucket.name}/max_queue_depth", bucket.waiting)
+        self.stats.inc_value(f"ratelimit/{bucket.name}/delayed")
+        self.stats.inc_value(f"ratelimit/{bucket.name}/wait_seconds", round(delay, 3))
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            bucket.waiting -= 1
+            self.stats.set_value(f"ratelimit/{bucket.name}/queue_depth", bucket.waiting)
+
+    def defer(self, request: Request, bucket: TokenBucket, delay: float) -> None:
+        """
+        Send a copy of request back to the scheduler after delay seconds and
+        drop this one, freeing its place in CONCURRENT_REQUESTS meanwhile.
+        """
+        bucket.cancel()
+        self.stats.inc_value(f"ratelimit/{bucket.name}/deferred")
+        retry = request.replace(dont_filter=True)
+        asyncio.get_running_loop().call_later(delay, self.requeue, retry)
+        # The copy carries the callbacks, the dropped request must not fail
+        request.errback = None
+        raise IgnoreRequest(f"Rate limit {bucket.name!r}: retrying in {delay:.1f}s")
+
+    def requeue(self, request: Request) -> None:
+        if self.crawler.crawling:
+            self.crawler.engine.crawl(request)
+
+    def process_response(
+        self, request: Request, response: Response, spider: Spider | None = None
+    ) -> Response:
+        if "cached" in response.flags:
+            return response
+        bucket = self.bucket_for(request)
+        if bucket is None:
+            return response
+
+        if response.status in self.THROTTLE_STATUSES:
+            retry_after = self.retry_after(response)
+            if bucket.backoff(time.monotonic(), self.backoff_factor, retry_after):
+                self.stats.inc_value(f"ratelimit/{bucket.name}/backoffs")
+                self.logger.warning(
+                    f"{response.status} from {bucket.name}, slowing down to "
+                    f"{bucket.rate:.3f} requests/sec"
+                    + (f" after {retry_after:.0f}s." if retry_after else ".")
+                )
+        elif response.status < 400:
+            bucket.recover()
+        self.stats.set_value(f"ratelimit/{bucket.name}/rate", round(bucket.rate, 4))
+        return response
+
+    def retry_after(self, response: Response) -> float | None:
+        value = response.headers.get(b"Retry-After")
+        if not value:
+            return None
+        value = value.decode("latin-1").strip()
+        try:
+            seconds = float(value)
+        except ValueError:
+            # HTTP-date form
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                self.logger.debug(f"Ignoring unparseable Retry-After: {value!r}")
+                return None
+        return min(max(seconds, 0.0), self.max_retry_after)
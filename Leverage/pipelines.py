@@ -4,25 +4,51 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 from __future__ import annotations
 
+import asyncio
 import psycopg
 import logging
+import time
 
-from Leverage.items import UnitItem, PromoItem, PropertyItem
-from psycopg import Rollback
-from scrapy.exceptions import DropItem
-from typing import TYPE_CHECKING
+from collections import defaultdict
+from collections.abc import Generator
+from contextlib import asynccontextmanager
+from Leverage.cache import IdentityMap, LRUCache
+from Leverage.dbstats import StatementStats
+from Leverage.items import UnitItem, PromoItem, PropertyItem, PropertySiteItem
+from Leverage.spool import SpoolWriter, encode_item
+from psycopg_pool import AsyncConnectionPool
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+from twisted.internet.task import LoopingCall
+from typing import TYPE_CHECKING, Any
 
 if TYPE_CHECKING:
-    from psycopg import Cursor
+    from psycopg import AsyncCursor, Cursor
     from scrapy import Spider, Item
     from scrapy.crawler import Crawler
+    from scrapy.settings import BaseSettings
+    from scrapy.statscollectors import StatsCollector
+
+# (name, query, params) statements of UnitItemPipeline.unit_statements(), which
+# are sent their first result row and return the identity cache entries to store
+UnitStatements = Generator[tuple[str, str, Any], tuple | None, list]
 
 
 class PostgresConnectionPipeline:
     logger = logging.getLogger(__name__)
 
-    def __init__(self, db_dsn: str):
+    # price_history is range-partitioned by month; make sure the current month
+    # and the next few exist so inserts never fail at a month boundary
+    ENSURE_PARTITIONS_QUERY = """
+        SELECT create_price_history_partitions(
+            (now() AT TIME ZONE 'UTC')::date, %s
+        );
+    """
+
+    def __init__(self, db_dsn: str, partitions_ahead: int = 2):
         self.db_dsn = db_dsn
+        self.partitions_ahead = partitions_ahead
         self.conn = None
 
     @classmethod
@@ -33,7 +59,14 @@ class PostgresConnectionPipeline:
             raise ValueError(
                 "DB_DSN setting is required for PostgresConnectionPipeline."
             )
-        return cls(db_dsn)
+        pipeline = cls(
+            db_dsn,
+            partitions_ahead=get_partitions_ahead(crawler),
+        )
+        # Close on spider_closed rather than close_spider, so buffering pipelines
+        # can still flush through the connection in their own close_spider
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
 
     def open_spider(self, spider: Spider):
         self.conn = psycopg.connect(self.db_dsn, autocommit=True)
@@ -41,16 +74,87 @@ class PostgresConnectionPipeline:
         spider.crawler.postgres_conn = self.conn
         spider.logger.info("Postgres connection opened.")
 
-    def close_spider(self, spider: Spider):
+        with self.conn.cursor() as cur:
+            cur.execute(self.ENSURE_PARTITIONS_QUERY, (self.partitions_ahead,))
+            created = cur.fetchone()[0]
+        if created:
+            spider.logger.info(f"Created {created} price_history partition(s).")
+
+    def spider_closed(self, spider: Spider):
         conn = getattr(spider.crawler, "postgres_conn", None)
         if conn:
             conn.close()
             del spider.crawler.postgres_conn
 
 
+def get_partitions_ahead(crawler: Crawler) -> int:
+    months = crawler.settings.getint("PRICE_HISTORY_PARTITIONS_AHEAD", 2)
+    if months < 1:
+        raise ValueError("PRICE_HISTORY_PARTITIONS_AHEAD must be at least 1.")
+    return months
+
+
 class PropertyItemPipeline:
     logger = logging.getLogger(__name__)
 
+    # Use a property URL or a combined City/Name as the ON CONFLICT target
+    # TODO! Update primary key to something beyond the URL alone
+    UPSERT_PROPERTY_QUERY = """
+        INSERT INTO properties (
+            company_id,
+            property_name,
+            url,
+            template_engine,
+            address,
+            city,
+            state,
+            postal_code,
+            updated_source
+        )
+        VALUES (
+            %(company_id)s,
+            %(name)s,
+            %(url)s,
+            %(template)s,
+            %(address)s,
+            %(city)s,
+            %(state)s,
+            %(postal_code)s,
+            'scrape'::update_source_type
+        )
+        ON CONFLICT (url) DO UPDATE
+        SET
+            property_name = EXCLUDED.property_name,
+            address = EXCLUDED.address,
+            city = EXCLUDED.city,
+            state = EXCLUDED.state,
+            postal_code = EXCLUDED.postal_code,
+            template_engine = EXCLUDED.template_engine,
+            updated_source = 'scrape'::update_source_type,
+            updated_at = now(),
+            is_active = true,
+            deactivated_at = NULL
+        RETURNING property_id;
+    """
+    # NOTE: PostgreSQL increments the counter on GENERATED ALWAYS AS IDENTITY columns on every insert attempt,
+    # even if the insert fails due to a conflict. This is expected behavior.
+
+    COMPANY_ID_QUERY = "SELECT company_id FROM management_companies WHERE name = %s;"
+
+    def __init__(self, cache_size: int, db_stats: StatementStats | None = None):
+        self.company_ids: LRUCache[str, int] = LRUCache(cache_size)
+        self.db_stats = db_stats or StatementStats()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        if crawler.settings.getbool("PROPERTY_RECONCILE"):
+            # PropertyReconcilePipeline writes the run's properties at close
+            raise NotConfigured("PROPERTY_RECONCILE is enabled.")
+        return cls(
+            crawler.settings.getint("IDENTITY_CACHE_SIZE", 50_000),
+            db_stats=StatementStats.from_crawler(crawler),
+        )
+
     def process_item(self, item: Item, spider: Spider) -> Item:
         if not isinstance(item, PropertyItem):
             return item  # Pass through other item types
@@ -74,56 +178,30 @@ class PropertyItemPipeline:
 
     def get_company_id(self, cur: Cursor, company_name: str) -> int:
         # NOTE: Can probably remove this method if company_id is provided directly in the PropertyItem, from the specific indexer
-        sql = "SELECT company_id FROM management_companies WHERE name = %s;"
-        cur.execute(sql, (company_name,))
+        if (company_id := self.company_ids.get(company_name)) is not None:
+            return company_id
+
+        self.db_stats.execute(cur, "company_id", self.COMPANY_ID_QUERY, (company_name,))
         result = cur.fetchone()
         if not result:
             raise ValueError(
                 f"Failed to retrieve company_id for company_name={company_name}"
             )
+        self.company_ids.put(company_name, result[0])
         return result[0]
 
     def upsert_property(self, cur: Cursor, item: PropertyItem, company_id: int) -> int:
-        # Use a property URL or a combined City/Name as the ON CONFLICT target
-        # TODO! Update primary key to something beyond the URL alone
-        query = """
-            INSERT INTO properties (
-                company_id,
-                property_name,
-                url,
-                template_engine,
-                address,
-                city,
-                state,
-                postal_code,
-                updated_source
-            )
-            VALUES (
-                %(company_id)s,
-                %(name)s,
-                %(url)s,
-                %(template)s,
-                %(address)s,
-                %(city)s,
-                %(state)s,
-                %(postal_code)s,
-                'scrape'::update_source_type
-            )
-            ON CONFLICT (url) DO UPDATE
-            SET
-                property_name = EXCLUDED.property_name,
-                address = EXCLUDED.address,
-                city = EXCLUDED.city,
-                state = EXCLUDED.state,
-                postal_code = EXCLUDED.postal_code,
-                template_engine = EXCLUDED.template_engine,
-                updated_source = 'scrape'::update_source_type
-            RETURNING property_id;
-        """
-        # NOTE: PostgreSQL increments the counter on GENERATED ALWAYS AS IDENTITY columns on every insert attempt,
-        # even if the insert fails due to a conflict. This is expected behavior.
+        data = self.property_params(item, company_id)
+        self.db_stats.execute(cur, "upsert_property", self.UPSERT_PROPERTY_QUERY, data)
+        result = cur.fetchone()
+        if not result:
+            raise ValueError(f"Failed to upsert property with URL={data['url']}")
+
+        self.logger.info(f"Upserted property_id: {result[0]}")
+        return result[0]
 
-        data = {
+    def property_params(self, item: PropertyItem, company_id: int) -> dict:
+        return {
             "company_id": company_id,
             "name": item.get("property_name"),
             "url": item.get("url", "").rstrip("/"),
@@ -134,18 +212,409 @@ class PropertyItemPipeline:
             "postal_code": item.get("postal_code"),
         }
 
-        cur.execute(query, data)
-        result = cur.fetchone()
-        if not result:
-            raise ValueError(f"Failed to upsert property with URL={data['url']}")
 
-        self.logger.info(f"Upserted property_id: {result[0]}")
-        return result[0]
+class PropertyReconcilePipeline(PropertyItemPipeline):
+    """
+    Reconcile mode of PropertyItemPipeline for indexer runs.
+
+    PropertyItems are collected for the whole run. At close, each company's
+    properties are read with one query and diffed against the run: only new or
+    changed properties are written, and properties missing from the run are
+    marked inactive so DatabaseSpider stops scheduling them.
+
+    Only enabled with PROPERTY_RECONCILE (IndexerSpider sets it), which also
+    disables the per-item PropertyItemPipeline.
+    """
+
+    EXISTING_PROPERTIES_QUERY = """
+        SELECT
+            url,
+            property_name,
+            template_engine,
+            address,
+            city,
+            state,
+            postal_code,
+            is_active
+        FROM properties
+        WHERE company_id = %s;
+    """
+
+    DEACTIVATE_PROPERTIES_QUERY = """
+        UPDATE properties
+        SET
+            is_active = false,
+            deactivated_at = now(),
+            updated_at = now(),
+            updated_source = 'scrape'::update_source_type
+        WHERE (
+            company_id = %s
+            AND url = ANY(%s)
+            AND is_active
+        );
+    """
+
+    # Compared against the database row, in EXISTING_PROPERTIES_QUERY order
+    COMPARED_PARAMS = ("name", "template", "address", "city", "state", "postal_code")
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        cache_size: int,
+        deactivate: bool = True,
+        min_seen_ratio: float = 0.5,
+        db_stats: StatementStats | None = None,
+    ):
+        super().__init__(cache_size, db_stats)
+        self.stats = stats
+        self.deactivate = deactivate
+        self.min_seen_ratio = min_seen_ratio
+        # company_name -> url -> property params (without company_id)
+        self.seen: dict[str, dict[str, dict]] = defaultdict(dict)
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        settings = crawler.settings
+        if not settings.getbool("PROPERTY_RECONCILE"):
+            raise NotConfigured("PROPERTY_RECONCILE is disabled.")
+        return cls(
+            crawler.stats,
+            settings.getint("IDENTITY_CACHE_SIZE", 50_000),
+            deactivate=settings.getbool("PROPERTY_RECONCILE_DEACTIVATE", True),
+            min_seen_ratio=settings.getfloat("PROPERTY_RECONCILE_MIN_SEEN_RATIO", 0.5),
+            db_stats=StatementStats.from_crawler(crawler),
+        )
+
+    def process_item(self, item: Item, spider: Spider) -> Item:
+        if not isinstance(item, PropertyItem):
+            return item  # Pass through other item types
+
+        if "company_name" not in item:
+            raise DropItem("PropertyItem missing company_name field.")
+
+        params = self.property_params(item, company_id=None)
+        self.seen[item["company_name"]][params["url"]] = params
+        return item
+
+    def close_spider(self, spider: Spider):
+        conn = getattr(spider.crawler, "postgres_conn", None)
+        if not conn:
+            raise ValueError("No PostgreSQL connection available in spider.")
+
+        for company_name, seen in self.seen.items():
+            with conn.transaction(), conn.cursor() as cur:
+                self.reconcile(cur, company_name, seen)
+
+    def reconcile(self, cur: Cursor, company_name: str, seen: dict[str, dict]) -> None:
+        company_id = self.get_company_id(cur, company_name)
+        self.db_stats.execute(
+            cur, "existing_properties", self.EXISTING_PROPERTIES_QUERY, (company_id,)
+        )
+        existing = {row[0]: row[1:] for row in cur.fetchall()}
+
+        changed, unchanged = self.diff(seen, existing)
+        if changed:
+            self.db_stats.executemany(
+                cur,
+                "upsert_properties",
+                self.UPSERT_PROPERTY_QUERY,
+                [{**params, "company_id": company_id} for params in changed],
+            )
+
+        vanished = [url for url, row in existing.items() if url not in seen and row[-1]]
+        deactivated = 0
+        if vanished and self.should_deactivate(company_name, seen, existing):
+            self.db_stats.execute(
+                cur,
+                "deactivate_properties",
+                self.DEACTIVATE_PROPERTIES_QUERY,
+                (company_id, vanished),
+            )
+            deactivated = cur.rowcount
+
+        self.stats.inc_value("property_reconcile/written", len(changed))
+        self.stats.inc_value("property_reconcile/unchanged", unchanged)
+        self.stats.inc_value("property_reconcile/deactivated", deactivated)
+        self.logger.info(
+            f"Reconciled {company_name}: {len(changed)} written, "
+            f"{unchanged} unchanged, {deactivated} deactivated."
+        )
+
+    def diff(
+        self, seen: dict[str, dict], existing: dict[str, tuple]
+    ) -> tuple[list[dict], int]:
+        """
+        Split seen properties into those that need writing and a count of the rest.
+        """
+        changed = []
+        for url, params in seen.items():
+            row = existing.get(url)
+            if row is None or not row[-1] or self.row_differs(params, row):
+                changed.append(params)
+        return changed, len(seen) - len(changed)
+
+    def row_differs(self, params: dict, row: tuple) -> bool:
+        compared = row[: len(self.COMPARED_PARAMS)]
+        for key, value in zip(self.COMPARED_PARAMS, compared, strict=True):
+            if isinstance(value, str):
+                # state is character(2) and comes back blank-padded
+                value = value.rstrip()
+            if params[key] != value:
+                return True
+        return False
+
+    def should_deactivate(
+        self, company_name: str, seen: dict[str, dict], existing: dict[str, tuple]
+    ) -> bool:
+        # Don't treat a partial run (site layout change, bans, crash) as closures
+        if not self.deactivate:
+            return False
+        if self.stats.get_value("log_count/ERROR"):
+            self.logger.warning(
+                f"Not deactivating {company_name} properties: the run logged errors."
+            )
+            return False
+
+        active = sum(1 for row in existing.values() if row[-1])
+        if active and len(seen) / active < self.min_seen_ratio:
+            self.logger.warning(
+                f"Not deactivating {company_name} properties: only {len(seen)} of "
+                f"{active} active properties were seen."
+            )
+            return False
+        return True
+
+
+def get_price_history_mode(settings: BaseSettings) -> str:
+    mode = settings.get("PRICE_HISTORY_MODE", "append")
+    if mode not in ("append", "interval"):
+        raise ValueError(
+            f"Invalid PRICE_HISTORY_MODE={mode!r}, expected 'append' or 'interval'."
+        )
+    return mode
+
+
+class PropertySiteItemPipeline:
+    """
+    Stores the template engine site_id a crawler resolved for a property, so
+    the next crawl can skip discovery (see DatabaseSpider.site_ids).
+    """
+
+    logger = logging.getLogger(__name__)
+
+    UPDATE_SITE_ID_QUERY = """
+        UPDATE properties
+        SET site_id = %(site_id)s
+        WHERE url = %(url)s
+            AND site_id IS DISTINCT FROM %(site_id)s;
+    """
+
+    def __init__(self, stats: StatsCollector, db_stats: StatementStats | None = None):
+        self.stats = stats
+        self.db_stats = db_stats or StatementStats()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        return cls(crawler.stats, db_stats=StatementStats.from_crawler(crawler))
+
+    def process_item(self, item: Item, spider: Spider) -> Item:
+        if not isinstance(item, PropertySiteItem):
+            return item  # Pass through other item types
+
+        conn = getattr(spider.crawler, "postgres_conn", None)
+        if not conn:
+            raise ValueError("No PostgreSQL connection available in spider.")
+
+        with conn.cursor() as cur:
+            self.update_site_id(cur, item)
+
+        return item
+
+    def update_site_id(self, cur: Cursor, item: PropertySiteItem) -> None:
+        if not item.get("property_url") or not item.get("site_id"):
+            raise DropItem("PropertySiteItem missing property_url or site_id.")
+
+        self.db_stats.execute(
+            cur, "update_site_id", self.UPDATE_SITE_ID_QUERY, self.site_params(item)
+        )
+        if cur.rowcount:
+            self.logger.info(
+                f"Stored site_id {item['site_id']} for {item['property_url']}."
+            )
+            self.stats.inc_value("property_site/updated")
+
+    def site_params(self, item: PropertySiteItem) -> dict:
+        return {"url": item["property_url"], "site_id": item["site_id"]}
 
 
 class UnitItemPipeline:
     logger = logging.getLogger(__name__)
 
+    # TODO: Consider if DO UPDATE is needed here to update metadata
+    # Check out this: https://stackoverflow.com/questions/34708509/how-to-use-returning-with-on-conflict-in-postgresql
+    UPSERT_FLOORPLAN_QUERY = """
+        WITH upsert AS (
+            INSERT INTO floorplans (
+                property_id,
+                plan_name,
+                bedrooms,
+                bathrooms,
+                square_footage
+            )
+            VALUES (
+                %(prop_id)s,
+                %(plan_name)s,
+                %(bedrooms)s,
+                %(bathrooms)s,
+                %(square_footage)s
+            )
+            ON CONFLICT (property_id, plan_name) DO NOTHING
+            RETURNING floorplan_id
+        )
+        SELECT floorplan_id FROM upsert
+        UNION
+            SELECT floorplan_id
+            FROM floorplans
+            WHERE (
+                property_id = %(prop_id)s
+                AND plan_name = %(plan_name)s
+            );
+    """
+
+    UPSERT_APARTMENT_UNIT_QUERY = """
+        WITH upsert AS(
+            INSERT INTO apartment_units (
+                property_id,
+                floorplan_id,
+                unit_number,
+                floor_number,
+                building_name,
+                is_on_top_floor
+            )
+            VALUES (
+                %(prop_id)s,
+                %(floorplan_id)s,
+                %(unit_number)s,
+                %(floor_number)s,
+                %(building_name)s,
+                %(is_on_top_floor)s
+            )
+            ON CONFLICT (property_id, building_name, unit_number) DO NOTHING 
+            RETURNING unit_id
+        )
+        SELECT unit_id FROM upsert
+        UNION
+            SELECT unit_id
+            FROM apartment_units
+            WHERE (
+                property_id = %(prop_id)s 
+                AND building_name = %(building_name)s
+                AND unit_number = %(unit_number)s
+            );
+    """
+
+    INSERT_PRICE_HISTORY_QUERY = """
+        INSERT INTO price_history (
+            scraped_at,
+            unit_id,
+            rent_usd,
+            deposit_usd,
+            min_lease_term_months,
+            is_available,
+            available_date
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s);
+    """
+
+    # Queries for PRICE_HISTORY_MODE = "interval"
+    EXTEND_PRICE_INTERVAL_QUERY = """
+        UPDATE price_intervals
+        SET last_seen = GREATEST(last_seen, %(scraped_at)s)
+        WHERE (
+            unit_id = %(unit_id)s
+            AND valid_from = %(valid_from)s
+        );
+    """
+
+    # For units without a cached price state
+    EXTEND_MATCHING_PRICE_INTERVAL_QUERY = """
+        UPDATE price_intervals
+        SET last_seen = GREATEST(last_seen, %(scraped_at)s)
+        WHERE (
+            unit_id = %(unit_id)s
+            AND valid_to IS NULL
+            AND (
+                rent_usd,
+                deposit_usd,
+                min_lease_term_months,
+                is_available,
+                available_date
+            ) IS NOT DISTINCT FROM (
+                %(rent_usd)s,
+                %(deposit_usd)s,
+                %(min_lease_term_months)s,
+                %(is_available)s,
+                %(available_date)s
+            )
+        )
+        RETURNING valid_from;
+    """
+
+    CLOSE_PRICE_INTERVAL_QUERY = """
+        UPDATE price_intervals
+        SET valid_to = %(scraped_at)s
+        WHERE (
+            unit_id = %(unit_id)s
+            AND valid_to IS NULL
+        );
+    """
+
+    OPEN_PRICE_INTERVAL_QUERY = """
+        INSERT INTO price_intervals (
+            unit_id,
+            valid_from,
+            last_seen,
+            rent_usd,
+            deposit_usd,
+            min_lease_term_months,
+            is_available,
+            available_date
+        )
+        VALUES (
+            %(unit_id)s,
+            %(scraped_at)s,
+            %(scraped_at)s,
+            %(rent_usd)s,
+            %(deposit_usd)s,
+            %(min_lease_term_months)s,
+            %(is_available)s,
+            %(available_date)s
+        );
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        cache_size: int,
+        price_history_mode: str = "append",
+        db_stats: StatementStats | None = None,
+    ):
+        self.stats = stats
+        self.db_stats = db_stats or StatementStats()
+        self.identities = IdentityMap(
+            cache_size, self.db_stats, load_prices=price_history_mode == "interval"
+        )
+        self.price_history_mode = price_history_mode
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        return cls(
+            crawler.stats,
+            cache_size=crawler.settings.getint("IDENTITY_CACHE_SIZE", 50_000),
+            price_history_mode=get_price_history_mode(crawler.settings),
+            db_stats=StatementStats.from_crawler(crawler),
+        )
+
     def process_item(self, item: Item, spider: Spider):
         if not isinstance(item, UnitItem):
             return item  # Pass through other item types
@@ -162,64 +631,63 @@ class UnitItemPipeline:
 
         with conn.cursor() as cur:
             property_id = self.get_property_id(cur, url)
-
             with conn.transaction():
                 try:
-                    floorplan_id = self.upsert_floorplan(cur, item, property_id)
-                    unit_id = self.upsert_apartment_unit(
-                        cur, item, property_id, floorplan_id
+                    entries = self.run_statements(
+                        cur, self.unit_statements(item, property_id)
                     )
-                    self.insert_price_history(cur, item, unit_id)
-
                 except Exception as e:
                     self.logger.error(f"Transaction failed: {e}")
-                    Rollback()  # Roll back all changes if any step fails
-                    raise e
+                    raise
 
+        # Only cache IDs once the transaction that may have created them committed
+        self.cache_identities(entries)
         return item
 
+    def close_spider(self, spider: Spider):
+        for name in ("properties", "floorplans", "units"):
+            cache = getattr(self.identities, name)
+            self.stats.set_value(f"identity_cache/{name}/hits", cache.hits)
+            self.stats.set_value(f"identity_cache/{name}/misses", cache.misses)
+
+    def floorplan_identity(self, item: UnitItem, property_id: int) -> tuple[tuple, int]:
+        key = (property_id, item.get("floorplan_name"))
+        attrs = self.identities.floorplan_hash(
+            item.get("num_bedrooms"),
+            item.get("num_bathrooms"),
+            item.get("square_footage"),
+        )
+        return key, attrs
+
+    def unit_key(self, item: UnitItem, property_id: int) -> tuple:
+        return (property_id, item.get("building_name"), item.get("unit_number"))
+
+    def unit_hash(self, item: UnitItem, floorplan_id: int) -> int:
+        return self.identities.unit_hash(
+            floorplan_id, item.get("floor_number"), item.get("top_floor")
+        )
+
+    def cached_floorplan_id(self, key: tuple, attrs: int) -> int | None:
+        floorplan_id = self.identities.cached_id(self.identities.floorplans, key, attrs)
+        if floorplan_id is not None:
+            self.stats.inc_value("unit_pipeline/floorplan_upserts_skipped")
+        return floorplan_id
+
+    def cached_unit_id(self, key: tuple, attrs: int) -> int | None:
+        unit_id = self.identities.cached_id(self.identities.units, key, attrs)
+        if unit_id is not None:
+            self.stats.inc_value("unit_pipeline/unit_upserts_skipped")
+        return unit_id
+
     def get_property_id(self, cur: Cursor, url: str) -> int:
-        # SQL logic to retrieve property_id based on a natural key
-        query = "SELECT property_id FROM properties WHERE url = %s;"
-        cur.execute(query, (url,))
-        result = cur.fetchone()
-        if not result:
+        # Resolving an unseen URL also bulk-loads its floorplan and unit IDs
+        property_id = self.identities.property_id(cur, url)
+        if property_id is None:
             raise ValueError(f"Failed to retrieve property_id for url={url}")
-        return result[0]
+        return property_id
 
-    def upsert_floorplan(self, cur: Cursor, item: UnitItem, property_id: int) -> int:
-        # TODO: Consider if DO UPDATE is needed here to update metadata
-        # Check out this: https://stackoverflow.com/questions/34708509/how-to-use-returning-with-on-conflict-in-postgresql
-        query = """
-            WITH upsert AS (
-                INSERT INTO floorplans (
-                    property_id,
-                    plan_name,
-                    bedrooms,
-                    bathrooms,
-                    square_footage
-                )
-                VALUES (
-                    %(prop_id)s,
-                    %(plan_name)s,
-                    %(bedrooms)s,
-                    %(bathrooms)s,
-                    %(square_footage)s
-                )
-                ON CONFLICT (property_id, plan_name) DO NOTHING
-                RETURNING floorplan_id
-            )
-            SELECT floorplan_id FROM upsert
-            UNION
-                SELECT floorplan_id
-                FROM floorplans
-                WHERE (
-                    property_id = %(prop_id)s
-                    AND plan_name = %(plan_name)s
-                );
-        """
-
-        data = {
+    def floorplan_params(self, item: UnitItem, property_id: int) -> dict:
+        return {
             "prop_id": property_id,
             "plan_name": item.get("floorplan_name"),
             "bedrooms": item.get("num_bedrooms"),
@@ -227,8 +695,9 @@ class UnitItemPipeline:
             "square_footage": item.get("square_footage"),
         }
 
-        cur.execute(query, data)
-        result = cur.fetchone()
+    def upserted_floorplan_id(
+        self, result: tuple | None, item: UnitItem, property_id: int
+    ) -> int:
         if not result:
             raise ValueError(
                 f"Failed to retrieve floorplan_id for property_id={property_id} and plan_name={item.get('floorplan_name')}"
@@ -237,42 +706,10 @@ class UnitItemPipeline:
         self.logger.info(f"Upserted floorplan_id: {result[0]}")
         return result[0]
 
-    def upsert_apartment_unit(
-        self, cur: Cursor, item: UnitItem, property_id: int, floorplan_id: int
-    ) -> int:
-        query = """
-            WITH upsert AS(
-                INSERT INTO apartment_units (
-                    property_id,
-                    floorplan_id,
-                    unit_number,
-                    floor_number,
-                    building_name,
-                    is_on_top_floor
-                )
-                VALUES (
-                    %(prop_id)s,
-                    %(floorplan_id)s,
-                    %(unit_number)s,
-                    %(floor_number)s,
-                    %(building_name)s,
-                    %(is_on_top_floor)s
-                )
-                ON CONFLICT (property_id, building_name, unit_number) DO NOTHING 
-                RETURNING unit_id
-            )
-            SELECT unit_id FROM upsert
-            UNION
-                SELECT unit_id
-                FROM apartment_units
-                WHERE (
-                    property_id = %(prop_id)s 
-                    AND building_name = %(building_name)s
-                    AND unit_number = %(unit_number)s
-                );
-        """
-
-        data = {
+    def apartment_unit_params(
+        self, item: UnitItem, property_id: int, floorplan_id: int
+    ) -> dict:
+        return {
             "prop_id": property_id,
             "floorplan_id": floorplan_id,
             "unit_number": item.get("unit_number"),
@@ -281,8 +718,9 @@ class UnitItemPipeline:
             "is_on_top_floor": item.get("top_floor"),
         }
 
-        cur.execute(query, data)
-        result = cur.fetchone()
+    def upserted_unit_id(
+        self, result: tuple | None, item: UnitItem, property_id: int
+    ) -> int:
         if not result:
             raise ValueError(
                 f"Failed to retrieve unit_id for property_id={property_id} and unit_number={item['unit_number']}"
@@ -291,23 +729,584 @@ class UnitItemPipeline:
         self.logger.info(f"Upserted unit_id: {result[0]}")
         return result[0]
 
-    def insert_price_history(self, cur: Cursor, item: UnitItem, unit_id: int) -> None:
-        query = """
-            INSERT INTO price_history (
-                scraped_at,
-                unit_id,
-                rent_usd,
-                deposit_usd,
-                min_lease_term_months,
-                is_available,
-                available_date
+    def price_history_params(self, item: UnitItem, unit_id: int) -> tuple:
+        return (
+            item.get("scraped_at"),
+            unit_id,
+            item.get("rent_usd"),
+            item.get("deposit_usd"),
+            item.get("min_lease_term_months"),
+            item.get("is_available"),
+            item.get("available_date"),
+        )
+
+    def unit_statements(self, item: UnitItem, property_id: int) -> UnitStatements:
+        """
+        Statements writing one UnitItem, shared by the sync and async pipelines.
+
+        Yields (name, query, params) and is sent the first result row of each
+        statement; upserts of cached, unchanged rows are skipped. Returns the
+        (cache, key, value) entries to store once the transaction committed.
+        """
+        floorplan_key, floorplan_hash = self.floorplan_identity(item, property_id)
+        floorplan_id = self.cached_floorplan_id(floorplan_key, floorplan_hash)
+        if floorplan_id is None:
+            result = yield (
+                "upsert_floorplan",
+                self.UPSERT_FLOORPLAN_QUERY,
+                self.floorplan_params(item, property_id),
+            )
+            floorplan_id = self.upserted_floorplan_id(result, item, property_id)
+
+        unit_key = self.unit_key(item, property_id)
+        unit_hash = self.unit_hash(item, floorplan_id)
+        unit_id = self.cached_unit_id(unit_key, unit_hash)
+        if unit_id is None:
+            result = yield (
+                "upsert_apartment_unit",
+                self.UPSERT_APARTMENT_UNIT_QUERY,
+                self.apartment_unit_params(item, property_id, floorplan_id),
+            )
+            unit_id = self.upserted_unit_id(result, item, property_id)
+
+        entries = [
+            (self.identities.floorplans, floorplan_key, (floorplan_id, floorplan_hash)),
+            (self.identities.units, unit_key, (unit_id, unit_hash)),
+        ]
+        if self.price_history_mode == "append":
+            yield (
+                "insert_price_history",
+                self.INSERT_PRICE_HISTORY_QUERY,
+                self.price_history_params(item, unit_id),
             )
-            VALUES (%s, %s, %s, %s, %s, %s, %s);
+        else:
+            price_state = yield from self.price_interval_statements(item, unit_id)
+            entries.append((self.identities.price_states, unit_id, price_state))
+        return entries
+
+    def run_statements(self, cur: Cursor, statements: UnitStatements) -> list:
+        result = None
+        try:
+            while True:
+                name, query, params = statements.send(result)
+                self.db_stats.execute(cur, name, query, params)
+                result = cur.fetchone() if cur.description is not None else None
+        except StopIteration as e:
+            return e.value
+
+    def cache_identities(self, entries: list[tuple[LRUCache, Any, tuple]]) -> None:
+        for cache, key, value in entries:
+            cache.put(key, value)
+
+    def price_interval_statements(self, item: UnitItem, unit_id: int) -> UnitStatements:
         """
+        Decide from the last known price state of the unit whether the observation
+        extends the open interval or closes it and opens a new one. Returns the
+        unit's new price state.
+        """
+        params = {
+            "unit_id": unit_id,
+            "scraped_at": item.get("scraped_at"),
+            "rent_usd": item.get("rent_usd"),
+            "deposit_usd": item.get("deposit_usd"),
+            "min_lease_term_months": item.get("min_lease_term_months"),
+            "is_available": item.get("is_available"),
+            "available_date": item.get("available_date"),
+        }
+        state = self.identities.price_hash(
+            params["rent_usd"],
+            params["deposit_usd"],
+            params["min_lease_term_months"],
+            params["is_available"],
+            params["available_date"],
+        )
 
-        data = (
-            item.get("scraped_at"),
+        current = self.identities.price_states.get(unit_id)
+        if current is not None and current[0] == state:
+            self.stats.inc_value("unit_pipeline/price_intervals_extended")
+            yield (
+                "extend_price_interval",
+                self.EXTEND_PRICE_INTERVAL_QUERY,
+                {**params, "valid_from": current[1]},
+            )
+            return current
+
+        if current is None:
+            # Never loaded or evicted from the cache: the open interval may
+            # still hold these values
+            result = yield (
+                "extend_matching_price_interval",
+                self.EXTEND_MATCHING_PRICE_INTERVAL_QUERY,
+                params,
+            )
+            if result is not None:
+                self.stats.inc_value("unit_pipeline/price_intervals_extended")
+                return state, result[0]
+
+        # Closing is a no-op for units without an open interval
+        self.stats.inc_value("unit_pipeline/price_intervals_opened")
+        yield "close_price_interval", self.CLOSE_PRICE_INTERVAL_QUERY, params
+        yield "open_price_interval", self.OPEN_PRICE_INTERVAL_QUERY, params
+        return state, params["scraped_at"]
+
+
+class IngestFunctionUnitItemPipeline:
+    """
+    Single round trip alternative to UnitItemPipeline for a remote database.
+
+    Each UnitItem is passed whole to the ingest_unit_observation() SQL function,
+    which upserts the floorplan and unit and records the price server-side in
+    one transaction. The call is a prepared statement, so per item there is one
+    client/server round trip and no re-planning.
+
+    Like UnitItemPipeline, it writes through the connection opened by
+    PostgresConnectionPipeline; IDs are looked up server-side, so there is no
+    IdentityMap.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Every argument is cast to its parameter type: the statement is prepared,
+    # and Python floats (float8) have no implicit cast to numeric
+    INGEST_UNIT_QUERY = """
+        SELECT ingest_unit_observation(
+            p_property_url => %(property_url)s::text,
+            p_scraped_at => %(scraped_at)s::timestamptz,
+            p_plan_name => %(plan_name)s::varchar,
+            p_bedrooms => %(bedrooms)s::numeric,
+            p_bathrooms => %(bathrooms)s::numeric,
+            p_square_footage => %(square_footage)s::integer,
+            p_unit_number => %(unit_number)s::varchar,
+            p_floor_number => %(floor_number)s::integer,
+            p_building_name => %(building_name)s::varchar,
+            p_is_on_top_floor => %(is_on_top_floor)s::boolean,
+            p_rent_usd => %(rent_usd)s::numeric,
+            p_deposit_usd => %(deposit_usd)s::numeric,
+            p_min_lease_term_months => %(min_lease_term_months)s::smallint,
+            p_is_available => %(is_available)s::boolean,
+            p_available_date => %(available_date)s::date,
+            p_interval_mode => %(interval_mode)s::boolean
+        );
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        price_history_mode: str = "append",
+        db_stats: StatementStats | None = None,
+    ):
+        self.stats = stats
+        self.db_stats = db_stats or StatementStats()
+        self.price_history_mode = price_history_mode
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        return cls(
+            crawler.stats,
+            price_history_mode=get_price_history_mode(crawler.settings),
+            db_stats=StatementStats.from_crawler(crawler),
+        )
+
+    def process_item(self, item: Item, spider: Spider):
+        if not isinstance(item, UnitItem):
+            return item  # Pass through other item types
+
+        conn = getattr(spider.crawler, "postgres_conn", None)
+        if not conn:
+            raise ValueError("No PostgreSQL connection available in spider.")
+
+        url = item.get("property_url")
+        if not url:
+            raise DropItem("No property URL in UnitItem.")
+
+        with conn.cursor() as cur:
+            self.db_stats.execute(
+                cur,
+                "ingest_unit_observation",
+                self.INGEST_UNIT_QUERY,
+                self.ingest_params(item),
+                prepare=True,
+            )
+            result = cur.fetchone()
+
+        if not result or result[0] is None:
+            raise ValueError(f"Failed to retrieve property_id for url={url}")
+
+        self.stats.inc_value("unit_pipeline/ingest_calls")
+        return item
+
+    def ingest_params(self, item: UnitItem) -> dict:
+        return {
+            "property_url": item.get("property_url"),
+            "scraped_at": item.get("scraped_at"),
+            "plan_name": item.get("floorplan_name"),
+            "bedrooms": item.get("num_bedrooms"),
+            "bathrooms": item.get("num_bathrooms"),
+            "square_footage": item.get("square_footage"),
+            "unit_number": item.get("unit_number"),
+            "floor_number": item.get("floor_number"),
+            "building_name": item.get("building_name"),
+            "is_on_top_floor": item.get("top_floor"),
+            "rent_usd": item.get("rent_usd"),
+            "deposit_usd": item.get("deposit_usd"),
+            "min_lease_term_months": item.get("min_lease_term_months"),
+            "is_available": item.get("is_available"),
+            "available_date": item.get("available_date"),
+            "interval_mode": self.price_history_mode == "interval",
+        }
+
+
+class BatchUnitItemPipeline:
+    """
+    Buffered alternative to UnitItemPipeline for large runs.
+
+    UnitItems are collected until UNIT_PIPELINE_BATCH_SIZE items are buffered or
+    UNIT_PIPELINE_BATCH_SECONDS have passed. Each batch is COPYed into a staging
+    table and merged into floorplans, apartment_units and price_history with
+    set-based statements in a single transaction.
+
+    A batch that fails to merge is appended to a spool under
+    UNIT_PIPELINE_DEAD_LETTER_DIR, to be replayed with
+    "python -m Leverage.spool_loader --dir <dir>" once the cause is fixed.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Failures of a batch that must not stop the flush loop: database errors
+    # and values the staging table rejects
+    BATCH_ERRORS = (psycopg.Error, ValueError, TypeError)
+
+    # Temporary tables are never WAL-logged and are private to the session, so
+    # concurrent crawls do not collide. Rows are cleared when the batch commits.
+    STAGING_DDL = """
+        CREATE TEMPORARY TABLE IF NOT EXISTS unit_staging (
+            scraped_at timestamp with time zone,
+            property_url text,
+            plan_name character varying(100),
+            bedrooms numeric(2,1),
+            bathrooms numeric(2,1),
+            square_footage integer,
+            unit_number character varying(20),
+            floor_number integer,
+            building_name character varying(20),
+            is_on_top_floor boolean,
+            rent_usd numeric(8,2),
+            deposit_usd numeric(8,2),
+            min_lease_term_months smallint,
+            is_available boolean,
+            available_date date
+        ) ON COMMIT DELETE ROWS;
+    """
+
+    STAGING_COLUMNS = (
+        "scraped_at",
+        "property_url",
+        "plan_name",
+        "bedrooms",
+        "bathrooms",
+        "square_footage",
+        "unit_number",
+        "floor_number",
+        "building_name",
+        "is_on_top_floor",
+        "rent_usd",
+        "deposit_usd",
+        "min_lease_term_months",
+        "is_available",
+        "available_date",
+    )
+
+    MERGE_FLOORPLANS = """
+        INSERT INTO floorplans (
+            property_id,
+            plan_name,
+            bedrooms,
+            bathrooms,
+            square_footage
+        )
+        SELECT DISTINCT ON (p.property_id, s.plan_name)
+            p.property_id,
+            s.plan_name,
+            s.bedrooms,
+            s.bathrooms,
+            s.square_footage
+        FROM unit_staging s
+        JOIN properties p ON p.url = s.property_url
+        -- A NULL plan_name never conflicts, so reuse the property's unnamed plan
+        WHERE s.plan_name IS NOT NULL OR NOT EXISTS (
+            SELECT 1
+            FROM floorplans f
+            WHERE f.property_id = p.property_id AND f.plan_name IS NULL
+        )
+        ORDER BY p.property_id, s.plan_name, s.scraped_at DESC
+        ON CONFLICT (property_id, plan_name) DO NOTHING;
+    """
+
+    # NOTE: building_name is nullable, so the unique constraint never fires for
+    # units without a building. Match those explicitly to avoid duplicates.
+    MERGE_APARTMENT_UNITS = """
+        INSERT INTO apartment_units (
+            property_id,
+            floorplan_id,
+            unit_number,
+            floor_number,
+            building_name,
+            is_on_top_floor
+        )
+        SELECT DISTINCT ON (p.property_id, s.building_name, s.unit_number)
+            p.property_id,
+            f.floorplan_id,
+            s.unit_number,
+            s.floor_number,
+            s.building_name,
+            s.is_on_top_floor
+        FROM unit_staging s
+        JOIN properties p ON p.url = s.property_url
+        JOIN floorplans f ON (
+            f.property_id = p.property_id
+            AND f.plan_name IS NOT DISTINCT FROM s.plan_name
+        )
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM apartment_units u
+            WHERE (
+                u.property_id = p.property_id
+                AND u.building_name IS NOT DISTINCT FROM s.building_name
+                AND u.unit_number = s.unit_number
+            )
+        )
+        ORDER BY
+            p.property_id,
+            s.building_name,
+            s.unit_number,
+            s.scraped_at DESC,
+            f.floorplan_id
+        ON CONFLICT (property_id, building_name, unit_number) DO NOTHING;
+    """
+
+    MERGE_PRICE_HISTORY = """
+        INSERT INTO price_history (
+            scraped_at,
+            unit_id,
+            rent_usd,
+            deposit_usd,
+            min_lease_term_months,
+            is_available,
+            available_date
+        )
+        SELECT DISTINCT ON (s.scraped_at, u.unit_id)
+            s.scraped_at,
+            u.unit_id,
+            s.rent_usd,
+            s.deposit_usd,
+            s.min_lease_term_months,
+            s.is_available,
+            s.available_date
+        FROM unit_staging s
+        JOIN properties p ON p.url = s.property_url
+        JOIN apartment_units u ON (
+            u.property_id = p.property_id
+            AND u.building_name IS NOT DISTINCT FROM s.building_name
+            AND u.unit_number = s.unit_number
+        )
+        ORDER BY s.scraped_at, u.unit_id
+        ON CONFLICT (scraped_at, unit_id) DO NOTHING;
+    """
+
+    # Latest observation per unit in the batch, for PRICE_HISTORY_MODE = "interval"
+    STAGED_PRICES = """
+        SELECT DISTINCT ON (u.unit_id)
+            u.unit_id,
+            s.scraped_at,
+            s.rent_usd,
+            s.deposit_usd,
+            s.min_lease_term_months,
+            s.is_available,
+            s.available_date
+        FROM unit_staging s
+        JOIN properties p ON p.url = s.property_url
+        JOIN apartment_units u ON (
+            u.property_id = p.property_id
+            AND u.building_name IS NOT DISTINCT FROM s.building_name
+            AND u.unit_number = s.unit_number
+        )
+        ORDER BY u.unit_id, s.scraped_at DESC
+    """
+
+    MERGE_EXTEND_PRICE_INTERVALS = f"""
+        WITH staged AS ({STAGED_PRICES})
+        UPDATE price_intervals i
+        SET last_seen = GREATEST(i.last_seen, staged.scraped_at)
+        FROM staged
+        WHERE (
+            i.unit_id = staged.unit_id
+            AND i.valid_to IS NULL
+            AND (
+                i.rent_usd,
+                i.deposit_usd,
+                i.min_lease_term_months,
+                i.is_available,
+                i.available_date
+            ) IS NOT DISTINCT FROM (
+                staged.rent_usd,
+                staged.deposit_usd,
+                staged.min_lease_term_months,
+                staged.is_available,
+                staged.available_date
+            )
+        );
+    """
+
+    MERGE_CLOSE_PRICE_INTERVALS = f"""
+        WITH staged AS ({STAGED_PRICES})
+        UPDATE price_intervals i
+        SET valid_to = staged.scraped_at
+        FROM staged
+        WHERE (
+            i.unit_id = staged.unit_id
+            AND i.valid_to IS NULL
+            AND (
+                i.rent_usd,
+                i.deposit_usd,
+                i.min_lease_term_months,
+                i.is_available,
+                i.available_date
+            ) IS DISTINCT FROM (
+                staged.rent_usd,
+                staged.deposit_usd,
+                staged.min_lease_term_months,
+                staged.is_available,
+                staged.available_date
+            )
+        );
+    """
+
+    MERGE_OPEN_PRICE_INTERVALS = f"""
+        WITH staged AS ({STAGED_PRICES})
+        INSERT INTO price_intervals (
             unit_id,
+            valid_from,
+            last_seen,
+            rent_usd,
+            deposit_usd,
+            min_lease_term_months,
+            is_available,
+            available_date
+        )
+        SELECT
+            staged.unit_id,
+            staged.scraped_at,
+            staged.scraped_at,
+            staged.rent_usd,
+            staged.deposit_usd,
+            staged.min_lease_term_months,
+            staged.is_available,
+            staged.available_date
+        FROM staged
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM price_intervals i
+            WHERE (
+                i.unit_id = staged.unit_id
+                AND i.valid_to IS NULL
+            )
+        );
+    """
+
+    COUNT_UNMATCHED = """
+        SELECT count(*)
+        FROM unit_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM properties p WHERE p.url = s.property_url);
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        batch_size: int,
+        batch_seconds: float,
+        price_history_mode: str = "append",
+        db_stats: StatementStats | None = None,
+        dead_letter_dir: str | None = None,
+    ):
+        self.stats = stats
+        self.db_stats = db_stats or StatementStats()
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.price_history_mode = price_history_mode
+        self.dead_letter_dir = dead_letter_dir
+
+        self.buffer: list[UnitItem] = []
+        self.flush_loop: LoopingCall | None = None
+        # Opened on the first failed batch
+        self.dead_letter: SpoolWriter | None = None
+        self.items_flushed = 0
+        self.merge_seconds = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        if not crawler.settings.get("UNIT_PIPELINE_DEAD_LETTER_DIR"):
+            raise NotConfigured(
+                "UNIT_PIPELINE_DEAD_LETTER_DIR is required to keep failed batches."
+            )
+        return cls(
+            crawler.stats,
+            batch_size=crawler.settings.getint("UNIT_PIPELINE_BATCH_SIZE", 500),
+            batch_seconds=crawler.settings.getfloat("UNIT_PIPELINE_BATCH_SECONDS", 30),
+            price_history_mode=get_price_history_mode(crawler.settings),
+            db_stats=StatementStats.from_crawler(crawler),
+            dead_letter_dir=crawler.settings.get("UNIT_PIPELINE_DEAD_LETTER_DIR"),
+        )
+
+    def open_spider(self, spider: Spider):
+        if self.batch_seconds > 0:
+            self.flush_loop = LoopingCall(self.flush, spider)
+            self.flush_loop.start(self.batch_seconds, now=False)
+
+    def close_spider(self, spider: Spider):
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush(spider)
+
+        if self.merge_seconds > 0:
+            # Database time only, items spend longer waiting in the buffer
+            self.stats.set_value(
+                "unit_pipeline/merge_items_per_sec",
+                round(self.items_flushed / self.merge_seconds, 2),
+            )
+        if self.dead_letter is not None:
+            self.dead_letter.close()
+            self.logger.error(
+                f"{self.stats.get_value('unit_pipeline/failed_items')} units failed "
+                f"to merge and were written to {self.dead_letter_dir}, replay them "
+                f"with: python -m Leverage.spool_loader --dir {self.dead_letter_dir}"
+            )
+
+    def process_item(self, item: Item, spider: Spider):
+        if not isinstance(item, UnitItem):
+            return item  # Pass through other item types
+
+        url = item.get("property_url")
+        if not url:
+            raise DropItem("No property URL in UnitItem.")
+
+        self.buffer.append(item)
+        if len(self.buffer) >= self.batch_size:
+            self.flush(spider)
+
+        return item
+
+    def staging_row(self, item: UnitItem) -> tuple:
+        return (
+            item.get("scraped_at"),
+            item.get("property_url"),
+            item.get("floorplan_name"),
+            item.get("num_bedrooms"),
+            item.get("num_bathrooms"),
+            item.get("square_footage"),
+            item.get("unit_number"),
+            item.get("floor_number"),
+            item.get("building_name"),
+            item.get("top_floor"),
             item.get("rent_usd"),
             item.get("deposit_usd"),
             item.get("min_lease_term_months"),
@@ -315,7 +1314,138 @@ class UnitItemPipeline:
             item.get("available_date"),
         )
 
-        cur.execute(query, data)
+    def flush(self, spider: Spider) -> None:
+        if not self.buffer:
+            return
+
+        conn = getattr(spider.crawler, "postgres_conn", None)
+        if not conn:
+            raise ValueError("No PostgreSQL connection available in spider.")
+
+        batch, self.buffer = self.buffer, []
+        started = time.perf_counter()
+        try:
+            with conn.transaction(), conn.cursor() as cur:
+                self.merge_batch(cur, [self.staging_row(item) for item in batch])
+        except self.BATCH_ERRORS as e:
+            # Don't let a bad batch stop the flush loop, keep it for a replay
+            self.logger.error(f"Failed to merge batch of {len(batch)} units: {e}")
+            self.stats.inc_value("unit_pipeline/failed_batches")
+            self.stats.inc_value("unit_pipeline/failed_items", len(batch))
+            self.write_dead_letter(batch)
+            return
+
+        elapsed = time.perf_counter() - started
+        self.items_flushed += len(batch)
+        self.merge_seconds += elapsed
+        self.stats.inc_value("unit_pipeline/batches")
+        self.stats.inc_value("unit_pipeline/items_flushed", len(batch))
+        self.logger.info(
+            f"Merged batch of {len(batch)} units in {elapsed:.3f}s "
+            f"({len(batch) / elapsed:.0f} items/sec)."
+        )
+
+    def write_dead_letter(self, batch: list[UnitItem]) -> None:
+        if not self.dead_letter_dir:
+            # Runs from the flush loop, which must keep going
+            self.logger.error(
+                f"Dropped {len(batch)} units, no UNIT_PIPELINE_DEAD_LETTER_DIR."
+            )
+            return
+        if self.dead_letter is None:
+            self.dead_letter = SpoolWriter(self.dead_letter_dir)
+            self.dead_letter.open()
+        for item in batch:
+            self.dead_letter.append(encode_item(item))
+        self.dead_letter.sync()
+
+    def merge_batch(self, cur: Cursor, batch: list[tuple]) -> None:
+        self.db_stats.execute(cur, "staging_ddl", self.STAGING_DDL)
+
+        columns = ", ".join(self.STAGING_COLUMNS)
+        started = time.perf_counter()
+        with cur.copy(f"COPY unit_staging ({columns}) FROM STDIN") as copy:
+            for row in batch:
+                copy.write_row(row)
+        self.db_stats.record(
+            "copy_unit_staging", time.perf_counter() - started, len(batch)
+        )
+
+        self.db_stats.execute(cur, "count_unmatched", self.COUNT_UNMATCHED)
+        result = cur.fetchone()
+        if result and result[0]:
+            self.logger.warning(
+                f"{result[0]} units in batch have an unknown property URL."
+            )
+            self.stats.inc_value("unit_pipeline/unmatched_property", result[0])
+
+        self.db_stats.execute(cur, "merge_floorplans", self.MERGE_FLOORPLANS)
+        self.db_stats.execute(cur, "merge_apartment_units", self.MERGE_APARTMENT_UNITS)
+        if self.price_history_mode == "append":
+            self.db_stats.execute(cur, "merge_price_history", self.MERGE_PRICE_HISTORY)
+        else:
+            # Order matters: unchanged intervals are extended, changed ones closed,
+            # then every unit left without an open interval gets a new one
+            self.db_stats.execute(
+                cur, "merge_extend_price_intervals", self.MERGE_EXTEND_PRICE_INTERVALS
+            )
+            self.db_stats.execute(
+                cur, "merge_close_price_intervals", self.MERGE_CLOSE_PRICE_INTERVALS
+            )
+            self.db_stats.execute(
+                cur, "merge_open_price_intervals", self.MERGE_OPEN_PRICE_INTERVALS
+            )
+
+
+class SpoolItemPipeline:
+    """
+    Appends property, site and unit items to a local spool instead of writing to
+    Postgres, so crawl speed does not depend on database latency.
+
+    Run the loader (python -m Leverage.spool_loader) alongside or after the
+    crawl to drain sealed segments into Postgres.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, stats: StatsCollector, writer: SpoolWriter):
+        self.stats = stats
+        self.writer = writer
+        self.sync_loop: LoopingCall | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        settings = crawler.settings
+        writer = SpoolWriter(
+            settings.get("SPOOL_DIR", "spool"),
+            segment_bytes=settings.getint("SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024),
+            fsync_records=settings.getint("SPOOL_FSYNC_RECORDS", 1000),
+            fsync_seconds=settings.getfloat("SPOOL_FSYNC_SECONDS", 1.0),
+        )
+        return cls(crawler.stats, writer)
+
+    def open_spider(self, spider: Spider):
+        self.writer.open()
+        # Sync on a timer too, so a quiet crawl doesn't sit on unsynced records
+        if self.writer.fsync_seconds > 0:
+            self.sync_loop = LoopingCall(self.writer.sync)
+            self.sync_loop.start(self.writer.fsync_seconds, now=False)
+        spider.logger.info(f"Spooling items to {self.writer.directory}.")
+
+    def close_spider(self, spider: Spider):
+        if self.sync_loop and self.sync_loop.running:
+            self.sync_loop.stop()
+        self.writer.close()
+
+    def process_item(self, item: Item, spider: Spider):
+        if not isinstance(item, (PropertyItem, PropertySiteItem, UnitItem)):
+            return item  # Pass through other item types
+
+        payload = encode_item(item)
+        self.writer.append(payload)
+        self.stats.inc_value("spool/records")
+        self.stats.inc_value("spool/bytes", len(payload))
+        return item
 
 
 class PromoItemPipeline:
@@ -340,3 +1470,294 @@ class PromoItemPipeline:
         # SQL logic, often using ON CONFLICT to retrieve the existing floorplan_id
         # and cache it, so the ApartmentUnitItem can use it later.
         raise NotImplementedError("Method not yet implemented.")
+
+
+class WriteBackpressure:
+    """
+    Tracks in-flight database writes and pauses the engine while too many are
+    pending, so scraped items don't pile up in memory when Postgres falls behind.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, crawler: Crawler, max_in_flight: int):
+        self.crawler = crawler
+        self.max_in_flight = max_in_flight
+        self.resume_at = max_in_flight // 2
+        self.in_flight = 0
+        self.paused = False
+
+    @asynccontextmanager
+    async def slot(self):
+        self.in_flight += 1
+        self.crawler.stats.max_value("postgres_pool/max_in_flight", self.in_flight)
+        if self.in_flight >= self.max_in_flight and not self.paused:
+            self.logger.info(
+                f"{self.in_flight} database writes in flight, pausing engine."
+            )
+            self.crawler.engine.pause()
+            self.paused = True
+            self.crawler.stats.inc_value("postgres_pool/engine_paused")
+
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.paused and self.in_flight <= self.resume_at:
+                self.logger.info("Database writes caught up, resuming engine.")
+                self.crawler.engine.unpause()
+                self.paused = False
+
+
+class AsyncPostgresPoolPipeline:
+    """
+    Non-blocking counterpart of PostgresConnectionPipeline.
+
+    Opens a psycopg_pool.AsyncConnectionPool and exposes it, together with a
+    WriteBackpressure limiter, to the Async*ItemPipeline classes.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        db_dsn: str,
+        min_size: int,
+        max_size: int,
+        max_in_flight: int,
+        partitions_ahead: int = 2,
+    ):
+        self.db_dsn = db_dsn
+        self.partitions_ahead = partitions_ahead
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_in_flight = max_in_flight
+        self.pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler):
+        db_dsn: str = crawler.settings.get("DB_DSN")
+        if not db_dsn:
+            raise ValueError(
+                "DB_DSN setting is required for AsyncPostgresPoolPipeline."
+            )
+        pipeline = cls(
+            db_dsn,
+            min_size=crawler.settings.getint("POSTGRES_POOL_MIN_SIZE", 1),
+            max_size=crawler.settings.getint("POSTGRES_POOL_MAX_SIZE", 4),
+            max_in_flight=crawler.settings.getint("POSTGRES_MAX_IN_FLIGHT_WRITES", 100),
+            partitions_ahead=get_partitions_ahead(crawler),
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider: Spider):
+        return deferred_from_coro(self.open_pool(spider))
+
+    async def open_pool(self, spider: Spider):
+        self.pool = AsyncConnectionPool(
+            self.db_dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            kwargs={"autocommit": True},
+            open=False,
+        )
+        await self.pool.open(wait=True)
+
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                PostgresConnectionPipeline.ENSURE_PARTITIONS_QUERY,
+                (self.partitions_ahead,),
+            )
+            created = (await cur.fetchone())[0]
+        if created:
+            spider.logger.info(f"Created {created} price_history partition(s).")
+
+        # expose pool so other pipelines can use it
+        spider.crawler.postgres_pool = self.pool
+        spider.crawler.postgres_writes = WriteBackpressure(
+            spider.crawler, self.max_in_flight
+        )
+        spider.logger.info(
+            f"Postgres connection pool opened (max_size={self.max_size})."
+        )
+
+    def spider_closed(self, spider: Spider):
+        pool = getattr(spider.crawler, "postgres_pool", None)
+        if pool:
+            del spider.crawler.postgres_pool
+            return deferred_from_coro(pool.close())
+
+
+def get_async_pool(spider: Spider) -> tuple[AsyncConnectionPool, WriteBackpressure]:
+    pool = getattr(spider.crawler, "postgres_pool", None)
+    writes = getattr(spider.crawler, "postgres_writes", None)
+    if not pool or not writes:
+        raise ValueError("No PostgreSQL connection pool available in spider.")
+    return pool, writes
+
+
+class AsyncPropertyItemPipeline(PropertyItemPipeline):
+    """
+    PropertyItemPipeline running on the shared async connection pool.
+    """
+
+    async def process_item(self, item: Item, spider: Spider) -> Item:
+        if not isinstance(item, PropertyItem):
+            return item  # Pass through other item types
+
+        pool, writes = get_async_pool(spider)
+
+        if "company_name" not in item:
+            raise DropItem("PropertyItem missing company_name field.")
+
+        async with (
+            writes.slot(),
+            pool.connection() as conn,
+            conn.cursor() as cur,
+        ):
+            company_id = await self.get_company_id_async(cur, item["company_name"])
+            await self.upsert_property_async(cur, item, company_id)
+
+        return item
+
+    async def get_company_id_async(self, cur: AsyncCursor, company_name: str) -> int:
+        if (company_id := self.company_ids.get(company_name)) is not None:
+            return company_id
+
+        await self.db_stats.execute_async(
+            cur, "company_id", self.COMPANY_ID_QUERY, (company_name,)
+        )
+        result = await cur.fetchone()
+        if not result:
+            raise ValueError(
+                f"Failed to retrieve company_id for company_name={company_name}"
+            )
+        self.company_ids.put(company_name, result[0])
+        return result[0]
+
+    async def upsert_property_async(
+        self, cur: AsyncCursor, item: PropertyItem, company_id: int
+    ) -> int:
+        data = self.property_params(item, company_id)
+        await self.db_stats.execute_async(
+            cur, "upsert_property", self.UPSERT_PROPERTY_QUERY, data
+        )
+        result = await cur.fetchone()
+        if not result:
+            raise ValueError(f"Failed to upsert property with URL={data['url']}")
+
+        self.logger.info(f"Upserted property_id: {result[0]}")
+        return result[0]
+
+
+class AsyncPropertySiteItemPipeline(PropertySiteItemPipeline):
+    """
+    PropertySiteItemPipeline running on the shared async connection pool.
+    """
+
+    async def process_item(self, item: Item, spider: Spider) -> Item:
+        if not isinstance(item, PropertySiteItem):
+            return item  # Pass through other item types
+
+        pool, writes = get_async_pool(spider)
+
+        if not item.get("property_url") or not item.get("site_id"):
+            raise DropItem("PropertySiteItem missing property_url or site_id.")
+
+        async with (
+            writes.slot(),
+            pool.connection() as conn,
+            conn.cursor() as cur,
+        ):
+            await self.db_stats.execute_async(
+                cur,
+                "update_site_id",
+                self.UPDATE_SITE_ID_QUERY,
+                self.site_params(item),
+            )
+            if cur.rowcount:
+                self.stats.inc_value("property_site/updated")
+
+        return item
+
+
+class AsyncUnitItemPipeline(UnitItemPipeline):
+    """
+    UnitItemPipeline running on the shared async connection pool.
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector,
+        cache_size: int,
+        price_history_mode: str = "append",
+        db_stats: StatementStats | None = None,
+    ):
+        super().__init__(stats, cache_size, price_history_mode, db_stats)
+        # Property URL -> (lock, coroutines holding or waiting on it)
+        self.property_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    async def process_item(self, item: Item, spider: Spider):
+        if not isinstance(item, UnitItem):
+            return item  # Pass through other item types
+
+        pool, writes = get_async_pool(spider)
+
+        url = item.get("property_url")
+        if not url:
+            raise DropItem("No property URL in UnitItem.")
+
+        # Serialise writes per property, so concurrent items can't both insert
+        # the same new floorplan or unit and miss each other's row. The lock
+        # comes first, items waiting on a busy property hold no connection.
+        async with self.property_lock(url):
+            async with (
+                writes.slot(),
+                pool.connection() as conn,
+                conn.cursor() as cur,
+            ):
+                property_id = await self.get_property_id_async(cur, url)
+                async with conn.transaction():
+                    entries = await self.run_statements_async(
+                        cur, self.unit_statements(item, property_id)
+                    )
+            # Before the next item for the property reads the cache
+            self.cache_identities(entries)
+        return item
+
+    @asynccontextmanager
+    async def property_lock(self, url: str):
+        # Locks are dropped once nobody uses them, so only properties with
+        # writes in flight are kept
+        lock, users = self.property_locks.get(url, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self.property_locks[url] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self.property_locks[url]
+            if users == 1:
+                del self.property_locks[url]
+            else:
+                self.property_locks[url] = (lock, users - 1)
+
+    async def run_statements_async(
+        self, cur: AsyncCursor, statements: UnitStatements
+    ) -> list:
+        result = None
+        try:
+            while True:
+                name, query, params = statements.send(result)
+                await self.db_stats.execute_async(cur, name, query, params)
+                result = await cur.fetchone() if cur.description is not None else None
+        except StopIteration as e:
+            return e.value
+
+    async def get_property_id_async(self, cur: AsyncCursor, url: str) -> int:
+        property_id = await self.identities.property_id_async(cur, url)
+        if property_id is None:
+            raise ValueError(f"Failed to retrieve property_id for url={url}")
+        return property_id
@@ -0,0 +1,383 @@
+"""
+Crawl planner: picks which properties a DatabaseSpider crawls this run.
+
+Each active property is scored by the chance that its listing changed since
+it was last crawled, discounted by how often crawling it fails:
+
+    score = (1 - exp(-rate * days_since_crawl)) * (1 - failure_rate)
+
+rate is the property's observed changes per day over PLANNER_LOOKBACK_DAYS,
+smoothed towards one change per PRIOR_DAYS so a property with little history
+is neither ignored nor hammered. Properties never crawled score 1.
+
+Properties are planned by descending score until the request or time budget
+runs out, so volatile properties are refreshed every run and stable ones only
+once enough time has passed for a change to be likely.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING
+
+import psycopg
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+if TYPE_CHECKING:
+    from psycopg import Connection
+    from scrapy import Spider
+    from scrapy.crawler import Crawler
+    from scrapy.http import Request, Response
+    from scrapy.statscollectors import StatsCollector
+
+
+@dataclass
+class PropertyPlan:
+    property_id: int
+    url: str
+    site_id: str | None = None
+    # Distinct crawl hours in the lookback window in which any unit changed
+    change_events: int = 0
+    # Days covered by the observations in the lookback window
+    observed_days: float = 0.0
+    last_crawled_at: datetime | None = None
+    failure_rate: float = 0.0
+    template_engine: str | None = None
+    score: float = 0.0
+
+
+class CrawlPlanner:
+    """
+    Scores a spider's active properties and selects the ones to crawl.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # Smoothing prior: PRIOR_CHANGES changes every PRIOR_DAYS days
+    PRIOR_CHANGES = 1.0
+    PRIOR_DAYS = 7.0
+    # Lower bound on (1 - failure_rate), so failing properties are still retried
+    MIN_RELIABILITY = 0.1
+
+    # Per property change counts from price_history ("append" mode). A change
+    # is a scrape whose rent or availability differs from the unit's previous
+    # scrape; a unit's first scrape in the window is not a change.
+    HISTORY_OBSERVATIONS = """
+        SELECT
+            u.property_id,
+            ph.scraped_at AS observed_from,
+            ph.scraped_at AS observed_to,
+            lag(ph.scraped_at) OVER w IS NOT NULL AND (
+                ph.rent_usd IS DISTINCT FROM lag(ph.rent_usd) OVER w
+                OR ph.is_available IS DISTINCT FROM lag(ph.is_available) OVER w
+                OR ph.available_date IS DISTINCT FROM lag(ph.available_date) OVER w
+            ) AS changed
+        FROM price_history ph
+        JOIN apartment_units u ON u.unit_id = ph.unit_id
+        JOIN candidate_properties cp ON cp.property_id = u.property_id
+        WHERE ph.scraped_at >= now() - make_interval(days => %(lookback_days)s)
+        WINDOW w AS (PARTITION BY ph.unit_id ORDER BY ph.scraped_at)
+    """
+
+    # The same from price_intervals ("interval" mode), where every interval
+    # after a unit's first one in the window starts with a change
+    INTERVAL_OBSERVATIONS = """
+        SELECT
+            u.property_id,
+            greatest(
+                pi.valid_from, now() - make_interval(days => %(lookback_days)s)
+            ) AS observed_from,
+            pi.last_seen AS observed_to,
+            lag(pi.valid_from) OVER w IS NOT NULL AS changed
+        FROM price_intervals pi
+        JOIN apartment_units u ON u.unit_id = pi.unit_id
+        JOIN candidate_properties cp ON cp.property_id = u.property_id
+        WHERE pi.last_seen >= now() - make_interval(days => %(lookback_days)s)
+        WINDOW w AS (PARTITION BY pi.unit_id ORDER BY pi.valid_from)
+    """
+
+    PLAN_QUERY = """
+        WITH candidate_properties AS (
+            SELECT property_id, url, site_id, template_engine
+            FROM properties
+            WHERE {property_filter}
+                AND is_active
+                AND property_id %% %(shards)s = %(shard)s
+        ),
+        observations AS ({observations}),
+        changes AS (
+            SELECT
+                property_id,
+                count(DISTINCT date_trunc('hour', observed_from))
+                    FILTER (WHERE changed) AS change_events,
+                extract(epoch FROM max(observed_to) - min(observed_from)) / 86400
+                    AS observed_days,
+                max(observed_to) AS last_observed_at
+            FROM observations
+            GROUP BY property_id
+        )
+        SELECT
+            cp.property_id,
+            cp.url,
+            cp.site_id,
+            coalesce(c.change_events, 0) AS change_events,
+            coalesce(c.observed_days, 0)::float AS observed_days,
+            greatest(c.last_observed_at, s.last_crawled_at) AS last_crawled_at,
+            coalesce(s.failure_rate, 0)::float AS failure_rate,
+            cp.template_engine
+        FROM candidate_properties cp
+        LEFT JOIN changes c ON c.property_id = cp.property_id
+        LEFT JOIN property_crawl_stats s ON s.property_id = cp.property_id;
+    """
+
+    def __init__(
+        self,
+        stats: StatsCollector | None = None,
+        lookback_days: int = 30,
+        min_score: float = 0.0,
+        price_history_mode: str = "append",
+        itersize: int = 500,
+    ):
+        self.stats = stats
+        self.lookback_days = lookback_days
+        self.min_score = min_score
+        self.price_history_mode = price_history_mode
+        self.itersize = itersize
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> CrawlPlanner:
+        settings = crawler.settings
+        return cls(
+            crawler.stats,
+            lookback_days=settings.getint("PLANNER_LOOKBACK_DAYS", 30),
+            min_score=settings.getfloat("PLANNER_MIN_SCORE", 0.0),
+            price_history_mode=settings.get("PRICE_HISTORY_MODE", "append"),
+            itersize=settings.getint("PROPERTY_CURSOR_ITERSIZE", 500),
+        )
+
+    def fetch(
+        self,
+        conn: Connection,
+        property_filter: str,
+        filter_params: dict,
+        shard: int = 0,
+        shards: int = 1,
+    ) -> Iterator[PropertyPlan]:
+        """
+        Candidate plans, read from a server-side cursor within conn's
+        transaction itersize rows at a time.
+        """
+        if self.price_history_mode == "interval":
+            observations = self.INTERVAL_OBSERVATIONS
+        else:
+            observations = self.HISTORY_OBSERVATIONS
+        query = self.PLAN_QUERY.format(
+            observations=observations, property_filter=property_filter
+        )
+
+        with conn.cursor(name="crawl_plan") as cur:
+            cur.itersize = self.itersize
+            cur.execute(
+                query,
+                {
+                    **filter_params,
+                    "lookback_days": self.lookback_days,
+                    "shard": shard,
+                    "shards": shards,
+                },
+            )
+            for row in cur:
+                if row[1]:
+                    yield PropertyPlan(*row)
+
+    def score(self, plan: PropertyPlan, now: datetime) -> float:
+        reliability = max(1.0 - plan.failure_rate, self.MIN_RELIABILITY)
+        if plan.last_crawled_at is None:
+            return reliability
+
+        rate = (plan.change_events + self.PRIOR_CHANGES) / (
+            plan.observed_days + self.PRIOR_DAYS
+        )
+        days = max((now - plan.last_crawled_at).total_seconds(), 0.0) / 86400
+        return (1.0 - math.exp(-rate * days)) * reliability
+
+    def select(
+        self,
+        plans: Iterable[PropertyPlan],
+        max_properties: int | None = None,
+        now: datetime | None = None,
+    ) -> list[PropertyPlan]:
+        """
+        Score plans and return the best max_properties of them, best first.
+        Only the selected plans are kept in memory.
+        """
+        now = now or datetime.now(UTC)
+        candidates = 0
+
+        def scored() -> Iterator[PropertyPlan]:
+            nonlocal candidates
+            for plan in plans:
+                plan.score = self.score(plan, now)
+                if plan.score >= self.min_score:
+                    candidates += 1
+                    yield plan
+
+        if max_properties is None:
+            selected = sorted(scored(), key=lambda plan: plan.score, reverse=True)
+        else:
+            selected = heapq.nlargest(
+                max_properties, scored(), key=lambda plan: plan.score
+            )
+        if self.stats is not None:
+            self.stats.set_value("planner/candidates", candidates)
+            self.stats.set_value("planner/selected", len(selected))
+            if selected:
+                self.stats.set_value("planner/min_score", round(selected[-1].score, 4))
+        return selected
+
+    def plan(
+        self,
+        conn: Connection,
+        property_filter: str,
+        filter_params: dict,
+        max_properties: int | None = None,
+        shard: int = 0,
+        shards: int = 1,
+    ) -> list[PropertyPlan]:
+        """
+        Plan the active properties matching property_filter, a SQL condition
+        on properties using filter_params. Only properties with
+        property_id % shards equal to shard are planned (see Leverage.launcher).
+        """
+        plans = self.fetch(conn, property_filter, filter_params, shard, shards)
+        selected = self.select(plans, max_properties)
+        self.logger.info(f"Planned {len(selected)} properties.")
+        return selected
+
+
+def budget_properties(
+    request_budget: float | None,
+    time_budget: float | None,
+    requests_per_property: float,
+    seconds_per_property: float,
+) -> int | None:
+    """
+    Number of properties that fit the tighter of the two budgets, None if
+    neither is set. time_budget is in seconds of wall-clock time.
+    """
+    limits = []
+    if request_budget:
+        limits.append(request_budget / max(requests_per_property, 1e-9))
+    if time_budget:
+        limits.append(time_budget / max(seconds_per_property, 1e-9))
+    if not limits:
+        return None
+    return int(min(limits))
+
+
+def property_response_url(response: Response, request: Request) -> str | None:
+    """
+    Property URL of a successful response to a property's first request.
+    """
+    url = request.meta.get("property_url")
+    if url is not None and 200 <= response.status < 300:
+        return url
+    return None
+
+
+class CrawlStatsExtension:
+    """
+    Records per property crawl outcomes in property_crawl_stats for the planner.
+
+    A planned property counts as crawled successfully when its first request
+    (meta["property_url"], set by DatabaseSpider.start) got a 2xx response,
+    whether or not it listed any units. If the spider did not finish (closed
+    by CLOSESPIDER_TIMEOUT, shutdown, ...) only successes are recorded, since
+    the remaining properties may never have been requested.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    # failure_rate is an exponentially weighted average with this weight
+    UPSERT_QUERY = """
+        INSERT INTO property_crawl_stats AS s (
+            property_id, crawls, failures, failure_rate,
+            last_crawled_at, last_success_at
+        )
+        VALUES (
+            %(property_id)s, 1, %(failed)s::int, %(failed)s::int,
+            now(), CASE WHEN %(failed)s THEN NULL ELSE now() END
+        )
+        ON CONFLICT (property_id) DO UPDATE SET
+            crawls = s.crawls + 1,
+            failures = s.failures + EXCLUDED.failures,
+            failure_rate = s.failure_rate * (1 - %(weight)s)
+                + EXCLUDED.failures * %(weight)s,
+            last_crawled_at = EXCLUDED.last_crawled_at,
+            last_success_at = coalesce(EXCLUDED.last_success_at, s.last_success_at);
+    """
+
+    def __init__(self, db_dsn: str, weight: float = 0.3):
+        self.db_dsn = db_dsn
+        self.weight = weight
+        self.succeeded: set[str] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> CrawlStatsExtension:
+        settings = crawler.settings
+        if not settings.getbool("PLANNER_ENABLED") or not settings.get("DB_DSN"):
+            raise NotConfigured
+        ext = cls(
+            settings.get("DB_DSN"),
+            weight=settings.getfloat("PLANNER_FAILURE_WEIGHT", 0.3),
+        )
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def response_received(
+        self, response: Response, request: Request, spider: Spider
+    ) -> None:
+        if (url := property_response_url(response, request)) is not None:
+            self.succeeded.add(url)
+
+    def outcomes(
+        self, planned: dict[str, int], finished: bool
+    ) -> list[dict[str, object]]:
+        return [
+            {"property_id": property_id, "failed": url not in self.succeeded}
+            for url, property_id in planned.items()
+            if finished or url in self.succeeded
+        ]
+
+    def spider_closed(self, spider: Spider, reason: str) -> None:
+        # URL -> property_id of the properties DatabaseSpider planned
+        planned: dict[str, int] = getattr(spider, "planned_properties", {})
+        params = self.outcomes(planned, finished=reason == "finished")
+        if not params:
+            return
+
+        try:
+            with (
+                psycopg.connect(self.db_dsn, autocommit=True) as conn,
+                conn.cursor() as cur,
+            ):
+                cur.executemany(
+                    self.UPSERT_QUERY,
+                    [dict(p, weight=self.weight) for p in params],
+                )
+        except psycopg.Error as e:
+            self.logger.error(f"Failed to record property crawl stats: {e}")
+            return
+
+        failed = sum(p["failed"] for p in params)
+        spider.crawler.stats.set_value("planner/properties_failed", failed)
+        self.logger.info(
+            f"Recorded crawl stats for {len(params)} properties ({failed} failed)."
+        )
@@ -29,12 +29,55 @@ USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 ROBOTSTXT_OBEY = False
 
 # Concurrency and throttling settings
-# CONCURRENT_REQUESTS = 16
+# Requests waiting on a rate limit count against CONCURRENT_REQUESTS (up to
+# HOST_RATE_LIMIT_MAX_WAITING per bucket), leave room for other hosts
+CONCURRENT_REQUESTS = 32
 # CONCURRENT_REQUESTS_PER_DOMAIN = 1
-DOWNLOAD_DELAY = 2
-RANDOMIZE_DOWNLOAD_DELAY = 0.5
+# Pacing is done per host by HostRateLimitMiddleware instead
+DOWNLOAD_DELAY = 0
+
+# Token-bucket rate limits (see Leverage.middlewares.HostRateLimitMiddleware)
+# Groups of hosts sharing one budget; a host also matches its subdomains
+HOST_RATE_LIMITS = {
+    # Shared API behind every Repli360 site (script, template render, unit lists)
+    "repli360": {"hosts": ["app.repli360.com"], "rate": 0.5, "burst": 2},
+}
+# Budget for every other host, each on its own (None to not limit them)
+HOST_RATE_LIMIT_DEFAULT = {"rate": 0.5, "burst": 2}
+# Multiply the rate by this on a 429/503, Retry-After is honored as well
+HOST_RATE_LIMIT_BACKOFF = 0.5
+# Share of the configured rate restored per successful response
+HOST_RATE_LIMIT_RECOVERY = 0.05
+# Longest Retry-After to honor, in seconds
+HOST_RATE_LIMIT_MAX_RETRY_AFTER = 600
+# Requests that may wait on one bucket inside the downloader; later ones go back
+# to the scheduler until their turn, leaving CONCURRENT_REQUESTS to other hosts
+HOST_RATE_LIMIT_MAX_WAITING = 8
 # PLAYWRIGHT_LAUNCH_OPTIONS = {"headless": False}
 
+# Fetch UDR pages over plain HTTP, rendering with Playwright only when the
+# view model is missing
+UDR_FAST_PATH = True
+
+# HTML parser for the spiders' hot extraction paths (see Leverage.spiders.parsing):
+# "parsel" (Selectors) or "lxml" (compiled XPath on bare lxml nodes). Stays on
+# parsel until differential runs show that the two agree
+HTML_PARSER_BACKEND = "parsel"
+
+# Also run every query through parsel and count differing results under
+# parsing/divergences, e.g. when replaying the HTTP cache
+HTML_PARSER_DIFFERENTIAL = False
+
+# Playwright page pool (see Leverage.spiders.crawlers.PagePool)
+# Browser contexts pages are spread over
+PLAYWRIGHT_POOL_CONTEXTS = 2
+# Close a page after this many navigations, to contain per-page leaks
+PLAYWRIGHT_POOL_MAX_NAVIGATIONS = 50
+# Restart the browser once its processes use more than this (MiB, 0 disables)
+PLAYWRIGHT_POOL_MAX_RSS_MB = 2048
+# Check browser memory every this many released pages
+PLAYWRIGHT_POOL_RSS_CHECK_EVERY = 20
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = False
 
@@ -55,15 +98,18 @@ COOKIES_ENABLED = False
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    "Leverage.middlewares.LeverageDownloaderMiddleware": 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    # After HttpCacheMiddleware (900), so cache hits are not rate limited, and
+    # sees 429/503 before RetryMiddleware (550) reschedules them
+    "Leverage.middlewares.HostRateLimitMiddleware": 950,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # Records crawl outcomes for the planner, only active with PLANNER_ENABLED
+    "Leverage.planner.CrawlStatsExtension": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -71,17 +117,117 @@ ITEM_PIPELINES = {
     # Database and Item pipelines
     "Leverage.pipelines.PostgresConnectionPipeline": 1000,
     "Leverage.pipelines.PropertyItemPipeline": 1500,
+    # Replaces PropertyItemPipeline when PROPERTY_RECONCILE is set (indexer runs)
+    "Leverage.pipelines.PropertyReconcilePipeline": 1500,
+    "Leverage.pipelines.PropertySiteItemPipeline": 1550,
     # "Leverage.pipelines.PromoItemPipeline": 1600,
     "Leverage.pipelines.UnitItemPipeline": 1700,
+    # Buffered COPY-based ingestion for large runs (use instead of UnitItemPipeline)
+    # "Leverage.pipelines.BatchUnitItemPipeline": 1700,
+    # One round trip per item via the ingest_unit_observation() SQL function
+    # "Leverage.pipelines.IngestFunctionUnitItemPipeline": 1700,
 }
 
+# Spooled alternative: append items to a local spool and load them into
+# Postgres separately with `python -m Leverage.spool_loader`
+# ITEM_PIPELINES = {
+#     "Leverage.pipelines.SpoolItemPipeline": 1500,
+# }
+SPOOL_DIR = "spool"
+# Seal the current segment once it reaches this size
+SPOOL_SEGMENT_BYTES = 64 * 1024 * 1024
+# fsync after this many records or seconds, whichever comes first
+SPOOL_FSYNC_RECORDS = 1000
+SPOOL_FSYNC_SECONDS = 1.0
+# Records per loader transaction
+SPOOL_LOADER_BATCH_SIZE = 5000
+
+# Non-blocking alternative: async connection pool with write backpressure
+# ITEM_PIPELINES = {
+#     "Leverage.pipelines.AsyncPostgresPoolPipeline": 1000,
+#     "Leverage.pipelines.AsyncPropertyItemPipeline": 1500,
+#     "Leverage.pipelines.AsyncPropertySiteItemPipeline": 1550,
+#     "Leverage.pipelines.AsyncUnitItemPipeline": 1700,
+# }
+POSTGRES_POOL_MIN_SIZE = 1
+POSTGRES_POOL_MAX_SIZE = 4
+# Pause the engine while this many item writes are waiting on the database
+POSTGRES_MAX_IN_FLIGHT_WRITES = 100
+
+# How UnitItem prices are stored:
+#   "append": one price_history row per unit per scrape
+#   "interval": one price_intervals row per price state, unchanged scrapes only bump last_seen
+#   (needs sql/migrations/0007_price_intervals.sql on databases older than schema.sql)
+PRICE_HISTORY_MODE = "append"
+
+# Monthly price_history partitions to create ahead of the current month on open
+PRICE_HISTORY_PARTITIONS_AHEAD = 2
+
+# Write PropertyItems once per company at the end of the run, diffed against the
+# database, instead of one upsert per item (PropertyReconcilePipeline). Enabled
+# by IndexerSpider, whose runs see every property of their company.
+PROPERTY_RECONCILE = False
+# Reconciled runs: mark properties missing from the run inactive, unless fewer
+# than this share of the active properties were seen
+PROPERTY_RECONCILE_DEACTIVATE = True
+PROPERTY_RECONCILE_MIN_SEEN_RATIO = 0.5
+
+# Crawl planner (Leverage.planner), opt-in: DatabaseSpiders crawl the properties
+# most likely to have changed since their last crawl instead of every property.
+# Budgets cap the plan, 0 for no cap; "-a request_budget=N -a time_budget=SECONDS"
+# override them per run. Properties scoring below PLANNER_MIN_SCORE are skipped.
+PLANNER_ENABLED = False
+PLANNER_REQUEST_BUDGET = 0
+PLANNER_TIME_BUDGET = 0
+PLANNER_MIN_SCORE = 0.2
+# Days of price history used to estimate how often a property changes
+PLANNER_LOOKBACK_DAYS = 30
+# Weight of the latest crawl in property_crawl_stats.failure_rate
+PLANNER_FAILURE_WEIGHT = 0.3
+
+# Rows per round trip when DatabaseSpider and the crawl planner read properties
+# from server-side cursors
+PROPERTY_CURSOR_ITERSIZE = 500
+
+# Shared crawl queue (Leverage.crawltasks): DatabaseSpiders claim properties from
+# the crawl_tasks table in batches, so any number of processes or machines can run
+# the same spider against one database. Each run joins the spider's open round of
+# tasks or seeds a new one (sql/migrations/0008_crawl_task_rounds.sql). Leases of
+# crashed workers expire and are retried up to CRAWL_TASK_MAX_ATTEMPTS times.
+# Needs sql/migrations/0006 and 0008; enable per deployment with
+# -s CRAWL_TASK_QUEUE=True
+CRAWL_TASK_QUEUE = False
+CRAWL_TASK_BATCH_SIZE = 10
+CRAWL_TASK_LEASE_SECONDS = 900
+CRAWL_TASK_MAX_ATTEMPTS = 3
+# Wait between checks while other workers still hold leases
+CRAWL_TASK_POLL_SECONDS = 30
+
+# Maximum entries per in-process ID cache (properties, floorplans, units)
+IDENTITY_CACHE_SIZE = 50_000
+
+# Per-statement database timings (dbstats/* in the crawl stats). Statements slower
+# than DB_STATS_SLOW_MS are sampled with their parameters; set DB_STATS_EXPLAIN_SLOW
+# to also capture an EXPLAIN (ANALYZE, BUFFERS) plan, run in a rolled back transaction
+DB_STATS_SLOW_MS = 250
+DB_STATS_SLOW_SAMPLES = 5
+DB_STATS_EXPLAIN_SLOW = False
+
+# Flush buffered UnitItems when either limit is reached (BatchUnitItemPipeline)
+UNIT_PIPELINE_BATCH_SIZE = 500
+UNIT_PIPELINE_BATCH_SECONDS = 30
+# Batches that fail to merge are spooled here, replay them with
+# `python -m Leverage.spool_loader --dir spool/dead_letter`
+UNIT_PIPELINE_DEAD_LETTER_DIR = "spool/dead_letter"
+
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# Replaced by HostRateLimitMiddleware, which backs off per host
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
-AUTOTHROTTLE_START_DELAY = 5
+# AUTOTHROTTLE_START_DELAY = 5
 # The maximum download delay to be set in case of high latencies
-AUTOTHROTTLE_MAX_DELAY = 60
+# AUTOTHROTTLE_MAX_DELAY = 60
 # The average number of requests Scrapy should be sending in parallel to
 # each remote server
 # AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
@@ -96,6 +242,21 @@ AUTOTHROTTLE_MAX_DELAY = 60
 # HTTPCACHE_IGNORE_HTTP_CODES = []
 # HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
+# Only URLs matching HTTPCACHE_URL_TTLS are cached, see Leverage.httpcache.
+# Spiders opt in with HTTPCACHE_ENABLED in their custom_settings.
+HTTPCACHE_POLICY = "Leverage.httpcache.URLTTLPolicy"
+# URL regex -> seconds a response stays fresh when the server gives no expiry
+HTTPCACHE_URL_TTLS = {
+    # Repli360 per-site bootstrap script, effectively static
+    r"/rrac-website-script": 7 * 24 * 3600,
+    # Repli360 floorplan markup, lists which floorplans have availability
+    r"^https://app\.repli360\.com/admin/template-render$": 6 * 3600,
+    # admin/getUnitListByFloor is deliberately not listed, units change daily
+}
+# Applies to the listed URLs only. Server defaults like "no-cache" would
+# otherwise force a download on every run.
+HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS = ["no-cache"]
+
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
 
@@ -120,6 +281,36 @@ FEEDS = {
     }
 }
 
+# Compressed segments written from a background thread (see
+# Leverage/feedstorage.py): output/<name>_data_<time>.00000.jsonl.zst, ...
+# FEEDS = {
+#     "rotating:output/%(name)s_data_%(time)s.jsonl": {
+#         "format": "jsonlines",
+#         "encoding": "utf8",
+#         "store_empty": False,
+#         "rotate_bytes": 256 * 1024 * 1024,
+#     }
+# }
+
+FEED_STORAGES = {
+    "rotating": "Leverage.feedstorage.RotatingFeedStorage",
+}
+
+FEED_EXPORTERS = {
+    "parquet": "Leverage.exporters.ParquetItemExporter",
+}
+
+# Typed, compressed Parquet output, one file per item class (needs the "parquet" extra)
+# FEEDS = {
+#     f"output/%(name)s_{item_class.lower()}s_%(time)s.parquet": {
+#         "format": "parquet",
+#         "item_classes": [f"Leverage.items.{item_class}"],
+#         "store_empty": False,
+#         "item_export_kwargs": {"row_group_size": 50_000},
+#     }
+#     for item_class in ("PropertyItem", "UnitItem", "PromoItem")
+# }
+
 # PostgreSQL connection settings for Item Pipeline
 # TODO: Create a new role 'scraper' in your PostgreSQL with limited permissions
 DB_DSN = os.environ.get("DB_DSN")
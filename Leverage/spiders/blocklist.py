@@ -0,0 +1,264 @@
+"""
+Compiled URL blocklist for ContentBlockerSpider.
+
+Rules are urlmatch patterns ("*://*.example.com/*"). Blocklist files may also
+hold bare domains, hosts-file entries ("0.0.0.0 example.com") and Adblock
+domain anchors ("||example.com^"); these block the domain and its subdomains.
+Other Adblock syntax (options, exceptions, element hiding) is skipped.
+
+Hosts are stored in a trie keyed by reversed domain labels, so a lookup costs
+one step per label of the requested host regardless of the list size. Rules
+with a path are compiled into one regex per host and scheme.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled layout changes, to invalidate old caches
+CACHE_VERSION = 1
+# What unpickling a stale or truncated cache file can raise
+CACHE_ERRORS = (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError)
+
+SCHEMES = ("http", "https")
+ANY_PATH = "/*"
+
+PATTERN_RE = re.compile(r"^(\*|https?)://(\*|(?:\*\.)?[^/*]+)(/.*)$")
+DOMAIN_RE = re.compile(r"^(?:\*\.)?[a-z0-9_-]+(?:\.[a-z0-9_-]+)*$")
+ADBLOCK_DOMAIN_RE = re.compile(r"^\|\|([a-z0-9_.-]+)\^$")
+HOSTS_ADDRESSES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+HOSTS_IGNORED = {"localhost", "localhost.localdomain", "local", "0.0.0.0"}
+
+
+def parse_rule(line: str) -> str | None:
+    """
+    Convert a blocklist line to a urlmatch pattern, None if it is not a rule.
+    """
+    line = line.strip()
+    if not line or line.startswith(("#", "!", "[")):
+        return None
+    if "://" in line:
+        return line
+
+    line = line.lower()
+    fields = line.split()
+    if len(fields) >= 2 and fields[0] in HOSTS_ADDRESSES:
+        # hosts file, trailing "#" comments allowed
+        domain = fields[1]
+        if domain in HOSTS_IGNORED:
+            return None
+    elif match := ADBLOCK_DOMAIN_RE.match(line):
+        domain = match.group(1)
+    elif len(fields) == 1:
+        domain = line
+    else:
+        return None
+
+    if not DOMAIN_RE.match(domain):
+        return None
+    if domain.startswith("*."):
+        return f"*://{domain}/*"
+    return f"*://*.{domain}/*"
+
+
+def _path_regex(path: str) -> str:
+    # Same translation as urlmatch: "*" is any text, the rest is literal, and
+    # a match may be followed by further path segments
+    return ".*".join(map(re.escape, path.split("*"))) + r"(?:/.*)?"
+
+
+# Trie nodes are plain lists, which pickle several times faster than objects:
+# [children by label, schemes blocked on this host (bitmask), schemes blocked
+# on this host and its subdomains (bitmask), path rules or None]
+CHILDREN, EXACT, SUBDOMAINS, PATHS = range(4)
+SCHEME_BITS = {"http": 1, "https": 2}
+
+
+def _new_node() -> list:
+    return [{}, 0, 0, None]
+
+
+class Blocklist:
+    """
+    Matches URLs against a set of urlmatch patterns.
+
+    Gives the same answers as any(urlmatch(p, url) for p in patterns), except
+    that hosts are compared case-insensitively.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.root = _new_node()
+        # Rules with a "*" host, stored as exact rules
+        self.any_host = _new_node()
+        self.size = 0
+        # Combined path regexes, compiled on first use
+        self.compiled: dict[tuple[int, bool, str], re.Pattern] = {}
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __getstate__(self):
+        return self.root, self.any_host, self.size
+
+    def __setstate__(self, state):
+        self.root, self.any_host, self.size = state
+        self.compiled = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, pattern: str) -> None:
+        match = PATTERN_RE.match(pattern.strip())
+        if not match:
+            raise ValueError(f"Invalid blocklist pattern: {pattern!r}")
+        scheme, host, path = match.groups()
+        schemes = SCHEMES if scheme == "*" else (scheme,)
+
+        subdomains = host.startswith("*.")
+        if host == "*":
+            node = self.any_host
+        else:
+            node = self.root
+            for label in reversed(host.removeprefix("*.").lower().split(".")):
+                children = node[CHILDREN]
+                node = children.get(label) or children.setdefault(label, _new_node())
+
+        for scheme in schemes:
+            if path == ANY_PATH:
+                node[SUBDOMAINS if subdomains else EXACT] |= SCHEME_BITS[scheme]
+            else:
+                if node[PATHS] is None:
+                    node[PATHS] = {}
+                node[PATHS].setdefault((subdomains, scheme), []).append(
+                    _path_regex(path)
+                )
+                self.compiled.pop((id(node), subdomains, scheme), None)
+        self.size += 1
+
+    def matches(self, url: str) -> bool:
+        scheme, sep, rest = url.partition("://")
+        if not sep or scheme not in SCHEME_BITS:
+            return False
+        authority, slash, path = rest.partition("/")
+        if not slash:
+            # urlmatch patterns always have a path
+            return False
+        path = slash + path
+        host = authority.rpartition("@")[2].lower()
+        bit = SCHEME_BITS[scheme]
+
+        if self.rules_match(self.any_host, False, bit, scheme, path):
+            return True
+
+        node = self.root
+        labels = host.split(".")
+        for depth in range(len(labels) - 1, -1, -1):
+            node = node[CHILDREN].get(labels[depth])
+            if node is None:
+                return False
+            # Any labels left over are subdomains of this node's domain
+            if self.rules_match(node, True, bit, scheme, path):
+                return True
+        return self.rules_match(node, False, bit, scheme, path)
+
+    def rules_match(
+        self, node: list, subdomains: bool, bit: int, scheme: str, path: str
+    ) -> bool:
+        if node[SUBDOMAINS if subdomains else EXACT] & bit:
+            return True
+        if node[PATHS] is None or (subdomains, scheme) not in node[PATHS]:
+            return False
+
+        key = (id(node), subdomains, scheme)
+        regex = self.compiled.get(key)
+        if regex is None:
+            sources = node[PATHS][(subdomains, scheme)]
+            regex = re.compile("(?:" + "|".join(sources) + r")\Z")
+            self.compiled[key] = regex
+        return regex.match(path) is not None
+
+    @classmethod
+    def from_files(
+        cls, paths: Iterable[str], cache_dir: str | None = None
+    ) -> Blocklist:
+        """
+        Load blocklist files, using a compiled copy from cache_dir if the files
+        have not changed since it was written.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        cache_path = None
+        if cache_dir and paths:
+            try:
+                cache_path = os.path.join(cache_dir, f"{cache_key(paths)}.pickle")
+            except OSError as e:
+                logger.warning(f"Not caching blocklists: {e}")
+            else:
+                blocklist = cls.load_cache(cache_path)
+                if blocklist is not None:
+                    return blocklist
+
+        blocklist = cls()
+        for path in paths:
+            blocklist.add_file(path)
+        if cache_path:
+            blocklist.save_cache(cache_path)
+        return blocklist
+
+    def add_file(self, path: str) -> None:
+        added = skipped = 0
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    pattern = parse_rule(line)
+                    if pattern is None:
+                        continue
+                    try:
+                        self.add(pattern)
+                        added += 1
+                    except ValueError:
+                        skipped += 1
+        except OSError as e:
+            logger.error(f"Error reading domain file {path}: {e}")
+            return
+        logger.info(f"Loaded {added} blocklist rules from {path} ({skipped} invalid).")
+
+    @classmethod
+    def load_cache(cls, cache_path: str) -> Blocklist | None:
+        try:
+            with open(cache_path, "rb") as f:
+                blocklist = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except CACHE_ERRORS as e:
+            logger.warning(f"Ignoring unreadable blocklist cache {cache_path}: {e}")
+            return None
+        logger.info(f"Loaded {len(blocklist)} blocklist rules from {cache_path}.")
+        return blocklist
+
+    def save_cache(self, cache_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Write-then-rename so concurrent crawls never read a partial file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to write blocklist cache {cache_path}: {e}")
+
+
+def cache_key(paths: list[str]) -> str:
+    """
+    Key for a set of blocklist files, changes when any of them is modified.
+    """
+    digest = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"\0{path}\0{stat.st_mtime_ns}\0{stat.st_size}".encode())
+    return digest.hexdigest()[:32]
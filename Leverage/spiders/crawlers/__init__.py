@@ -1,3 +1,4 @@
+from ._pagepool import PagePool
 from ._spider import ContentBlockerSpider, DatabaseSpider
 
-__all__ = ["ContentBlockerSpider", "DatabaseSpider"]
+__all__ = ["ContentBlockerSpider", "DatabaseSpider", "PagePool"]
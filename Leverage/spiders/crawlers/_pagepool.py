@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Page
+    from scrapy.crawler import Crawler
+    from twisted.python.failure import Failure
+
+
+def _descendant_pids(root: int) -> set[int]:
+    # Map every process to its parent from /proc/<pid>/stat
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, the fields after it may not
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    found: set[int] = set()
+    pending = [root]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+    return found
+
+
+def browser_rss_mb() -> float:
+    """
+    Resident memory of all processes started by this crawler, in MiB.
+
+    That is the Playwright driver and the browser processes it launched.
+    Returns 0 where /proc is not available.
+    """
+    if not os.path.isdir("/proc"):
+        return 0.0
+
+    total_kb = 0
+    for pid in _descendant_pids(os.getpid()):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class PagePool:
+    """
+    Keeps Playwright pages open between requests so each property does not pay
+    for a new page.
+
+    Requests take their meta from request_meta(), which hands out an idle page
+    when there is one and otherwise lets scrapy-playwright open a new page in
+    one of `contexts` named contexts, assigned round-robin. The callback must
+    pass the page back with release() (errback() does so on failure).
+
+    A page is closed after max_navigations requests. When the browser
+    processes use more than max_rss_mb, the pool stops handing out requests
+    until the in-flight pages are released, then closes the browser;
+    scrapy-playwright launches a fresh one for the next page.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        crawler: Crawler,
+        contexts: int = 2,
+        max_navigations: int = 50,
+        max_rss_mb: float = 0,
+        rss_check_every: int = 20,
+    ):
+        if contexts < 1:
+            raise ValueError("PagePool needs at least one context.")
+        self.crawler = crawler
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.rss_check_every = rss_check_every
+
+        self.context_names = itertools.cycle(
+            f"{crawler.spidercls.name}-{i}" for i in range(contexts)
+        )
+        self.idle: list[Page] = []
+        # Navigations done by each open page, and the context it lives in
+        self.navigations: dict[Page, int] = {}
+        self.page_contexts: dict[Page, str] = {}
+        self.in_flight = 0
+        self.released = 0
+
+        self.browser: Browser | None = None
+        self.restarting = False
+        self.ready = asyncio.Event()
+        self.ready.set()
+        # Keep references so pending close() tasks are not garbage collected
+        self.tasks: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> PagePool:
+        settings = crawler.settings
+        return cls(
+            crawler,
+            contexts=settings.getint("PLAYWRIGHT_POOL_CONTEXTS", 2),
+            max_navigations=settings.getint("PLAYWRIGHT_POOL_MAX_NAVIGATIONS", 50),
+            max_rss_mb=settings.getfloat("PLAYWRIGHT_POOL_MAX_RSS_MB", 0),
+            rss_check_every=settings.getint("PLAYWRIGHT_POOL_RSS_CHECK_EVERY", 20),
+        )
+
+    def inc_stat(self, key: str) -> None:
+        # crawler.stats only exists once the crawl has started
+        if self.crawler.stats is not None:
+            self.crawler.stats.inc_value(f"page_pool/{key}")
+
+    async def wait_ready(self) -> None:
+        """
+        Wait while the browser is being restarted.
+        """
+        await self.ready.wait()
+
+    def request_meta(self) -> dict:
+        """
+        Meta for a Playwright request, reusing an idle page when possible.
+        """
+        meta = {"playwright": True, "playwright_include_page": True}
+        if self.idle:
+            page = self.idle.pop()
+            meta["playwright_page"] = page
+            meta["playwright_context"] = self.page_contexts[page]
+            self.inc_stat("pages_reused")
+        else:
+            meta["playwright_context"] = next(self.context_names)
+            self.inc_stat("pages_created")
+        self.in_flight += 1
+        return meta
+
+    def release(self, page: Page | None, context: str | None = None) -> None:
+        """
+        Return a page after its response has been parsed.
+        """
+        self.in_flight -= 1
+        if page is not None:
+            self.browser = page.context.browser or self.browser
+            self.page_contexts.setdefault(page, context)
+            self.navigations[page] = self.navigations.get(page, 0) + 1
+
+            if self.restarting or page.is_closed():
+                self.close_page(page)
+            elif self.navigations[page] >= self.max_navigations:
+                self.close_page(page)
+                self.inc_stat("pages_recycled")
+            else:
+                self.idle.append(page)
+
+        self.released += 1
+        if (
+            self.max_rss_mb
+            and not self.restarting
+            and self.released % self.rss_check_every == 0
+        ):
+            self.check_memory()
+        if self.restarting and self.in_flight == 0:
+            self.schedule(self.restart_browser())
+
+    async def errback(self, failure: Failure) -> None:
+        page = failure.request.meta.get("playwright_page")
+        if page is not None:
+            # A failed page may be left mid-navigation, do not reuse it
+            self.navigations[page] = self.max_navigations
+        self.release(page, failure.request.meta.get("playwright_context"))
+        self.crawler.spider.logger.error(
+            f"Playwright request failed for {failure.request.url}: {failure.value!r}"
+        )
+
+    def check_memory(self) -> None:
+        rss_mb = browser_rss_mb()
+        if rss_mb <= self.max_rss_mb:
+            return
+        self.logger.warning(
+            f"Browser processes use {rss_mb:.0f} MiB "
+            f"(limit {self.max_rss_mb:.0f} MiB), restarting the browser."
+        )
+        self.restarting = True
+        self.ready.clear()
+        while self.idle:
+            self.close_page(self.idle.pop())
+
+    async def restart_browser(self) -> None:
+        browser, self.browser = self.browser, None
+        if browser is not None and browser.is_connected():
+            # scrapy-playwright relaunches the browser for the next page
+            await browser.close()
+        self.navigations.clear()
+        self.page_contexts.clear()
+        self.restarting = False
+        self.ready.set()
+        self.inc_stat("browser_restarts")
+
+    def close_page(self, page: Page) -> None:
+        self.navigations.pop(page, None)
+        self.page_contexts.pop(page, None)
+        if not page.is_closed():
+            self.schedule(page.close())
+
+    def schedule(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
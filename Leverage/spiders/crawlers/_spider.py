@@ -3,12 +3,15 @@ from __future__ import annotations
 import psycopg
 import scrapy
 from psycopg.rows import dict_row
-from urlmatch import urlmatch
-from typing import TYPE_CHECKING
+from Leverage.crawltasks import CrawlTaskQueue
+from Leverage.planner import CrawlPlanner, budget_properties
+from Leverage.spiders.blocklist import Blocklist
+from typing import TYPE_CHECKING, ClassVar
+from collections.abc import AsyncIterator, Iterator
 
 if TYPE_CHECKING:
     from scrapy.crawler import Crawler
-    from playwright.async_api import Route
+    from playwright.async_api import Request as PlaywrightRequest, Route
 
 
 class DatabaseSpider(scrapy.Spider):
@@ -17,35 +20,200 @@ class DatabaseSpider(scrapy.Spider):
     """
 
     company_id: int  # To be defined in subclasses
+    # Property URL -> template engine site_id stored by a previous crawl
+    site_ids: ClassVar[dict[str, str]] = {}
+    # Property URL -> property_id of the properties planned for this crawl
+    planned_properties: ClassVar[dict[str, int]] = {}
+
+    # Average cost of crawling one property, used to fit the crawl plan
+    # into the request_budget / time_budget (seconds) spider arguments
+    requests_per_property: float = 1
+    seconds_per_property: float = 2
+
+    # Which properties the spider crawls, with property_filter_params()
+    PROPERTY_FILTER = "company_id = %(company_id)s"
+
+    ALL_PROPERTIES_QUERY = """
+        SELECT property_id, url, site_id, template_engine
+        FROM properties
+        WHERE {property_filter}
+            AND is_active
+            AND property_id %% %(shards)s = %(shard)s;
+    """
+
+    # Crawl only properties with property_id % shards == shard, see Leverage.launcher
+    shard: int = 0
+    shards: int = 1
+
+    # Set in from_crawler when properties come from the shared crawl_tasks queue
+    task_queue: CrawlTaskQueue | None = None
+    # Set in from_crawler to the planned properties without the queue
+    properties: list[dict] | None = None
 
     @classmethod
     def from_crawler(cls, crawler: Crawler, *args, **kwargs) -> DatabaseSpider:
         db_dsn: str = crawler.settings.get("DB_DSN")
 
         # cls.logger.info(f"DatabaseSpider connecting to DB with DSN: {db_dsn}")
-        with psycopg.connect(db_dsn) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                # Get property URLs to scrape
-                # TODO: Either rename this class or make it more generic
-                # TODO: Only select those that are designated for scraping
-                sql = "SELECT * FROM properties WHERE company_id=%(company_id)s"
-                cur.execute(
-                    sql,
+        # Spider arguments arrive as strings
+        kwargs["shard"] = int(kwargs.get("shard", cls.shard))
+        kwargs["shards"] = int(kwargs.get("shards", cls.shards))
+        if not 0 <= kwargs["shard"] < kwargs["shards"]:
+            raise ValueError(
+                f"Invalid shard {kwargs['shard']} of {kwargs['shards']} shards."
+            )
+
+        if crawler.settings.getbool("CRAWL_TASK_QUEUE"):
+            if kwargs["shards"] > 1:
+                # The first shard would seed only its own properties
+                raise ValueError("Sharded crawls need CRAWL_TASK_QUEUE=False.")
+            # Claimed lease by lease in start()
+            task_queue = CrawlTaskQueue.from_crawler(crawler, cls.name)
+            with psycopg.connect(db_dsn) as conn:
+                task_queue.seed(
+                    conn, lambda: cls.load_properties(crawler, conn, **kwargs)
+                )
+            kwargs["task_queue"] = task_queue
+        elif crawler.settings.getbool("PLANNER_ENABLED"):
+            with psycopg.connect(db_dsn) as conn:
+                kwargs["properties"] = cls.plan_properties(crawler, conn, **kwargs)
+        # Otherwise start() streams every active property from the database
+
+        kwargs["site_ids"] = {}
+        kwargs["planned_properties"] = {}
+
+        return super().from_crawler(crawler, *args, **kwargs)
+
+    async def start(self):
+        """
+        Yield property_request(**row) for each property to crawl, as the engine
+        asks for start requests. Subclasses define property_request, which may
+        return None to skip a property.
+        """
+        async for row in self.property_rows():
+            # Resolved by an earlier crawl, see PropertySiteItem
+            if site_id := row.get("site_id"):
+                self.site_ids[row["url"]] = site_id
+            request = await self.property_request(**row)
+            if request is not None:
+                # Its response decides whether the property was crawled, see
+                # CrawlStatsExtension
+                request.meta["property_url"] = row["url"]
+                yield request
+
+    async def property_rows(self) -> AsyncIterator[dict]:
+        if self.task_queue is not None:
+            async for task in self.task_queue.tasks():
+                self.planned_properties[task.url] = task.property_id
+                yield {
+                    "url": task.url,
+                    "site_id": task.site_id,
+                    "template_engine": task.template_engine,
+                }
+        elif self.properties is not None:
+            for row in self.properties:
+                self.planned_properties[row["url"]] = row["property_id"]
+                yield row
+        else:
+            async for row in self.stream_properties():
+                yield row
+
+    async def stream_properties(self) -> AsyncIterator[dict]:
+        """
+        Active properties of the spider, read from a server-side cursor.
+
+        Rows are fetched PROPERTY_CURSOR_ITERSIZE at a time as start() is
+        consumed, so startup does not wait for the whole table and memory does
+        not grow with it. The cursor is declared WITH HOLD outside a
+        transaction: Postgres materializes the result once, and the crawl
+        holds no transaction or snapshot open while it reads it.
+        """
+        async with await psycopg.AsyncConnection.connect(
+            self.settings.get("DB_DSN"), autocommit=True
+        ) as conn:
+            async with conn.cursor(
+                name=f"{self.name}_properties", row_factory=dict_row, withhold=True
+            ) as cur:
+                cur.itersize = self.settings.getint("PROPERTY_CURSOR_ITERSIZE", 500)
+                await cur.execute(
+                    self.ALL_PROPERTIES_QUERY.format(
+                        property_filter=self.PROPERTY_FILTER
+                    ),
                     {
-                        "company_id": cls.company_id,
+                        **self.property_filter_params(),
+                        "shard": self.shard,
+                        "shards": self.shards,
                     },
                 )
-                properties = cur.fetchall()
+                async for row in cur:
+                    yield row
 
-                start_urls = []
-                for entry in properties:
-                    url = entry.get("url")
-                    if url:
-                        start_urls.append(url)
+    @classmethod
+    def property_filter_params(cls) -> dict:
+        return {"company_id": cls.company_id}
 
-                kwargs["start_urls"] = start_urls
+    @classmethod
+    def load_properties(
+        cls, crawler: Crawler, conn: psycopg.Connection, **kwargs
+    ) -> Iterator[dict]:
+        """
+        Properties to queue, read from a server-side cursor within conn's
+        transaction PROPERTY_CURSOR_ITERSIZE rows at a time.
+        """
+        # Properties that vanished from the indexer are inactive
+        if crawler.settings.getbool("PLANNER_ENABLED"):
+            yield from cls.plan_properties(crawler, conn, **kwargs)
+            return
+        with conn.cursor(name=f"{cls.name}_properties", row_factory=dict_row) as cur:
+            cur.itersize = crawler.settings.getint("PROPERTY_CURSOR_ITERSIZE", 500)
+            cur.execute(
+                cls.ALL_PROPERTIES_QUERY.format(property_filter=cls.PROPERTY_FILTER),
+                {
+                    **cls.property_filter_params(),
+                    "shard": kwargs["shard"],
+                    "shards": kwargs["shards"],
+                },
+            )
+            yield from cur
 
-        return super().from_crawler(crawler, *args, **kwargs)
+    @classmethod
+    def plan_properties(
+        cls, crawler: Crawler, conn: psycopg.Connection, **kwargs
+    ) -> list[dict]:
+        """
+        Properties worth crawling this run, most likely to have changed first.
+        """
+        settings = crawler.settings
+        # "-a request_budget=... -a time_budget=..." override the settings
+        max_properties = budget_properties(
+            float(
+                kwargs.get("request_budget")
+                or settings.getfloat("PLANNER_REQUEST_BUDGET")
+            ),
+            float(
+                kwargs.get("time_budget") or settings.getfloat("PLANNER_TIME_BUDGET")
+            ),
+            cls.requests_per_property,
+            cls.seconds_per_property,
+        )
+        plans = CrawlPlanner.from_crawler(crawler).plan(
+            conn,
+            cls.PROPERTY_FILTER,
+            cls.property_filter_params(),
+            max_properties,
+            shard=kwargs["shard"],
+            shards=kwargs["shards"],
+        )
+        return [
+            {
+                "property_id": plan.property_id,
+                "url": plan.url,
+                "site_id": plan.site_id,
+                "template_engine": plan.template_engine,
+                "score": plan.score,
+            }
+            for plan in plans
+        ]
 
 
 class ContentBlockerSpider(scrapy.Spider):
@@ -56,30 +224,38 @@ class ContentBlockerSpider(scrapy.Spider):
     blocked_resource_types: set[str] = set()
     blocked_domains: set[str] = set()
 
+    # Compiled blocklists are cached here, keyed by file path, mtime and size
+    BLOCKLIST_CACHE_DIR = ".scrapy/blocklists"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # "-a blocklists=a.txt,b.txt" arrives as a string
         blocklists = kwargs.get("blocklists", [])
-        for blocklist in blocklists:
-            try:
-                with open(blocklist, "r") as f:
-                    for line in f:
-                        domain = line.strip()
-                        if domain and not domain.startswith("#"):
-                            self.blocked_domains.add(domain)
-            except Exception as e:
-                self.logger.error(f"Error reading domain file {blocklist}: {e}")
+        if isinstance(blocklists, str):
+            blocklists = [path for path in blocklists.split(",") if path.strip()]
 
-    async def route_handler(self, route: Route) -> None:
+        # Per instance, so loaded lists never leak into the class attribute
+        self.blocklist = Blocklist.from_files(
+            blocklists,
+            cache_dir=kwargs.get("blocklist_cache_dir", self.BLOCKLIST_CACHE_DIR),
+        )
+        for pattern in self.blocked_domains:
+            self.blocklist.add(pattern)
+
+    def should_abort_request(self, request: PlaywrightRequest) -> bool:
+        """
+        Whether to block a browser request, for PLAYWRIGHT_ABORT_REQUEST.
+        """
         # Block fonts, images, and media to speed up loading
-        if route.request.resource_type in self.blocked_resource_types:
-            await route.abort()
+        if request.resource_type in self.blocked_resource_types:
+            return True
 
         # Block known ad/tracker domains
-        # TODO: Optimize this checks
-        elif any(
-            urlmatch(pattern, route.request.url) for pattern in self.blocked_domains
-        ):
+        return self.blocklist.matches(request.url)
+
+    async def route_handler(self, route: Route) -> None:
+        if self.should_abort_request(route.request):
             await route.abort()
         else:
             await route.continue_()
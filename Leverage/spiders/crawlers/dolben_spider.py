@@ -10,6 +10,11 @@ class DolbenSpider(DatabaseSpider, Repli360Spider):
     name: str = "dolben"
     company_id: int = 1  # Company ID in DB
 
+    # Template render plus one unit list per floorplan, all to app.repli360.com
+    # (see HOST_RATE_LIMITS)
+    requests_per_property: float = 8
+    seconds_per_property: float = 16
+
     blocked_domains = set(
         [
             "*://leads.multihub.io/*",
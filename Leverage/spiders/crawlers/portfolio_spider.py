@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, ClassVar
+
+import scrapy
+
+from Leverage.spiders.crawlers import ContentBlockerSpider, DatabaseSpider
+from Leverage.spiders.crawlers.repli360_spider import Repli360Spider
+from Leverage.spiders.crawlers.udr_spider import UDRSpider
+
+if TYPE_CHECKING:
+    from scrapy.crawler import Crawler
+
+
+class PortfolioSpider(DatabaseSpider, ContentBlockerSpider):
+    """
+    Spider to scrape every active property whose template engine is supported.
+
+    Each property is handed to the engine spider for its
+    properties.template_engine, which builds the requests and parses the
+    responses. Engines run inside this crawl, so they share its browser,
+    database pipelines, HTTP cache and rate limiters.
+    """
+
+    name: str = "portfolio"
+
+    # properties.template_engine -> spider that crawls it
+    ENGINES: ClassVar[dict[str, type[scrapy.Spider]]] = {
+        "repli360": Repli360Spider,
+        "udr": UDRSpider,
+    }
+
+    PROPERTY_FILTER = "template_engine = ANY(%(template_engines)s)"
+
+    # Rough average over the engines, see requests_per_property on each spider
+    requests_per_property: float = 4
+    seconds_per_property: float = 8
+
+    # Engines' settings apply to the whole crawl, e.g. Repli360's HTTP cache
+    custom_settings: ClassVar[dict] = {
+        key: value
+        for engine in ENGINES.values()
+        for key, value in (engine.custom_settings or {}).items()
+    }
+
+    blocked_resource_types = set().union(
+        *(
+            getattr(engine, "blocked_resource_types", set())
+            for engine in ENGINES.values()
+        )
+    )
+    blocked_domains = set().union(
+        *(getattr(engine, "blocked_domains", set()) for engine in ENGINES.values())
+    )
+
+    @classmethod
+    def property_filter_params(cls) -> dict:
+        return {"template_engines": list(cls.ENGINES)}
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, *args, **kwargs) -> PortfolioSpider:
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # One abort handler for the shared browser, covering every engine
+        crawler.settings.set(
+            "PLAYWRIGHT_ABORT_REQUEST", spider.should_abort_request, priority="spider"
+        )
+        spider.engines = {
+            template_engine: spider.build_engine(engine_cls)
+            for template_engine, engine_cls in cls.ENGINES.items()
+        }
+        return spider
+
+    def build_engine(self, engine_cls: type[scrapy.Spider]) -> scrapy.Spider:
+        # Created directly, so DatabaseSpider engines do not query the database
+        engine = engine_cls(site_ids=self.site_ids)
+        engine._set_crawler(self.crawler)
+        return engine
+
+    async def property_request(
+        self, url: str, template_engine: str | None = None, **row
+    ) -> scrapy.Request | None:
+        engine = self.engines.get(template_engine)
+        if engine is None:
+            self.logger.warning(f"No engine for {template_engine!r}, skipping {url}.")
+            self.crawler.stats.inc_value("portfolio/unsupported_engine")
+            return None
+        self.crawler.stats.inc_value(f"portfolio/properties/{template_engine}")
+        return await engine.property_request(url, **row)
+
+    def closed(self, reason: str) -> None:
+        # Scrapy only closes the crawl's own spider
+        for engine in self.engines.values():
+            if callable(closed := getattr(engine, "closed", None)):
+                closed(reason)
@@ -6,11 +6,14 @@ import scrapy
 from scrapy import Selector, Spider
 from datetime import datetime, timezone
 from urllib.parse import parse_qs, urlsplit
-from Leverage.items import UnitItem, PromoItem
+from Leverage.items import UnitItem, PromoItem, PropertySiteItem
+from Leverage.spiders.parsing import parser_from_crawler
 
-from typing import TYPE_CHECKING, AsyncGenerator, Generator
+from typing import TYPE_CHECKING, Any, AsyncGenerator, ClassVar, Generator, Iterator
 
 if TYPE_CHECKING:
+    from lxml.html import HtmlElement
+    from scrapy.crawler import Crawler
     from scrapy.http import Response
 
 
@@ -26,6 +29,68 @@ APT_DETAILS_LABEL_MAP = {
 }
 
 
+# Whitespace as XPath's normalize-space() sees it
+XML_WHITESPACE = " \t\r\n"
+
+
+def _child_texts(element: HtmlElement) -> Iterator[str]:
+    """
+    Direct text nodes of element, like ./text().
+    """
+    if element.text:
+        yield element.text
+    for child in element:
+        if child.tail:
+            yield child.tail
+
+
+def _descendant_texts(element: HtmlElement) -> Iterator[str]:
+    """
+    Text nodes inside element in document order, like .//text().
+    """
+    if element.text:
+        yield element.text
+    for child in element:
+        # Comments and processing instructions have no text nodes, only tails
+        if isinstance(child.tag, str):
+            yield from _descendant_texts(child)
+        if child.tail:
+            yield child.tail
+
+
+def _first_text(element: HtmlElement) -> str | None:
+    return next(_child_texts(element), None)
+
+
+def _cell_value(cells: list[HtmlElement]) -> str | None:
+    """
+    Value of the labelled cells, following _get_apt_data_by_label.
+    """
+    value_nodes = [
+        text
+        for cell in cells
+        for text in _child_texts(cell)
+        if text.strip(XML_WHITESPACE)
+    ]
+    if not value_nodes:
+        value_nodes = [
+            text
+            for cell in cells
+            for span in cell.iter("span")
+            if "term_plan_matrix_wrapper" in span.get("class", "")
+            for text in _child_texts(span)
+        ]
+    if value_nodes:
+        return " ".join(value_nodes).strip().strip("$").replace(",", "")
+
+    for cell in cells:
+        for child in cell:
+            if isinstance(child.tag, str) and child.tag != "span":
+                for text in _descendant_texts(child):
+                    return text.strip()
+    return None
+
+
 class Repli360Spider(Spider):
     """
     Spider to scrape apartment listings from websites using the Repli360 template engine.
@@ -34,18 +99,69 @@ class Repli360Spider(Spider):
     name: str = "repli360"
     start_urls: list[str] = []
 
+    custom_settings: ClassVar[dict] = {
+        # Cache the site script and template render between runs,
+        # see HTTPCACHE_URL_TTLS
+        "HTTPCACHE_ENABLED": True,
+    }
+
     blocked_resource_types = set(["font", "image", "media"])
 
-    async def parse(self, response: Response):
+    # Property URL -> site_id resolved by an earlier crawl
+    site_ids: ClassVar[dict[str, str]] = {}
+
+    TEMPLATE_RENDER_URL = "https://app.repli360.com/admin/template-render"
+
+    def _set_crawler(self, crawler: Crawler) -> None:
+        super()._set_crawler(crawler)
+        # Also when used as an engine of PortfolioSpider
+        self.html_parser = parser_from_crawler(crawler)
+
+    async def start(self):
+        for url in self.start_urls:
+            yield await self.property_request(url)
+
+    async def property_request(self, url: str, **row) -> scrapy.Request:
+        """
+        First request for a property's landing page URL. row holds the other
+        properties columns when called from DatabaseSpider.start().
+        """
+        cb_kwargs = {}
+        if site_id := self.site_ids.get(url):
+            # Known site, the landing page is still needed for promotions
+            # but its script is not
+            self.crawler.stats.inc_value("repli360/site_id_reused")
+            cb_kwargs["site_id"] = site_id
+        # Explicit callback, the crawl's spider may be PortfolioSpider
+        return scrapy.Request(
+            url, callback=self.parse, cb_kwargs=cb_kwargs, dont_filter=True
+        )
+
+    async def parse(
+        self,
+        response: Response,
+        site_id: str | None = None,
+        rediscover: bool = False,
+    ):
         """
         Parse the main property page to find the rrac-website-script script tag.
         Use this to get the site_id needed to request property data.
+
+        With the site_id stored by an earlier crawl, go straight to the template
+        render. On rediscovery the promotions were already parsed.
         """
 
         # TODO: Add privacy policy scraping
 
         # Check for special promotions section
-        yield self.parse_special(response)
+        if not rediscover:
+            yield self.parse_special(response)
+
+        if site_id:
+            yield self.template_render_request(
+                site_id, "", start_url=response.url, stored_site_id=True
+            )
+            return
 
         # Parse main content, starting with script
         if script_url := response.css(
@@ -76,7 +192,8 @@ class Repli360Spider(Spider):
             promo_texts = []
             for key in ("sliderTitle", "sliderDescription", "sliderDisclaimer"):
                 if value := json_data.get(key):
-                    if text := Selector(text=value).xpath("*//text()").get(""):
+                    fragment = self.html_parser.parse(value)
+                    if text := self.html_parser.xpath_get(fragment, "*//text()", ""):
                         promo_texts.append(text.strip())
 
             return PromoItem(
@@ -90,7 +207,7 @@ class Repli360Spider(Spider):
 
     async def parse_script(
         self, response: Response, **kwargs
-    ) -> AsyncGenerator[scrapy.FormRequest]:
+    ) -> AsyncGenerator[scrapy.FormRequest | PropertySiteItem]:
         """
         Parse the rrac-website-script to extract site_id and request property data.
         """
@@ -108,12 +225,28 @@ class Repli360Spider(Spider):
             for arg_name, var_name in arg_map.items()
         }
 
+        start_url = kwargs.get("start_url")
+        site_id = next_kwargs["site_id"]
+        if site_id and site_id != self.site_ids.get(start_url):
+            # Stored so the next crawl can start at the template render
+            yield PropertySiteItem(property_url=start_url, site_id=site_id)
+
+        yield self.template_render_request(
+            site_id, next_kwargs["move_in_date"], start_url=start_url
+        )
+
+    def template_render_request(
+        self, site_id: str, move_in_date: str, **kwargs
+    ) -> scrapy.FormRequest:
+        """
+        Request the property's floorplan markup.
+        """
         # Send post request to get property data
-        yield scrapy.FormRequest(
-            url="https://app.repli360.com/admin/template-render",
+        return scrapy.FormRequest(
+            url=self.TEMPLATE_RENDER_URL,
             method="POST",
             formdata={
-                "site_id": next_kwargs["site_id"],
+                "site_id": site_id,
                 "action": "",
                 # "ready_script": "dom_load",
                 "ready_script": "",
@@ -122,17 +255,35 @@ class Repli360Spider(Spider):
                 "property_id": "",
             },
             callback=self.parse_property,
-            cb_kwargs={**next_kwargs, "start_url": kwargs.get("start_url")},
+            cb_kwargs={"site_id": site_id, "move_in_date": move_in_date, **kwargs},
         )
 
     async def parse_property(
         self, response: Response, site_id: str, move_in_date: str, **kwargs
-    ) -> AsyncGenerator[scrapy.FormRequest]:
+    ) -> AsyncGenerator[scrapy.Request]:
         """
         Parse the property data response to find available floorplans.
         """
 
-        floorplans = response.css("#all_available_tab .rracFloorplan")
+        parser = self.html_parser
+        floorplans = parser.css(
+            parser.parse(response.text), "#all_available_tab .rracFloorplan"
+        )
+        if not floorplans and kwargs.get("stored_site_id"):
+            # The stored site_id may be stale, resolve it again from the landing page
+            self.logger.info(
+                f"No floorplans for stored site_id {site_id}, "
+                f"rediscovering {kwargs.get('start_url')}."
+            )
+            self.crawler.stats.inc_value("repli360/site_id_rediscovered")
+            yield scrapy.Request(
+                kwargs["start_url"],
+                callback=self.parse,
+                cb_kwargs={"rediscover": True},
+                dont_filter=True,
+            )
+            return
+
         self.logger.info(
             f"Found {len(floorplans)} available floorplans"
             + (f" on {kwargs.get('start_url')}." if "start_url" in kwargs else "")
@@ -144,24 +295,26 @@ class Repli360Spider(Spider):
                 property_url=kwargs.get("start_url"),
             )
 
-            fp_info = self._parse_floorplan_card(floorplan)  # type: ignore
+            fp_info = self._parse_floorplan_card(floorplan)
             if "units_available" in fp_info:
                 del fp_info["units_available"]  # Not needed at floorplan level
             floorplan_item.update(fp_info)
 
             # Prefer explicit attributes if available
+            attrib = parser.attrib(floorplan)
             floorplan_item.update(
                 {
-                    "floorplan_id": floorplan.attrib.get("data-id"),
-                    "floorplan_name": floorplan.attrib.get("data-fpname"),
-                    "num_bedrooms": floorplan.attrib.get("data-bed"),
-                    "square_footage": floorplan.attrib.get("data-size"),
+                    "floorplan_id": attrib.get("data-id"),
+                    "floorplan_name": attrib.get("data-fpname"),
+                    "num_bedrooms": attrib.get("data-bed"),
+                    "square_footage": attrib.get("data-size"),
                 }
             )
 
             # "getUnitListByFloor(this, 'B2A' , 2 , 2221,``);"
             # this, floorPlanID , template_type , site_id, _mode, _type='2d', _special='no'
-            get_floor_func = floorplan.css(".right-sec a").attrib["onclick"]
+            links = parser.css(floorplan, ".right-sec a")
+            get_floor_func = (parser.attrib(links[0]) if links else {})["onclick"]
             if not get_floor_func:
                 self.logger.warning("No 'onclick' found for floorplan link, skipping.")
                 continue
@@ -199,9 +352,8 @@ class Repli360Spider(Spider):
     def parse_unit_table(self, response: Response, **kwargs) -> Generator[UnitItem]:
         # Get the units HTML
         response_json = json.loads(response.text)
-        table_selector = Selector(
-            text=response_json.get("str", "")
-        )  # TODO? Turn into HTMLResponse
+        parser = self.html_parser
+        table = parser.parse(response_json.get("str", ""))
 
         floorplan_item: UnitItem | None = kwargs.get("floorplan_item")
         if not floorplan_item:
@@ -211,7 +363,7 @@ class Repli360Spider(Spider):
         scraped_at = datetime.now(timezone.utc)
         today_date = scraped_at.date()
 
-        units = table_selector.css("tr.unitlisting")
+        units = parser.css(table, "tr.unitlisting")
         self.logger.info(
             f"Found {len(units)} available units for floorplan {floorplan_item.get('floorplan_name')}"
             + (f" on {kwargs.get('start_url')}." if "start_url" in kwargs else "")
@@ -219,7 +371,7 @@ class Repli360Spider(Spider):
 
         for unit in units:
             unit_item = floorplan_item.deepcopy()
-            apt_info = self._parse_listing(unit)
+            apt_info = self._parse_listing(parser.root(unit))
             unit_item.update(apt_info)
 
             # Add floorplan-level metadata
@@ -243,13 +395,13 @@ class Repli360Spider(Spider):
 
             yield unit_item
 
-    def _parse_floorplan_card(self, selector: Selector) -> dict[str, str]:
+    def _parse_floorplan_card(self, floorplan: Any) -> dict[str, str]:
         """
         Get floorplan info from text, e.g., "2 Bed | 2 Bath | 1,200 Sq Ft | 5 Units Available"
         """
 
         # TODO: Make this more robust to potential HTML changes
-        fp_desc = selector.css(".decp p::text").get()
+        fp_desc = self.html_parser.css_get(floorplan, ".decp p::text")
 
         fp_info = {}
         if fp_desc:
@@ -267,7 +419,54 @@ class Repli360Spider(Spider):
 
         return fp_info
 
-    def _parse_listing(self, selector: Selector) -> dict[str, str]:
+    def _parse_listing(self, row: Selector | HtmlElement) -> dict[str, str]:
+        """
+        Extract a unit row's fields in one walk over its cells.
+
+        Gives the same output as _parse_listing_by_label, which runs several
+        XPath queries per label, but collects every labelled <td> and the
+        lease link in a single pass over the row.
+        """
+        # (label texts, cell) for each <td> with <span> labels, in document order
+        labelled: list[tuple[list[str], HtmlElement]] = []
+        lease_link = None
+        if isinstance(row, Selector):
+            row = row.root
+        for element in row.iter("td", "a"):
+            if element.tag == "td":
+                labels = [
+                    label
+                    for child in element
+                    if child.tag == "span" and (label := _first_text(child))
+                ]
+                if labels:
+                    labelled.append((labels, element))
+            elif lease_link is None and element.get("id", "").startswith("goto_lease_"):
+                lease_link = element.get("href")
+
+        item = {}
+        for field_key, label_texts in APT_DETAILS_LABEL_MAP.items():
+            for label_text in label_texts:
+                # Substring match, like contains(text(), label_text)
+                cells = [
+                    cell
+                    for labels, cell in labelled
+                    if any(label_text in label for label in labels)
+                ]
+                value = _cell_value(cells) if cells else None
+                if value is not None:
+                    item[field_key] = value
+                    break  # Stop after finding the first matching label
+
+        self._parse_lease_link(item, lease_link)
+        return item
+
+    def _parse_listing_by_label(self, selector: Selector) -> dict[str, str]:
+        """
+        Extract a unit row's fields with XPath queries per label.
+
+        The original parser, kept as the reference for _parse_listing.
+        """
         item = {}
         for field_key, label_texts in APT_DETAILS_LABEL_MAP.items():
             for label_text in label_texts:
@@ -277,6 +476,10 @@ class Repli360Spider(Spider):
                     break  # Stop after finding the first matching label
 
         lease_link = selector.css('a[id^="goto_lease_"]::attr(href)').get()
+        self._parse_lease_link(item, lease_link)
+        return item
+
+    def _parse_lease_link(self, item: dict[str, str], lease_link: str | None) -> None:
         if lease_link and "?" in lease_link:
             qs = parse_qs(urlsplit(lease_link).query)
             if "BuildingID" in qs:
@@ -284,8 +487,6 @@ class Repli360Spider(Spider):
             if "Term" in qs:
                 item["min_lease_term_months"] = qs["Term"][0]
 
-        return item
-
     def _get_apt_data_by_label(
         self, row_selector: Selector, label_text: str
     ) -> str | None:
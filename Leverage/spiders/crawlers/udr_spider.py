@@ -1,17 +1,25 @@
 from __future__ import annotations
 
-import scrapy
 import json
+import re
+import scrapy
 from datetime import datetime, timezone
 from scrapy_playwright.page import PageMethod
 from Leverage.items import UnitItem, PromoItem
-from Leverage.spiders.crawlers import ContentBlockerSpider, DatabaseSpider
+from Leverage.spiders.parsing import JSONStream
+from Leverage.spiders.crawlers import (
+    ContentBlockerSpider,
+    DatabaseSpider,
+    PagePool,
+)
 
-from typing import TYPE_CHECKING, Generator
+from typing import TYPE_CHECKING, Generator, Iterable
 
 if TYPE_CHECKING:
     from scrapy import Item
+    from scrapy.crawler import Crawler
     from scrapy.http import Response
+    from twisted.python.failure import Failure
 
 
 class UDRSpider(DatabaseSpider, ContentBlockerSpider):
@@ -22,6 +30,10 @@ class UDRSpider(DatabaseSpider, ContentBlockerSpider):
     name: str = "udr"
     company_id: int = 2  # Company ID in DB
 
+    # One server-rendered page, at HOST_RATE_LIMIT_DEFAULT
+    requests_per_property: float = 1
+    seconds_per_property: float = 2
+
     blocked_resource_types = set(["font", "image", "media"])
     blocked_domains = set(
         [
@@ -31,67 +43,137 @@ class UDRSpider(DatabaseSpider, ContentBlockerSpider):
     )
 
     VIEWMODEL_VARIABLE_TEXT = "window.udr.jsonObjPropertyViewModel"
+    # The assignment, not other uses of the variable
+    VIEWMODEL_RE = re.compile(
+        re.escape(VIEWMODEL_VARIABLE_TEXT.encode()) + rb"\s*=(?!=)\s*"
+    )
 
-    async def start(self):
-        for url in self.start_urls:
-            yield scrapy.Request(
-                url=url,
-                meta={
-                    "playwright": True,
-                    "playwright_page_methods": [
-                        # Block unnecessary resources
-                        PageMethod(
-                            "route",
-                            url="**/*",
-                            handler=self.route_handler,
-                        ),
-                        # Ensure the main content is loaded
-                        PageMethod("wait_for_load_state", "networkidle"),
-                    ],
-                },
-            )
-
-    def parse(self, response: Response) -> Generator[Item]:
-        # Template has a view model embedded in a script tag in the head. We'll take that.
-        script_content = response.xpath(
-            f"//script[contains(., '{self.VIEWMODEL_VARIABLE_TEXT}')]/text()"
-        ).get()
-        if not script_content:
-            self.logger.error("Script tag with target text not found.")
-            return
-
-        # Extract the target
-        script_lines = script_content.strip().split("\n")
-        view_model_line = next(
-            (line for line in script_lines if self.VIEWMODEL_VARIABLE_TEXT in line),
-            None,
+    @classmethod
+    def from_crawler(cls, crawler: Crawler, *args, **kwargs) -> UDRSpider:
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # Block resources in scrapy-playwright's own route handler, which every
+        # page gets, instead of registering another route on each request
+        crawler.settings.set(
+            "PLAYWRIGHT_ABORT_REQUEST", spider.should_abort_request, priority="spider"
         )
-        if not view_model_line:
-            self.logger.error("View model line not found in script content.")
-            return
-
-        # Load ViewModel from JSON
-        view_model_json = (
-            view_model_line.strip()
-            .strip(";")
-            .removeprefix(f"{self.VIEWMODEL_VARIABLE_TEXT} = ")
+        return spider
+
+    def _set_crawler(self, crawler: Crawler) -> None:
+        super()._set_crawler(crawler)
+        # Also when used as an engine of PortfolioSpider
+        self.page_pool = PagePool.from_crawler(crawler)
+
+    async def property_request(self, url: str, **row) -> scrapy.Request:
+        """
+        First request for a property, see DatabaseSpider.start().
+        """
+        if self.settings.getbool("UDR_FAST_PATH", True):
+            # The view model is server-rendered, try without a browser first
+            self.crawler.stats.inc_value("udr/fast_path_requests")
+            return scrapy.Request(
+                url=url, callback=self.parse, errback=self.fallback_errback
+            )
+        # Hold back new pages while the browser restarts
+        await self.page_pool.wait_ready()
+        return self.playwright_request(url)
+
+    def playwright_request(self, url: str) -> scrapy.Request:
+        meta = self.page_pool.request_meta()
+        meta["playwright_page_methods"] = [
+            # Ensure the main content is loaded
+            PageMethod("wait_for_load_state", "networkidle"),
+        ]
+        return scrapy.Request(
+            url=url,
+            meta=meta,
+            # Explicit, the crawl's spider may be PortfolioSpider
+            callback=self.parse,
+            errback=self.page_pool.errback,
+            dont_filter=True,
         )
-        json_data = json.loads(view_model_json)
-        scraped_at = datetime.now(timezone.utc).isoformat()
 
-        # Parse data
-        for promo in self.parse_specials(json_data):
-            promo["scraped_at"] = scraped_at
-            yield promo
+    def fallback(self, url: str, reason: str) -> scrapy.Request:
+        self.logger.info(f"Falling back to Playwright for {url}: {reason}.")
+        self.crawler.stats.inc_value("udr/playwright_fallbacks")
+        return self.playwright_request(url)
+
+    def fallback_errback(self, failure: Failure) -> Generator[scrapy.Request]:
+        # e.g. bot protection answering the plain client with a 403
+        yield self.fallback(failure.request.url, repr(failure.value))
+
+    def parse(self, response: Response) -> Generator[Item | scrapy.Request]:
+        rendered = response.meta.get("playwright", False)
+        if rendered:
+            # The view model is in the rendered HTML, the page can be reused
+            self.page_pool.release(
+                response.meta.get("playwright_page"),
+                response.meta.get("playwright_context"),
+            )
 
-        for unit in self.parse_floorplans(json_data):
-            unit["scraped_at"] = scraped_at
-            unit["property_url"] = response.url
-            yield unit
+        view_model = self._view_model_stream(response)
+        scraped_at = datetime.now(timezone.utc).isoformat()
+        parsed = 0
+        error = "view model not found"
+        if view_model is not None:
+            try:
+                # Decoded in document order, floorPlans one floor plan at a time
+                for key, value in view_model.items(lazy_keys={"floorPlans"}):
+                    if key == "allSpecials":
+                        for promo in self.parse_specials(value):
+                            promo["scraped_at"] = scraped_at
+                            parsed += 1
+                            yield promo
+                    elif key == "floorPlans":
+                        for unit in self.parse_floorplans(value):
+                            unit["scraped_at"] = scraped_at
+                            unit["property_url"] = response.url
+                            parsed += 1
+                            yield unit
+                error = None
+            except json.JSONDecodeError as e:
+                error = f"malformed view model ({e})"
+
+        if error is None:
+            if not rendered:
+                self.crawler.stats.inc_value("udr/fast_path_parsed")
+        elif parsed:
+            # Items already went out, a rendered page would repeat them
+            self.logger.error(f"Stopped at {error} on {response.url}.")
+            self.crawler.stats.inc_value("udr/view_model_errors")
+        elif rendered:
+            self.logger.error(
+                f"No usable view model in rendered page {response.url}: {error}."
+            )
+        else:
+            yield self.fallback(response.request.url, error)
+
+    def _view_model_stream(self, response: Response) -> JSONStream | None:
+        """
+        Stream over the view model embedded in the page, None if missing.
+
+        The assignment is found in the raw body and only the rest of its
+        script is decoded, without building a DOM or a str of the page.
+        """
+        body = response.body
+        match = self.VIEWMODEL_RE.search(body)
+        if match is None:
+            return None
+        end = body.find(b"</script", match.end())
+        if end == -1:
+            end = len(body)
+        text = str(memoryview(body)[match.end() : end], response.encoding, "replace")
+        return JSONStream(text)
+
+    def closed(self, reason: str) -> None:
+        stats = self.crawler.stats
+        if fast_path_requests := stats.get_value("udr/fast_path_requests"):
+            fallbacks = stats.get_value("udr/playwright_fallbacks", 0)
+            stats.set_value(
+                "udr/fallback_rate", round(fallbacks / fast_path_requests, 4)
+            )
 
-    def parse_specials(self, json_data: dict) -> Generator[PromoItem]:
-        """Parse specials from view model"""
-        specials = json_data.get("allSpecials", [])
+    def parse_specials(self, specials: Iterable[dict]) -> Generator[PromoItem]:
+        """Parse the view model's allSpecials"""
         for special in specials:
             yield PromoItem(
                 # property_id=special.get("propertyId"),
@@ -101,9 +183,8 @@ class UDRSpider(DatabaseSpider, ContentBlockerSpider):
                 has_available_units=special.get("hasAvailableUnits"),
             )
 
-    def parse_floorplans(self, json_data: dict) -> Generator[UnitItem]:
-        """Parse floor plans from view model"""
-        floor_plans = json_data.get("floorPlans", [])
+    def parse_floorplans(self, floor_plans: Iterable[dict]) -> Generator[UnitItem]:
+        """Parse the view model's floorPlans"""
         for floor_plan in floor_plans:
             listings = floor_plan.get("units", [])
             for listing in listings:
@@ -5,7 +5,7 @@ from email.utils import parsedate_to_datetime
 from datetime import datetime
 from pathlib import Path
 from scrapy import Spider, Request
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar
 
 if TYPE_CHECKING:
     from scrapy.http import Response
@@ -28,6 +28,12 @@ class IndexerSpider(Spider):
 
     company_name: str
 
+    # An indexer run sees every property of its company, so reconcile the
+    # company's properties as a whole instead of upserting one by one
+    custom_settings: ClassVar[dict] = {
+        "PROPERTY_RECONCILE": True,
+    }
+
     async def start(self):
         for url in self.start_urls:
             yield Request(url=url)
@@ -0,0 +1,320 @@
+"""
+HTML parsing backends for the spiders' hot extraction paths.
+
+Spiders that parse many fragments (Repli360's unit tables, floorplan cards
+and promo markup) go through a backend instead of building parsel Selectors
+directly. HTML_PARSER_BACKEND picks one:
+
+- "parsel": parsel Selectors, the reference behaviour and the default.
+- "lxml": the same lxml tree parsel builds, queried with XPath compiled once
+  per expression (CSS is translated by parsel's translator) and returning
+  bare lxml nodes and strings, without a Selector around every result.
+
+With HTML_PARSER_DIFFERENTIAL, every query also runs on the parsel backend
+and results that differ are logged and counted under parsing/divergences,
+e.g. while replaying recorded pages from the HTTP cache.
+
+JSONStream decodes large embedded JSON documents (UDR's view model) one
+value at a time, so long arrays never have to be held in memory at once.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from collections.abc import Collection, Iterator
+from typing import TYPE_CHECKING, Any
+
+from lxml import etree, html
+from parsel.csstranslator import HTMLTranslator
+from parsel.selector import create_root_node
+from scrapy import Selector
+
+if TYPE_CHECKING:
+    from scrapy.crawler import Crawler
+    from scrapy.statscollectors import StatsCollector
+
+# Namespaces parsel registers for its XPath queries
+XPATH_NAMESPACES = {
+    "re": "http://exslt.org/regular-expressions",
+    "set": "http://exslt.org/sets",
+}
+
+
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class ParserBackend:
+    """
+    Parses HTML text and runs CSS/XPath queries on the resulting nodes.
+
+    Nodes are backend specific; get() turns one into the string parsel's
+    Selector.get() would return and root() into its lxml node.
+    """
+
+    name: str
+
+    def parse(self, text: str) -> Any:
+        raise NotImplementedError
+
+    def css(self, node: Any, query: str) -> list:
+        raise NotImplementedError
+
+    def xpath(self, node: Any, query: str) -> list:
+        raise NotImplementedError
+
+    def get(self, node: Any) -> str:
+        raise NotImplementedError
+
+    def root(self, node: Any) -> Any:
+        raise NotImplementedError
+
+    def attrib(self, node: Any) -> dict[str, str]:
+        root = self.root(node)
+        return dict(root.attrib) if isinstance(root, etree._Element) else {}
+
+    def css_get(self, node: Any, query: str, default: str | None = None) -> str | None:
+        results = self.css(node, query)
+        return self.get(results[0]) if results else default
+
+    def css_getall(self, node: Any, query: str) -> list[str]:
+        return [self.get(result) for result in self.css(node, query)]
+
+    def xpath_get(
+        self, node: Any, query: str, default: str | None = None
+    ) -> str | None:
+        results = self.xpath(node, query)
+        return self.get(results[0]) if results else default
+
+    def xpath_getall(self, node: Any, query: str) -> list[str]:
+        return [self.get(result) for result in self.xpath(node, query)]
+
+
+class ParselBackend(ParserBackend):
+    name = "parsel"
+
+    def parse(self, text: str) -> Selector:
+        return Selector(text=text)
+
+    def css(self, node: Selector, query: str) -> list[Selector]:
+        return list(node.css(query))
+
+    def xpath(self, node: Selector, query: str) -> list[Selector]:
+        return list(node.xpath(query))
+
+    def get(self, node: Selector) -> str:
+        return node.get()
+
+    def root(self, node: Selector) -> Any:
+        return node.root
+
+
+class LxmlBackend(ParserBackend):
+    name = "lxml"
+
+    def __init__(self):
+        self.translator = HTMLTranslator()
+        # Query -> compiled XPath, CSS queries keyed after translation
+        self.compiled: dict[str, etree.XPath] = {}
+        self.css_queries: dict[str, str] = {}
+
+    def parse(self, text: str) -> etree._Element:
+        # Same parser and cleanup as Selector(text=text)
+        return create_root_node(text, html.HTMLParser)
+
+    def compile(self, query: str) -> etree.XPath:
+        if (compiled := self.compiled.get(query)) is None:
+            try:
+                compiled = etree.XPath(query, namespaces=XPATH_NAMESPACES)
+            except etree.XPathError as e:
+                raise ValueError(f"XPath error: {e} in {query}") from e
+            self.compiled[query] = compiled
+        return compiled
+
+    def xpath(self, node: Any, query: str) -> list:
+        if not isinstance(node, etree._Element):
+            # Text and attribute results have no children
+            return []
+        result = self.compile(query)(node)
+        return result if isinstance(result, list) else [result]
+
+    def css(self, node: Any, query: str) -> list:
+        if (xpath := self.css_queries.get(query)) is None:
+            xpath = self.css_queries[query] = self.translator.css_to_xpath(query)
+        return self.xpath(node, xpath)
+
+    def get(self, node: Any) -> str:
+        if isinstance(node, etree._Element):
+            return etree.tostring(
+                node, method="html", encoding="unicode", with_tail=False
+            )
+        if isinstance(node, bool):
+            return "1" if node else "0"
+        return str(node)
+
+    def root(self, node: Any) -> Any:
+        return node
+
+
+class DifferentialParser(ParserBackend):
+    """
+    Runs every query on a primary and a reference backend and flags results
+    that differ. Results come from the primary backend; nodes are
+    (primary, reference) pairs, reference None once the two have diverged.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        primary: ParserBackend,
+        reference: ParserBackend,
+        stats: StatsCollector | None = None,
+    ):
+        self.primary = primary
+        self.reference = reference
+        self.stats = stats
+        self.name = f"{primary.name}+{reference.name}"
+        # (query, primary results, reference results) of every divergence
+        self.divergences: list[tuple[str, list[str], list[str]]] = []
+
+    def parse(self, text: str) -> tuple[Any, Any]:
+        return self.primary.parse(text), self.reference.parse(text)
+
+    def compare(self, query: str, node: tuple[Any, Any], css: bool) -> list:
+        primary_node, reference_node = node
+        method = "css" if css else "xpath"
+        results = getattr(self.primary, method)(primary_node, query)
+        if reference_node is None:
+            return [(result, None) for result in results]
+        reference_results = getattr(self.reference, method)(reference_node, query)
+
+        values = [self.primary.get(result) for result in results]
+        reference_values = [self.reference.get(result) for result in reference_results]
+        if values != reference_values:
+            self.divergences.append((query, values, reference_values))
+            if self.stats is not None:
+                self.stats.inc_value("parsing/divergences")
+            self.logger.warning(
+                f"{self.primary.name} and {self.reference.name} differ on {query!r}: "
+                f"{values[:3]!r} vs {reference_values[:3]!r}"
+            )
+            return [(result, None) for result in results]
+        return list(zip(results, reference_results, strict=True))
+
+    def css(self, node: tuple[Any, Any], query: str) -> list:
+        return self.compare(query, node, css=True)
+
+    def xpath(self, node: tuple[Any, Any], query: str) -> list:
+        return self.compare(query, node, css=False)
+
+    def get(self, node: tuple[Any, Any]) -> str:
+        return self.primary.get(node[0])
+
+    def root(self, node: tuple[Any, Any]) -> Any:
+        return self.primary.root(node[0])
+
+
+BACKENDS: dict[str, type[ParserBackend]] = {
+    "parsel": ParselBackend,
+    "lxml": LxmlBackend,
+}
+
+
+def build_parser(
+    backend: str = "parsel",
+    differential: bool = False,
+    stats: StatsCollector | None = None,
+) -> ParserBackend:
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown HTML parser backend {backend!r}, use one of {sorted(BACKENDS)}."
+        )
+    parser = BACKENDS[backend]()
+    if differential:
+        return DifferentialParser(parser, ParselBackend(), stats)
+    return parser
+
+
+def parser_from_crawler(crawler: Crawler) -> ParserBackend:
+    settings = crawler.settings
+    return build_parser(
+        settings.get("HTML_PARSER_BACKEND", "parsel"),
+        differential=settings.getbool("HTML_PARSER_DIFFERENTIAL"),
+        stats=crawler.stats,
+    )
+
+
+class JSONStream:
+    """
+    Decodes a JSON document from text[pos:] value by value.
+
+    Values are decoded with json.JSONDecoder.raw_decode, which runs the C
+    scanner, and anything after the document (a ";</script>") is ignored.
+    Raises json.JSONDecodeError on malformed input, possibly after values
+    have already been yielded.
+    """
+
+    def __init__(self, text: str, pos: int = 0):
+        self.text = text
+        self.pos = pos
+
+    def peek(self) -> str:
+        self.pos = JSON_WHITESPACE.match(self.text, self.pos).end()
+        return self.text[self.pos : self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self.text, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        value, self.pos = JSON_DECODER.raw_decode(self.text, self.pos)
+        return value
+
+    def items(self, lazy_keys: Collection[str] = ()) -> Iterator[tuple[str, Any]]:
+        """
+        Key-value pairs of an object. Arrays under lazy_keys are yielded as
+        iterators over their elements, which must be consumed before the
+        next pair; the rest of them is skipped otherwise.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise json.JSONDecodeError(
+                    "Expecting property name", self.text, self.pos
+                )
+            key = self.value()
+            self.expect(":")
+            if key in lazy_keys and self.peek() == "[":
+                elements = self.elements()
+                yield key, elements
+                for _ in elements:
+                    pass
+            else:
+                yield key, self.value()
+            if self.peek() != ",":
+                self.expect("}")
+                return
+            self.pos += 1
+
+    def elements(self) -> Iterator[Any]:
+        """
+        Elements of an array, each decoded when the previous one is done.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() != ",":
+                self.expect("]")
+                return
+            self.pos += 1
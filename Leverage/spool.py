@@ -0,0 +1,234 @@
+"""
+Durable local spool for scraped items.
+
+The spool is a directory of append-only segment files. Each record is a
+length-prefixed, CRC-checked JSON document:
+
+    | length (uint32, big-endian) | crc32 (uint32, big-endian) | payload |
+
+A segment is written as "<name>.open" and renamed to "<name>.seg" once it is
+full or the crawl ends. Only sealed segments are read by the loader
+(see Leverage.spool_loader), so a reader never races the writer.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from scrapy import Item
+
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">II")
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+
+
+def encode_item(item: Item) -> bytes:
+    return encode_record(type(item).__name__, dict(item))
+
+
+def encode_record(item_type: str, item: dict) -> bytes:
+    record = {"type": item_type, "item": item}
+    return json.dumps(record, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def decode_item(payload: bytes) -> tuple[str, dict]:
+    record = json.loads(payload)
+    return record["type"], record["item"]
+
+
+def read_records(path: str, offset: int = 0) -> Iterator[tuple[bytes, int]]:
+    """
+    Yield (payload, end offset) for each intact record after offset.
+
+    Stops at the first torn or corrupt record, which can only be the tail of a
+    segment whose writer crashed mid-append.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            header = f.read(HEADER.size)
+            if not header:
+                return
+            if len(header) < HEADER.size:
+                logger.warning(f"Torn record header at {path}:{offset}, stopping.")
+                return
+
+            length, crc = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                logger.warning(f"Torn or corrupt record at {path}:{offset}, stopping.")
+                return
+
+            offset += HEADER.size + length
+            yield payload, offset
+
+
+def valid_length(path: str) -> int:
+    """
+    Return the byte length of the intact records at the start of a segment.
+    """
+    # Offsets only grow, the last one is the largest
+    return max((end for _, end in read_records(path)), default=0)
+
+
+def _fsync_dir(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _writer_alive(path: str) -> bool:
+    # Segment names end in the writer PID, see SpoolWriter.new_segment()
+    try:
+        pid = int(os.path.basename(path).removesuffix(OPEN_SUFFIX).rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def seal(path: str, length: int | None = None) -> str:
+    """
+    Truncate a torn tail off an open segment and rename it to a sealed one.
+
+    Pass length when the intact size is already known, to skip re-reading.
+    """
+    if length is None:
+        length = valid_length(path)
+    with open(path, "r+b") as f:
+        if f.seek(0, os.SEEK_END) != length:
+            logger.warning(f"Truncating torn tail of {path} to {length} bytes.")
+            f.truncate(length)
+        f.flush()
+        os.fsync(f.fileno())
+
+    sealed = path.removesuffix(OPEN_SUFFIX) + SEALED_SUFFIX
+    os.replace(path, sealed)
+    _fsync_dir(os.path.dirname(sealed) or ".")
+    return sealed
+
+
+def recover_segments(directory: str) -> list[str]:
+    """
+    Seal open segments left behind by writers that are no longer running.
+    """
+    recovered = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(OPEN_SUFFIX) and not _writer_alive(path):
+            logger.info(f"Recovering abandoned spool segment {name}.")
+            recovered.append(seal(path))
+    return recovered
+
+
+def sealed_segments(directory: str) -> list[str]:
+    # Names start with a zero-padded timestamp, so they sort in write order
+    return sorted(
+        name for name in os.listdir(directory) if name.endswith(SEALED_SUFFIX)
+    )
+
+
+class SpoolWriter:
+    """
+    Appends records to the current segment of a spool directory.
+
+    Writes go through the OS page cache and are fsynced in batches: after
+    fsync_records records or fsync_seconds, whichever comes first. A crash
+    loses at most that window. Segments are sealed after segment_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync_records: int = 1000,
+        fsync_seconds: float = 1.0,
+    ):
+        if segment_bytes <= 0:
+            raise ValueError("SpoolWriter segment_bytes must be positive.")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_records = fsync_records
+        self.fsync_seconds = fsync_seconds
+
+        self.file = None
+        self.path: str | None = None
+        self.size = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        recover_segments(self.directory)
+        self.new_segment()
+
+    def new_segment(self) -> None:
+        name = f"{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}"
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path, "ab")  # noqa: SIM115 - closed in seal_current()
+        self.size = 0
+        _fsync_dir(self.directory)
+
+    def append(self, payload: bytes) -> None:
+        if self.file is None:
+            raise ValueError("SpoolWriter is not open.")
+
+        self.file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.size += HEADER.size + len(payload)
+        self.unsynced += 1
+
+        if (
+            self.unsynced >= self.fsync_records
+            or time.monotonic() - self.last_sync >= self.fsync_seconds
+        ):
+            self.sync()
+        if self.size >= self.segment_bytes:
+            self.rotate()
+
+    def sync(self) -> None:
+        if self.file is None or not self.unsynced:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def rotate(self) -> None:
+        self.seal_current()
+        self.new_segment()
+
+    def seal_current(self) -> None:
+        # seal() fsyncs the file before renaming it
+        self.file.close()
+        self.file = None
+
+        if self.size:
+            seal(self.path, self.size)
+        else:
+            os.remove(self.path)
+        self.path = None
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.seal_current()
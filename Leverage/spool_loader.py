@@ -0,0 +1,300 @@
+"""
+Drain sealed spool segments into Postgres.
+
+    python -m Leverage.spool_loader [--follow]
+
+Records are loaded in batches of SPOOL_LOADER_BATCH_SIZE, one transaction per
+batch, reusing the set-based merge of BatchUnitItemPipeline. After every
+committed batch the position is checkpointed, so a restarted loader resumes
+where the last one stopped. A batch that committed right before a crash may be
+loaded twice; all merges are idempotent.
+
+Records that cannot be decoded or loaded (bad values, unknown companies) are
+moved to a spool under <dir>/quarantine and counted under
+spool_loader/quarantined, so they never hold up the rest of the spool. Replay
+them with --dir <dir>/quarantine once fixed. Only database outages stop the
+loader.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING
+
+import psycopg
+from scrapy.utils.project import get_project_settings
+
+from Leverage.dbstats import StatementStats
+from Leverage.pipelines import (
+    BatchUnitItemPipeline,
+    PropertyItemPipeline,
+    PropertySiteItemPipeline,
+    get_price_history_mode,
+)
+from Leverage.spool import (
+    SpoolWriter,
+    decode_item,
+    encode_record,
+    read_records,
+    recover_segments,
+    sealed_segments,
+)
+
+if TYPE_CHECKING:
+    from psycopg import Connection, Cursor
+
+
+class LoaderStats(dict):
+    """
+    Minimal stand-in for Scrapy's stats collector outside of a crawl.
+    """
+
+    def inc_value(self, key, count=1, start=0):
+        self[key] = self.get(key, start) + count
+
+    def set_value(self, key, value):
+        self[key] = value
+
+
+class SpoolLoader:
+    logger = logging.getLogger(__name__)
+
+    CHECKPOINT_FILE = "checkpoint.json"
+    QUARANTINE_DIR = "quarantine"
+    # Errors caused by the records themselves, e.g. a value Postgres rejects or
+    # an unknown company. OperationalError (the database is gone) is not one.
+    RECORD_ERRORS = (psycopg.Error, ValueError, KeyError, TypeError)
+
+    def __init__(
+        self,
+        directory: str,
+        conn: Connection,
+        batch_size: int = 5000,
+        price_history_mode: str = "append",
+        cache_size: int = 50_000,
+    ):
+        self.directory = directory
+        self.conn = conn
+        self.batch_size = batch_size
+        self.stats = LoaderStats()
+        self.db_stats = StatementStats(self.stats)
+        self.properties = PropertyItemPipeline(cache_size, db_stats=self.db_stats)
+        self.sites = PropertySiteItemPipeline(self.stats, db_stats=self.db_stats)
+        self.units = BatchUnitItemPipeline(
+            self.stats,
+            batch_size,
+            0,
+            price_history_mode=price_history_mode,
+            db_stats=self.db_stats,
+        )
+        # Opened on the first quarantined record of a drain
+        self.quarantine_writer: SpoolWriter | None = None
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.directory, self.CHECKPOINT_FILE)
+
+    def load_checkpoint(self) -> tuple[str | None, int]:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None, 0
+        return checkpoint["segment"], checkpoint["offset"]
+
+    def save_checkpoint(self, segment: str, offset: int) -> None:
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def drain(self) -> int:
+        """
+        Load every sealed segment, deleting each once fully loaded.
+
+        Returns the number of records loaded.
+        """
+        recover_segments(self.directory)
+        done_segment, done_offset = self.load_checkpoint()
+
+        loaded = 0
+        for segment in sealed_segments(self.directory):
+            if done_segment is not None and segment < done_segment:
+                # Loaded before a crash that happened ahead of the delete
+                os.remove(os.path.join(self.directory, segment))
+                continue
+
+            offset = done_offset if segment == done_segment else 0
+            loaded += self.load_segment(segment, offset)
+            os.remove(os.path.join(self.directory, segment))
+            self.stats.inc_value("spool_loader/segments")
+
+        if self.quarantine_writer is not None:
+            self.quarantine_writer.close()
+            self.quarantine_writer = None
+        return loaded
+
+    def load_segment(self, segment: str, offset: int) -> int:
+        path = os.path.join(self.directory, segment)
+        loaded = 0
+        batch: list[tuple[str, dict]] = []
+
+        for payload, end in read_records(path, offset):
+            try:
+                batch.append(decode_item(payload))
+            except (ValueError, KeyError, TypeError) as e:
+                self.quarantine(payload, f"undecodable record: {e!r}")
+            if len(batch) >= self.batch_size:
+                loaded += self.load_or_quarantine(batch)
+                self.save_checkpoint(segment, end)
+                batch = []
+
+        if batch:
+            loaded += self.load_or_quarantine(batch)
+        # Mark the whole segment as done before it is deleted
+        self.save_checkpoint(segment, os.path.getsize(path))
+
+        self.logger.info(f"Loaded {loaded} records from {segment}.")
+        return loaded
+
+    def load_or_quarantine(self, batch: list[tuple[str, dict]]) -> int:
+        """
+        Load a batch, or its records one by one if it fails, quarantining the
+        ones that fail on their own. Returns the number of records loaded.
+        """
+        try:
+            self.load_batch(batch)
+            return len(batch)
+        except psycopg.OperationalError:
+            raise
+        except self.RECORD_ERRORS as e:
+            self.logger.warning(
+                f"Batch of {len(batch)} records failed, loading one by one: {e!r}"
+            )
+
+        loaded = 0
+        for item_type, item in batch:
+            try:
+                self.load_batch([(item_type, item)])
+                loaded += 1
+            except psycopg.OperationalError:
+                raise
+            except self.RECORD_ERRORS as e:
+                self.quarantine(encode_record(item_type, item), repr(e))
+        return loaded
+
+    def quarantine(self, payload: bytes, reason: str) -> None:
+        if self.quarantine_writer is None:
+            self.quarantine_writer = SpoolWriter(
+                os.path.join(self.directory, self.QUARANTINE_DIR)
+            )
+            self.quarantine_writer.open()
+        self.quarantine_writer.append(payload)
+        # Durable before the checkpoint moves past the record
+        self.quarantine_writer.sync()
+        self.stats.inc_value("spool_loader/quarantined")
+        self.logger.error(f"Quarantined spool record ({reason}): {payload[:200]!r}")
+
+    def load_batch(self, batch: list[tuple[str, dict]]) -> None:
+        started = time.perf_counter()
+        unit_rows = []
+
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            # Properties go first so units in the same batch can reference them
+            for item_type, item in batch:
+                if item_type == "PropertyItem":
+                    self.load_property(cur, item)
+                elif item_type == "PropertySiteItem":
+                    self.load_property_site(cur, item)
+                elif item_type == "UnitItem":
+                    unit_rows.append(self.units.staging_row(item))
+
+            if unit_rows:
+                self.units.merge_batch(cur, unit_rows)
+
+        elapsed = time.perf_counter() - started
+        self.stats.inc_value("spool_loader/batches")
+        self.stats.inc_value("spool_loader/records", len(batch))
+        self.logger.info(
+            f"Loaded batch of {len(batch)} records in {elapsed:.3f}s "
+            f"({len(batch) / elapsed:.0f} records/sec)."
+        )
+
+    def load_property(self, cur: Cursor, item: dict) -> None:
+        company_name = item.get("company_name")
+        if not company_name:
+            self.logger.warning(f"Skipping spooled property without company: {item}")
+            self.stats.inc_value("spool_loader/skipped_properties")
+            return
+        company_id = self.properties.get_company_id(cur, company_name)
+        self.properties.upsert_property(cur, item, company_id)
+
+    def load_property_site(self, cur: Cursor, item: dict) -> None:
+        if not item.get("property_url") or not item.get("site_id"):
+            self.logger.warning(f"Skipping spooled site without property: {item}")
+            self.stats.inc_value("spool_loader/skipped_sites")
+            return
+        self.sites.update_site_id(cur, item)
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = get_project_settings()
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=settings.get("SPOOL_DIR", "spool"))
+    parser.add_argument("--dsn", default=settings.get("DB_DSN"))
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.getint("SPOOL_LOADER_BATCH_SIZE", 5000),
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep polling for new segments instead of exiting when drained.",
+    )
+    parser.add_argument("--poll-seconds", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=settings.get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+    )
+    if not args.dsn:
+        raise ValueError("DB_DSN setting or --dsn is required for the spool loader.")
+    os.makedirs(args.dir, exist_ok=True)
+
+    while True:
+        try:
+            with psycopg.connect(args.dsn, autocommit=True) as conn:
+                loader = SpoolLoader(
+                    args.dir,
+                    conn,
+                    batch_size=args.batch_size,
+                    price_history_mode=get_price_history_mode(settings),
+                    cache_size=settings.getint("IDENTITY_CACHE_SIZE", 50_000),
+                )
+                while True:
+                    loader.drain()
+                    if not args.follow:
+                        loader.db_stats.dump()
+                        SpoolLoader.logger.info(f"Spool drained: {dict(loader.stats)}")
+                        return
+                    time.sleep(args.poll_seconds)
+        except psycopg.OperationalError as e:
+            # Postgres is down or restarting; the checkpoint keeps our place
+            if not args.follow:
+                raise
+            SpoolLoader.logger.error(f"Database unavailable, retrying: {e}")
+            time.sleep(args.poll_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark parsing Repli360 unit tables.
+
+    python benchmarks/bench_repli360_parser.py [--units 1000] [--repeat 5]
+
+Builds a synthetic getUnitListByFloor table and reports rows per second for
+the single-pass Repli360Spider._parse_listing and the per-label XPath parser
+it replaces, after checking that both give the same output. Also times
+parse_unit_table end to end with each HTML_PARSER_BACKEND.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scrapy import Selector
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from Leverage.items import UnitItem
+from Leverage.spiders.crawlers.repli360_spider import Repli360Spider
+from Leverage.spiders.parsing import BACKENDS
+
+
+def make_row(i: int, rng: random.Random) -> str:
+    if i % 3 == 0:
+        # Rent matrix link instead of a plain price
+        rent = (
+            "<td><span>Total Monthly Leasing Price Starting At</span>"
+            f'<a href="#"><span class="term_plan_matrix_wrapper">${rng.randrange(900, 4000):,}</span></a></td>'
+        )
+    else:
+        rent = f"<td><span>Starting At</span> ${rng.randrange(900, 4000):,} </td>"
+    available = "Available Now" if i % 2 else f"{rng.randrange(1, 13):02d}-15-2026"
+    return (
+        '<tr class="unitlisting">'
+        f"<td><span>Unit Number</span> {1000 + i} </td>"
+        f"<td><span>Building Number</span> {i % 12 + 1} </td>"
+        f"{rent}"
+        f"<td><span>Deposit</span> ${rng.randrange(200, 1000):,} </td>"
+        f"<td><span>Availability</span><div><b>{available}</b></div></td>"
+        f'<td><a id="goto_lease_{i}" href="/lease?BuildingID={i % 12 + 1}&amp;Term=12">Lease</a></td>'
+        "</tr>"
+    )
+
+
+def bench(name: str, parse, rows: list[Selector], repeat: int) -> None:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for row in rows:
+            parse(row)
+    elapsed = time.perf_counter() - started
+    print(f"{name}: {len(rows) * repeat / elapsed:,.0f} rows/sec")
+
+
+def bench_backends(table: str, units: int, repeat: int) -> None:
+    response = TextResponse(
+        "https://app.repli360.com/admin/getUnitListByFloor",
+        body=json.dumps({"str": f"<table>{table}</table>"}).encode(),
+    )
+    for backend in BACKENDS:
+        spider = Repli360Spider()
+        spider._set_crawler(
+            get_crawler(Repli360Spider, {"HTML_PARSER_BACKEND": backend})
+        )
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for _ in spider.parse_unit_table(
+                response, floorplan_item=UnitItem(floorplan_name="A1")
+            ):
+                pass
+        elapsed = time.perf_counter() - started
+        print(f"parse_unit_table, {backend}: {units * repeat / elapsed:,.0f} rows/sec")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--units", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    table = "".join(make_row(i, rng) for i in range(args.units))
+    rows = Selector(text=f"<table>{table}</table>").css("tr.unitlisting")
+
+    spider = Repli360Spider()
+    for row in rows:
+        assert spider._parse_listing(row) == spider._parse_listing_by_label(row)
+
+    print(f"{len(rows):,} units, {args.repeat} passes")
+    bench("single pass", spider._parse_listing, rows, args.repeat)
+    bench("per-label XPath", spider._parse_listing_by_label, rows, args.repeat)
+
+    # parse_unit_table logs every table
+    logging.disable(logging.INFO)
+    bench_backends(table, len(rows), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
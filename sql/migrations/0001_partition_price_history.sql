@@ -0,0 +1,61 @@
+--
+-- Convert an existing, unpartitioned price_history into the monthly range
+-- partitioned layout of sql/schema.sql. Requires
+-- public.create_price_history_partitions() from sql/schema.sql.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0001_partition_price_history.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.price_history RENAME TO price_history_unpartitioned;
+ALTER TABLE public.price_history_unpartitioned RENAME CONSTRAINT price_history_pkey TO price_history_unpartitioned_pkey;
+ALTER TABLE public.price_history_unpartitioned RENAME CONSTRAINT price_history_unit_id_fkey TO price_history_unpartitioned_unit_id_fkey;
+
+CREATE TABLE public.price_history (
+    scraped_at timestamp with time zone NOT NULL,
+    unit_id bigint NOT NULL,
+    rent_usd numeric(8,2) NOT NULL,
+    deposit_usd numeric(8,2),
+    min_lease_term_months smallint,
+    is_available boolean,
+    available_date date
+)
+PARTITION BY RANGE (scraped_at);
+
+ALTER TABLE public.price_history OWNER TO postgres;
+
+ALTER TABLE public.price_history
+    ADD CONSTRAINT price_history_pkey PRIMARY KEY (scraped_at, unit_id);
+
+ALTER TABLE public.price_history
+    ADD CONSTRAINT price_history_unit_id_fkey FOREIGN KEY (unit_id) REFERENCES public.apartment_units(unit_id);
+
+CREATE INDEX price_history_scraped_at_brin ON public.price_history USING brin (scraped_at);
+
+CREATE INDEX price_history_unit_id_scraped_at_idx ON public.price_history USING btree (unit_id, scraped_at DESC);
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.price_history TO scraper;
+
+-- Partitions from the oldest stored month up to two months ahead
+SELECT public.create_price_history_partitions(
+    oldest,
+    (
+        (extract(year FROM current_month) - extract(year FROM oldest)) * 12
+        + extract(month FROM current_month) - extract(month FROM oldest)
+    )::integer + 2
+)
+FROM (
+    SELECT
+        coalesce(min(scraped_at AT TIME ZONE 'UTC'), now() AT TIME ZONE 'UTC')::date AS oldest,
+        (now() AT TIME ZONE 'UTC')::date AS current_month
+    FROM public.price_history_unpartitioned
+) bounds;
+
+INSERT INTO public.price_history
+SELECT * FROM public.price_history_unpartitioned;
+
+DROP TABLE public.price_history_unpartitioned;
+
+COMMIT;
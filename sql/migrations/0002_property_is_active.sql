@@ -0,0 +1,19 @@
+--
+-- Track properties that disappeared from indexer output, see
+-- PropertyReconcilePipeline.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0002_property_is_active.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.properties
+    ADD COLUMN is_active boolean DEFAULT true NOT NULL,
+    ADD COLUMN deactivated_at timestamp with time zone;
+
+COMMENT ON COLUMN public.properties.is_active IS 'False once the property disappears from its company''s indexer output; inactive properties are not crawled.';
+
+CREATE INDEX properties_company_id_active_idx ON public.properties USING btree (company_id) WHERE is_active;
+
+COMMIT;
@@ -0,0 +1,90 @@
+--
+-- Server-side ingest of one unit observation, see
+-- IngestFunctionUnitItemPipeline.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0003_ingest_unit_observation.sql
+--
+
+CREATE OR REPLACE FUNCTION public.ingest_unit_observation(p_property_url text, p_scraped_at timestamp with time zone, p_plan_name character varying, p_bedrooms numeric, p_bathrooms numeric, p_square_footage integer, p_unit_number character varying, p_floor_number integer, p_building_name character varying, p_is_on_top_floor boolean, p_rent_usd numeric, p_deposit_usd numeric, p_min_lease_term_months smallint, p_is_available boolean, p_available_date date, p_interval_mode boolean DEFAULT false) RETURNS bigint
+    LANGUAGE plpgsql
+    SET search_path TO 'public', 'pg_temp'
+    AS $$
+DECLARE
+    v_property_id bigint;
+    v_floorplan_id bigint;
+    v_unit_id bigint;
+BEGIN
+    -- One scraped unit in one round trip: floorplan upsert, unit upsert and
+    -- price observation, atomically. Returns NULL for an unknown property URL.
+    SELECT property_id INTO v_property_id
+    FROM properties
+    WHERE url = p_property_url;
+
+    IF v_property_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO floorplans (property_id, plan_name, bedrooms, bathrooms, square_footage)
+    VALUES (v_property_id, p_plan_name, p_bedrooms, p_bathrooms, p_square_footage)
+    ON CONFLICT (property_id, plan_name) DO NOTHING
+    RETURNING floorplan_id INTO v_floorplan_id;
+
+    IF v_floorplan_id IS NULL THEN
+        SELECT floorplan_id INTO v_floorplan_id
+        FROM floorplans
+        WHERE property_id = v_property_id AND plan_name = p_plan_name;
+    END IF;
+
+    -- building_name is nullable, so the unique constraint never fires for units
+    -- without a building. Match those explicitly to avoid duplicates.
+    SELECT unit_id INTO v_unit_id
+    FROM apartment_units
+    WHERE property_id = v_property_id
+        AND building_name IS NOT DISTINCT FROM p_building_name
+        AND unit_number = p_unit_number;
+
+    IF v_unit_id IS NULL THEN
+        INSERT INTO apartment_units (property_id, floorplan_id, unit_number, floor_number, building_name, is_on_top_floor)
+        VALUES (v_property_id, v_floorplan_id, p_unit_number, p_floor_number, p_building_name, p_is_on_top_floor)
+        ON CONFLICT (property_id, building_name, unit_number) DO NOTHING
+        RETURNING unit_id INTO v_unit_id;
+
+        IF v_unit_id IS NULL THEN
+            -- Inserted concurrently by another session
+            SELECT unit_id INTO v_unit_id
+            FROM apartment_units
+            WHERE property_id = v_property_id
+                AND building_name = p_building_name
+                AND unit_number = p_unit_number;
+        END IF;
+    END IF;
+
+    IF NOT p_interval_mode THEN
+        INSERT INTO price_history (scraped_at, unit_id, rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+        VALUES (p_scraped_at, v_unit_id, p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date)
+        ON CONFLICT (scraped_at, unit_id) DO NOTHING;
+        RETURN v_unit_id;
+    END IF;
+
+    -- Interval mode: extend the open interval if the price state is unchanged,
+    -- otherwise close it and open a new one
+    UPDATE price_intervals
+    SET last_seen = GREATEST(last_seen, p_scraped_at)
+    WHERE unit_id = v_unit_id
+        AND valid_to IS NULL
+        AND (rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+            IS NOT DISTINCT FROM (p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date);
+
+    IF NOT FOUND THEN
+        UPDATE price_intervals
+        SET valid_to = p_scraped_at
+        WHERE unit_id = v_unit_id AND valid_to IS NULL;
+
+        INSERT INTO price_intervals (unit_id, valid_from, last_seen, rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+        VALUES (v_unit_id, p_scraped_at, p_scraped_at, p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date);
+    END IF;
+
+    RETURN v_unit_id;
+END;
+$$;
@@ -0,0 +1,16 @@
+--
+-- Persist the template engine site identifier resolved during a crawl, see
+-- PropertySiteItemPipeline and Repli360Spider.start().
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0004_property_site_id.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.properties
+    ADD COLUMN site_id text;
+
+COMMENT ON COLUMN public.properties.site_id IS 'Template engine site identifier (Repli360 site_id) resolved by the crawler; lets later crawls skip discovery.';
+
+COMMIT;
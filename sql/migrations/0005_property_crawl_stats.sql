@@ -0,0 +1,29 @@
+--
+-- Per property crawl outcomes for the crawl planner, see Leverage.planner.
+-- Properties without a row are treated as never crawled and planned first.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0005_property_crawl_stats.sql
+--
+
+BEGIN;
+
+CREATE TABLE public.property_crawl_stats (
+    property_id bigint NOT NULL,
+    crawls integer DEFAULT 0 NOT NULL,
+    failures integer DEFAULT 0 NOT NULL,
+    failure_rate real DEFAULT 0 NOT NULL,
+    last_crawled_at timestamp with time zone,
+    last_success_at timestamp with time zone,
+    CONSTRAINT property_crawl_stats_pkey PRIMARY KEY (property_id),
+    CONSTRAINT property_crawl_stats_property_id_fkey FOREIGN KEY (property_id)
+        REFERENCES public.properties(property_id) ON DELETE CASCADE
+);
+
+ALTER TABLE public.property_crawl_stats OWNER TO postgres;
+
+COMMENT ON TABLE public.property_crawl_stats IS 'Per property crawl outcomes used by the crawl planner (Leverage.planner). failure_rate is an exponentially weighted average of failed crawls.';
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.property_crawl_stats TO scraper;
+
+COMMIT;
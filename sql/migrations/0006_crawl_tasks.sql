@@ -0,0 +1,52 @@
+--
+-- Shared crawl queue, see Leverage.crawltasks. Lets several processes run the
+-- same spider against one database without crawling a property twice.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0006_crawl_tasks.sql
+--
+
+BEGIN;
+
+CREATE TYPE public.crawl_task_status AS ENUM (
+    'pending',
+    'leased',
+    'done',
+    'failed'
+);
+
+ALTER TYPE public.crawl_task_status OWNER TO postgres;
+
+CREATE TABLE public.crawl_tasks (
+    task_id bigint GENERATED ALWAYS AS IDENTITY,
+    spider text NOT NULL,
+    property_id bigint NOT NULL,
+    url text NOT NULL,
+    priority real DEFAULT 0 NOT NULL,
+    status public.crawl_task_status DEFAULT 'pending'::public.crawl_task_status NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    leased_by text,
+    leased_until timestamp with time zone,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    finished_at timestamp with time zone,
+    last_error text,
+    CONSTRAINT crawl_tasks_pkey PRIMARY KEY (task_id),
+    CONSTRAINT crawl_tasks_property_id_fkey FOREIGN KEY (property_id)
+        REFERENCES public.properties(property_id) ON DELETE CASCADE
+);
+
+ALTER TABLE public.crawl_tasks OWNER TO postgres;
+
+COMMENT ON TABLE public.crawl_tasks IS 'Shared crawl queue (Leverage.crawltasks). Workers claim pending or lease-expired tasks with FOR UPDATE SKIP LOCKED.';
+
+-- At most one open task per property and spider; done and failed rows are history
+CREATE UNIQUE INDEX crawl_tasks_open_idx ON public.crawl_tasks (spider, property_id)
+    WHERE status IN ('pending', 'leased');
+
+CREATE INDEX crawl_tasks_claim_idx ON public.crawl_tasks (spider, priority DESC, task_id)
+    WHERE status IN ('pending', 'leased');
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.crawl_tasks TO scraper;
+GRANT SELECT,USAGE ON SEQUENCE public.crawl_tasks_task_id_seq TO scraper;
+
+COMMIT;
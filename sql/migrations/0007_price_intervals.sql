@@ -0,0 +1,39 @@
+--
+-- Change-only price history for PRICE_HISTORY_MODE = "interval", see
+-- UnitItemPipeline. Also read by the crawl planner in that mode and written by
+-- ingest_unit_observation() (0003) when called with p_interval_mode.
+-- Databases created from sql/schema.sql already have the table; this is a no-op
+-- there.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0007_price_intervals.sql
+--
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.price_intervals (
+    unit_id bigint NOT NULL,
+    valid_from timestamp with time zone NOT NULL,
+    last_seen timestamp with time zone NOT NULL,
+    valid_to timestamp with time zone,
+    rent_usd numeric(8,2) NOT NULL,
+    deposit_usd numeric(8,2),
+    min_lease_term_months smallint,
+    is_available boolean,
+    available_date date,
+    CONSTRAINT price_intervals_pkey PRIMARY KEY (unit_id, valid_from),
+    CONSTRAINT price_intervals_unit_id_fkey FOREIGN KEY (unit_id)
+        REFERENCES public.apartment_units(unit_id)
+);
+
+ALTER TABLE public.price_intervals OWNER TO postgres;
+
+-- At most one open interval per unit
+CREATE UNIQUE INDEX IF NOT EXISTS price_intervals_open_unit_id_key
+    ON public.price_intervals USING btree (unit_id) WHERE (valid_to IS NULL);
+
+COMMENT ON TABLE public.price_intervals IS 'Change-only price history: one row per observed price state, valid from valid_from until valid_to (NULL while current), last observed at last_seen.';
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.price_intervals TO scraper;
+
+COMMIT;
@@ -0,0 +1,27 @@
+--
+-- Crawl task rounds, see Leverage.crawltasks. Each seeding of a spider's queue
+-- starts a new round; workers only claim from the latest one, so tasks left
+-- over from an earlier round never stop the next run from reseeding. Existing
+-- tasks become round 0.
+--
+-- Run once as the table owner, e.g.:
+--   psql "$DB_DSN" -v ON_ERROR_STOP=1 -f sql/migrations/0008_crawl_task_rounds.sql
+--
+
+BEGIN;
+
+ALTER TABLE public.crawl_tasks ADD COLUMN round_id integer DEFAULT 0 NOT NULL;
+
+-- At most one open task per property, spider and round
+DROP INDEX public.crawl_tasks_open_idx;
+CREATE UNIQUE INDEX crawl_tasks_open_idx ON public.crawl_tasks (spider, round_id, property_id)
+    WHERE status IN ('pending', 'leased');
+
+DROP INDEX public.crawl_tasks_claim_idx;
+CREATE INDEX crawl_tasks_claim_idx ON public.crawl_tasks (spider, round_id, priority DESC, task_id)
+    WHERE status IN ('pending', 'leased');
+
+-- Finds the latest round of a spider
+CREATE INDEX crawl_tasks_round_idx ON public.crawl_tasks (spider, round_id);
+
+COMMIT;
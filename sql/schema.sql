@@ -31,6 +31,20 @@ SET row_security = off;
 
 ALTER SCHEMA public OWNER TO postgres;
 
+--
+-- Name: crawl_task_status; Type: TYPE; Schema: public; Owner: postgres
+--
+
+CREATE TYPE public.crawl_task_status AS ENUM (
+    'pending',
+    'leased',
+    'done',
+    'failed'
+);
+
+
+ALTER TYPE public.crawl_task_status OWNER TO postgres;
+
 --
 -- TOC entry 860 (class 1247 OID 16386)
 -- Name: update_source_type; Type: TYPE; Schema: public; Owner: postgres
@@ -44,6 +58,135 @@ CREATE TYPE public.update_source_type AS ENUM (
 
 ALTER TYPE public.update_source_type OWNER TO postgres;
 
+--
+-- Name: create_price_history_partitions(date, integer); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.create_price_history_partitions(p_from date, p_months_ahead integer) RETURNS integer
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public', 'pg_temp'
+    AS $$
+DECLARE
+    month_start date := date_trunc('month', p_from)::date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    -- Serialise concurrent crawlers creating the same partition
+    PERFORM pg_advisory_xact_lock(hashtext('public.price_history partitions'));
+
+    FOR i IN 0..p_months_ahead LOOP
+        partition_name := format('price_history_%s', to_char(month_start, 'YYYY_MM'));
+
+        IF to_regclass(format('public.%I', partition_name)) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE public.%I PARTITION OF public.price_history FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start::timestamp AT TIME ZONE 'UTC',
+                (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+
+ALTER FUNCTION public.create_price_history_partitions(p_from date, p_months_ahead integer) OWNER TO postgres;
+
+--
+-- Name: ingest_unit_observation(text, timestamp with time zone, character varying, numeric, numeric, integer, character varying, integer, character varying, boolean, numeric, numeric, smallint, boolean, date, boolean); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.ingest_unit_observation(p_property_url text, p_scraped_at timestamp with time zone, p_plan_name character varying, p_bedrooms numeric, p_bathrooms numeric, p_square_footage integer, p_unit_number character varying, p_floor_number integer, p_building_name character varying, p_is_on_top_floor boolean, p_rent_usd numeric, p_deposit_usd numeric, p_min_lease_term_months smallint, p_is_available boolean, p_available_date date, p_interval_mode boolean DEFAULT false) RETURNS bigint
+    LANGUAGE plpgsql
+    SET search_path TO 'public', 'pg_temp'
+    AS $$
+DECLARE
+    v_property_id bigint;
+    v_floorplan_id bigint;
+    v_unit_id bigint;
+BEGIN
+    -- One scraped unit in one round trip: floorplan upsert, unit upsert and
+    -- price observation, atomically. Returns NULL for an unknown property URL.
+    SELECT property_id INTO v_property_id
+    FROM properties
+    WHERE url = p_property_url;
+
+    IF v_property_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO floorplans (property_id, plan_name, bedrooms, bathrooms, square_footage)
+    VALUES (v_property_id, p_plan_name, p_bedrooms, p_bathrooms, p_square_footage)
+    ON CONFLICT (property_id, plan_name) DO NOTHING
+    RETURNING floorplan_id INTO v_floorplan_id;
+
+    IF v_floorplan_id IS NULL THEN
+        SELECT floorplan_id INTO v_floorplan_id
+        FROM floorplans
+        WHERE property_id = v_property_id AND plan_name = p_plan_name;
+    END IF;
+
+    -- building_name is nullable, so the unique constraint never fires for units
+    -- without a building. Match those explicitly to avoid duplicates.
+    SELECT unit_id INTO v_unit_id
+    FROM apartment_units
+    WHERE property_id = v_property_id
+        AND building_name IS NOT DISTINCT FROM p_building_name
+        AND unit_number = p_unit_number;
+
+    IF v_unit_id IS NULL THEN
+        INSERT INTO apartment_units (property_id, floorplan_id, unit_number, floor_number, building_name, is_on_top_floor)
+        VALUES (v_property_id, v_floorplan_id, p_unit_number, p_floor_number, p_building_name, p_is_on_top_floor)
+        ON CONFLICT (property_id, building_name, unit_number) DO NOTHING
+        RETURNING unit_id INTO v_unit_id;
+
+        IF v_unit_id IS NULL THEN
+            -- Inserted concurrently by another session
+            SELECT unit_id INTO v_unit_id
+            FROM apartment_units
+            WHERE property_id = v_property_id
+                AND building_name = p_building_name
+                AND unit_number = p_unit_number;
+        END IF;
+    END IF;
+
+    IF NOT p_interval_mode THEN
+        INSERT INTO price_history (scraped_at, unit_id, rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+        VALUES (p_scraped_at, v_unit_id, p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date)
+        ON CONFLICT (scraped_at, unit_id) DO NOTHING;
+        RETURN v_unit_id;
+    END IF;
+
+    -- Interval mode: extend the open interval if the price state is unchanged,
+    -- otherwise close it and open a new one
+    UPDATE price_intervals
+    SET last_seen = GREATEST(last_seen, p_scraped_at)
+    WHERE unit_id = v_unit_id
+        AND valid_to IS NULL
+        AND (rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+            IS NOT DISTINCT FROM (p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date);
+
+    IF NOT FOUND THEN
+        UPDATE price_intervals
+        SET valid_to = p_scraped_at
+        WHERE unit_id = v_unit_id AND valid_to IS NULL;
+
+        INSERT INTO price_intervals (unit_id, valid_from, last_seen, rent_usd, deposit_usd, min_lease_term_months, is_available, available_date)
+        VALUES (v_unit_id, p_scraped_at, p_scraped_at, p_rent_usd, p_deposit_usd, p_min_lease_term_months, p_is_available, p_available_date);
+    END IF;
+
+    RETURN v_unit_id;
+END;
+$$;
+
+
+ALTER FUNCTION public.ingest_unit_observation(p_property_url text, p_scraped_at timestamp with time zone, p_plan_name character varying, p_bedrooms numeric, p_bathrooms numeric, p_square_footage integer, p_unit_number character varying, p_floor_number integer, p_building_name character varying, p_is_on_top_floor boolean, p_rent_usd numeric, p_deposit_usd numeric, p_min_lease_term_months smallint, p_is_available boolean, p_available_date date, p_interval_mode boolean) OWNER TO postgres;
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
@@ -147,11 +290,80 @@ CREATE TABLE public.price_history (
     min_lease_term_months smallint,
     is_available boolean,
     available_date date
-);
+)
+PARTITION BY RANGE (scraped_at);
 
 
 ALTER TABLE public.price_history OWNER TO postgres;
 
+--
+-- Name: price_intervals; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.price_intervals (
+    unit_id bigint NOT NULL,
+    valid_from timestamp with time zone NOT NULL,
+    last_seen timestamp with time zone NOT NULL,
+    valid_to timestamp with time zone,
+    rent_usd numeric(8,2) NOT NULL,
+    deposit_usd numeric(8,2),
+    min_lease_term_months smallint,
+    is_available boolean,
+    available_date date
+);
+
+
+ALTER TABLE public.price_intervals OWNER TO postgres;
+
+--
+-- Name: TABLE price_intervals; Type: COMMENT; Schema: public; Owner: postgres
+--
+
+COMMENT ON TABLE public.price_intervals IS 'Change-only price history: one row per observed price state, valid from valid_from until valid_to (NULL while current), last observed at last_seen.';
+
+--
+-- Name: crawl_tasks; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.crawl_tasks (
+    task_id bigint NOT NULL,
+    spider text NOT NULL,
+    property_id bigint NOT NULL,
+    url text NOT NULL,
+    priority real DEFAULT 0 NOT NULL,
+    status public.crawl_task_status DEFAULT 'pending'::public.crawl_task_status NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    leased_by text,
+    leased_until timestamp with time zone,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    finished_at timestamp with time zone,
+    last_error text,
+    round_id integer DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.crawl_tasks OWNER TO postgres;
+
+--
+-- Name: TABLE crawl_tasks; Type: COMMENT; Schema: public; Owner: postgres
+--
+
+COMMENT ON TABLE public.crawl_tasks IS 'Shared crawl queue (Leverage.crawltasks). Workers claim pending or lease-expired tasks with FOR UPDATE SKIP LOCKED.';
+
+--
+-- Name: crawl_tasks_task_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.crawl_tasks ALTER COLUMN task_id ADD GENERATED ALWAYS AS IDENTITY (
+    SEQUENCE NAME public.crawl_tasks_task_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
+
 --
 -- TOC entry 225 (class 1259 OID 16432)
 -- Name: properties; Type: TABLE; Schema: public; Owner: postgres
@@ -169,12 +381,50 @@ CREATE TABLE public.properties (
     postal_code character varying(10),
     company_id integer,
     updated_at timestamp with time zone DEFAULT now() NOT NULL,
-    updated_source public.update_source_type DEFAULT 'manual'::public.update_source_type NOT NULL
+    updated_source public.update_source_type DEFAULT 'manual'::public.update_source_type NOT NULL,
+    is_active boolean DEFAULT true NOT NULL,
+    deactivated_at timestamp with time zone,
+    site_id text
 );
 
 
 ALTER TABLE public.properties OWNER TO postgres;
 
+--
+-- Name: COLUMN properties.is_active; Type: COMMENT; Schema: public; Owner: postgres
+--
+
+COMMENT ON COLUMN public.properties.is_active IS 'False once the property disappears from its company''s indexer output; inactive properties are not crawled.';
+
+
+--
+-- Name: COLUMN properties.site_id; Type: COMMENT; Schema: public; Owner: postgres
+--
+
+COMMENT ON COLUMN public.properties.site_id IS 'Template engine site identifier (Repli360 site_id) resolved by the crawler; lets later crawls skip discovery.';
+
+--
+-- Name: property_crawl_stats; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.property_crawl_stats (
+    property_id bigint NOT NULL,
+    crawls integer DEFAULT 0 NOT NULL,
+    failures integer DEFAULT 0 NOT NULL,
+    failure_rate real DEFAULT 0 NOT NULL,
+    last_crawled_at timestamp with time zone,
+    last_success_at timestamp with time zone
+);
+
+
+ALTER TABLE public.property_crawl_stats OWNER TO postgres;
+
+--
+-- Name: TABLE property_crawl_stats; Type: COMMENT; Schema: public; Owner: postgres
+--
+
+COMMENT ON TABLE public.property_crawl_stats IS 'Per property crawl outcomes used by the crawl planner (Leverage.planner). failure_rate is an exponentially weighted average of failed crawls.';
+
 --
 -- TOC entry 226 (class 1259 OID 16448)
 -- Name: properties_property_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
@@ -205,6 +455,35 @@ ALTER TABLE public.apartment_units ALTER COLUMN unit_id ADD GENERATED ALWAYS AS
 );
 
 
+--
+-- Name: crawl_tasks crawl_tasks_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.crawl_tasks
+    ADD CONSTRAINT crawl_tasks_pkey PRIMARY KEY (task_id);
+
+
+--
+-- Name: crawl_tasks_open_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX crawl_tasks_open_idx ON public.crawl_tasks USING btree (spider, round_id, property_id) WHERE (status = ANY (ARRAY['pending'::public.crawl_task_status, 'leased'::public.crawl_task_status]));
+
+
+--
+-- Name: crawl_tasks_claim_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX crawl_tasks_claim_idx ON public.crawl_tasks USING btree (spider, round_id, priority DESC, task_id) WHERE (status = ANY (ARRAY['pending'::public.crawl_task_status, 'leased'::public.crawl_task_status]));
+
+
+--
+-- Name: crawl_tasks_round_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX crawl_tasks_round_idx ON public.crawl_tasks USING btree (spider, round_id);
+
+
 --
 -- TOC entry 3325 (class 2606 OID 16451)
 -- Name: floorplans floor_plans_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -255,10 +534,39 @@ ALTER TABLE ONLY public.management_companies
 -- Name: price_history price_history_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
 
-ALTER TABLE ONLY public.price_history
+ALTER TABLE public.price_history
     ADD CONSTRAINT price_history_pkey PRIMARY KEY (scraped_at, unit_id);
 
 
+--
+-- Name: price_history_scraped_at_brin; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX price_history_scraped_at_brin ON public.price_history USING brin (scraped_at);
+
+
+--
+-- Name: price_history_unit_id_scraped_at_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX price_history_unit_id_scraped_at_idx ON public.price_history USING btree (unit_id, scraped_at DESC);
+
+
+--
+-- Name: price_intervals price_intervals_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.price_intervals
+    ADD CONSTRAINT price_intervals_pkey PRIMARY KEY (unit_id, valid_from);
+
+
+--
+-- Name: price_intervals_open_unit_id_key; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE UNIQUE INDEX price_intervals_open_unit_id_key ON public.price_intervals USING btree (unit_id) WHERE (valid_to IS NULL);
+
+
 --
 -- TOC entry 3337 (class 2606 OID 16463)
 -- Name: properties properties_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -268,6 +576,14 @@ ALTER TABLE ONLY public.properties
     ADD CONSTRAINT properties_pkey PRIMARY KEY (property_id);
 
 
+--
+-- Name: property_crawl_stats property_crawl_stats_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.property_crawl_stats
+    ADD CONSTRAINT property_crawl_stats_pkey PRIMARY KEY (property_id);
+
+
 --
 -- TOC entry 3339 (class 2606 OID 16465)
 -- Name: properties properties_url_key; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -277,6 +593,13 @@ ALTER TABLE ONLY public.properties
     ADD CONSTRAINT properties_url_key UNIQUE (url);
 
 
+--
+-- Name: properties_company_id_active_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX properties_company_id_active_idx ON public.properties USING btree (company_id) WHERE is_active;
+
+
 --
 -- TOC entry 3321 (class 2606 OID 16467)
 -- Name: apartment_units units_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
@@ -318,10 +641,18 @@ ALTER TABLE ONLY public.floorplans
 -- Name: price_history price_history_unit_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
 --
 
-ALTER TABLE ONLY public.price_history
+ALTER TABLE public.price_history
     ADD CONSTRAINT price_history_unit_id_fkey FOREIGN KEY (unit_id) REFERENCES public.apartment_units(unit_id);
 
 
+--
+-- Name: price_intervals price_intervals_unit_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.price_intervals
+    ADD CONSTRAINT price_intervals_unit_id_fkey FOREIGN KEY (unit_id) REFERENCES public.apartment_units(unit_id);
+
+
 --
 -- TOC entry 3340 (class 2606 OID 16485)
 -- Name: apartment_units units_floor_plan_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
@@ -340,6 +671,22 @@ ALTER TABLE ONLY public.apartment_units
     ADD CONSTRAINT units_property_id_fkey FOREIGN KEY (property_id) REFERENCES public.properties(property_id);
 
 
+--
+-- Name: property_crawl_stats property_crawl_stats_property_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.property_crawl_stats
+    ADD CONSTRAINT property_crawl_stats_property_id_fkey FOREIGN KEY (property_id) REFERENCES public.properties(property_id) ON DELETE CASCADE;
+
+
+--
+-- Name: crawl_tasks crawl_tasks_property_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.crawl_tasks
+    ADD CONSTRAINT crawl_tasks_property_id_fkey FOREIGN KEY (property_id) REFERENCES public.properties(property_id) ON DELETE CASCADE;
+
+
 --
 -- TOC entry 3497 (class 0 OID 0)
 -- Dependencies: 5
@@ -405,6 +752,21 @@ GRANT SELECT,USAGE ON SEQUENCE public.management_companies_id_seq TO scraper;
 GRANT SELECT,INSERT,UPDATE ON TABLE public.price_history TO scraper;
 
 
+--
+-- Name: FUNCTION create_price_history_partitions(p_from date, p_months_ahead integer); Type: ACL; Schema: public; Owner: postgres
+--
+
+REVOKE ALL ON FUNCTION public.create_price_history_partitions(p_from date, p_months_ahead integer) FROM PUBLIC;
+GRANT ALL ON FUNCTION public.create_price_history_partitions(p_from date, p_months_ahead integer) TO scraper;
+
+
+--
+-- Name: TABLE price_intervals; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.price_intervals TO scraper;
+
+
 --
 -- TOC entry 3504 (class 0 OID 0)
 -- Dependencies: 225
@@ -423,6 +785,27 @@ GRANT SELECT,INSERT,UPDATE ON TABLE public.properties TO scraper;
 GRANT SELECT,USAGE ON SEQUENCE public.properties_property_id_seq TO scraper;
 
 
+--
+-- Name: TABLE property_crawl_stats; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.property_crawl_stats TO scraper;
+
+
+--
+-- Name: TABLE crawl_tasks; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT SELECT,INSERT,UPDATE ON TABLE public.crawl_tasks TO scraper;
+
+
+--
+-- Name: SEQUENCE crawl_tasks_task_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT SELECT,USAGE ON SEQUENCE public.crawl_tasks_task_id_seq TO scraper;
+
+
 --
 -- TOC entry 3506 (class 0 OID 0)
 -- Dependencies: 227
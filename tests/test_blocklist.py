@@ -0,0 +1,113 @@
+import itertools
+import os
+from typing import ClassVar
+
+import pytest
+from urlmatch import urlmatch
+
+from Leverage.spiders.blocklist import Blocklist, parse_rule
+from Leverage.spiders.crawlers import ContentBlockerSpider
+
+PATTERNS = [
+    "*://*.sierra.chat/*",
+    "*://*.nestiolistings.com/*",
+    "https://ads.example.com/*",
+    "http://example.org/track/*",
+    "*://cdn.example.net/*/pixel.gif",
+    "*://*/beacon/*",
+    "*://*.tracker.io/js/*.js",
+]
+
+URLS = [
+    "https://sierra.chat/widget.js",
+    "https://app.sierra.chat/widget.js",
+    "https://notsierra.chat/widget.js",
+    "https://www.nestiolistings.com/",
+    "https://ads.example.com/banner",
+    "http://ads.example.com/banner",
+    "https://sub.ads.example.com/banner",
+    "http://example.org/track/1",
+    "http://example.org/track",
+    "http://example.org/trackers",
+    "https://example.org/track/1",
+    "https://cdn.example.net/a/b/pixel.gif",
+    "https://cdn.example.net/pixel.gif",
+    "https://cdn.example.net/a/pixel.gif?x=1",
+    "https://anything.com/beacon/1",
+    "https://anything.com/beacons",
+    "https://x.tracker.io/js/app.js",
+    "https://x.tracker.io/js/app.css",
+    "https://user@app.sierra.chat/",
+    "https://www.udr.com/",
+    "wss://app.sierra.chat/socket",
+    "data:image/png;base64,AAAA",
+]
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_matches_like_urlmatch(url):
+    blocklist = Blocklist(PATTERNS)
+    expected = any(urlmatch(pattern, url) for pattern in PATTERNS)
+    assert blocklist.matches(url) is expected
+
+
+def test_matches_like_urlmatch_per_pattern():
+    for pattern, url in itertools.product(PATTERNS, URLS):
+        assert Blocklist([pattern]).matches(url) is urlmatch(pattern, url), (
+            pattern,
+            url,
+        )
+
+
+def test_parse_rule_formats():
+    assert parse_rule("# comment") is None
+    assert parse_rule("! adblock comment") is None
+    assert parse_rule("Ads.Example.com") == "*://*.ads.example.com/*"
+    assert parse_rule("0.0.0.0 ads.example.com # note") == "*://*.ads.example.com/*"
+    assert parse_rule("127.0.0.1 localhost") is None
+    assert parse_rule("||ads.example.com^") == "*://*.ads.example.com/*"
+    assert parse_rule("||ads.example.com^$third-party") is None
+    assert parse_rule("example.com##.banner") is None
+    assert parse_rule("*://*/ads/*") == "*://*/ads/*"
+
+
+def test_from_files_uses_cache_until_file_changes(tmp_path):
+    blocklist_file = tmp_path / "hosts.txt"
+    blocklist_file.write_text("0.0.0.0 ads.example.com\nnot a rule here\n")
+    cache_dir = tmp_path / "cache"
+
+    blocklist = Blocklist.from_files([str(blocklist_file)], cache_dir=str(cache_dir))
+    assert len(blocklist) == 1
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A cached copy is returned as-is, a changed file is parsed again
+    cached = Blocklist.from_files([str(blocklist_file)], cache_dir=str(cache_dir))
+    assert cached.matches("https://x.ads.example.com/a.js")
+
+    blocklist_file.write_text("tracker.io\nads.example.com\n")
+    changed = Blocklist.from_files([str(blocklist_file)], cache_dir=str(cache_dir))
+    assert len(changed) == 2
+    assert changed.matches("https://tracker.io/")
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_spider_blocklists_argument(tmp_path):
+    class BlockerSpider(ContentBlockerSpider):
+        name = "blocker"
+        blocked_domains: ClassVar[set[str]] = {"*://*.sierra.chat/*"}
+
+    first = tmp_path / "first.txt"
+    first.write_text("ads.example.com\n")
+    second = tmp_path / "second.txt"
+    second.write_text("tracker.io\n")
+
+    # "-a blocklists=..." passes a comma separated string
+    spider = BlockerSpider(
+        blocklists=f"{first},{second}", blocklist_cache_dir=str(tmp_path)
+    )
+    assert spider.blocklist.matches("https://ads.example.com/")
+    assert spider.blocklist.matches("https://tracker.io/")
+    assert spider.blocklist.matches("https://app.sierra.chat/")
+    # Loaded lists do not leak into the class or other instances
+    assert BlockerSpider.blocked_domains == {"*://*.sierra.chat/*"}
+    assert not BlockerSpider().blocklist.matches("https://tracker.io/")
@@ -0,0 +1,132 @@
+from datetime import UTC, date, datetime
+from decimal import Decimal
+
+from Leverage.cache import IdentityMap, LRUCache, attributes_hash
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_attributes_hash_matches_item_and_database_values():
+    # Item values are strings or JSON numbers, database values are Decimals/ints
+    assert attributes_hash("2", 2.0, "1200") == attributes_hash(
+        Decimal("2.0"), Decimal("2.0"), 1200
+    )
+    assert attributes_hash(None, True) == attributes_hash(None, True)
+    assert attributes_hash("2", None) != attributes_hash("3", None)
+    assert attributes_hash("Studio") == attributes_hash("Studio")
+
+
+def test_identity_map_warms_property_once():
+    valid_from = datetime(2025, 11, 1, tzinfo=UTC)
+    open_price = (
+        valid_from,
+        Decimal("1200.00"),
+        Decimal("500.00"),
+        12,
+        True,
+        date(2025, 12, 1),
+    )
+    no_price = (None,) * 6
+    rows = [
+        (
+            7,
+            10,
+            "A1",
+            Decimal("1.0"),
+            Decimal("1.0"),
+            650,
+            100,
+            None,
+            "101",
+            1,
+            False,
+            *open_price,
+        ),
+        (
+            7,
+            10,
+            "A1",
+            Decimal("1.0"),
+            Decimal("1.0"),
+            650,
+            101,
+            None,
+            "102",
+            1,
+            True,
+            *no_price,
+        ),
+        (7, 11, "B2", Decimal("2.0"), Decimal("2.0"), 900, *(None,) * 5, *no_price),
+    ]
+    cur = FakeCursor(rows)
+    identities = IdentityMap(maxsize=100, load_prices=True)
+
+    assert identities.property_id(cur, "https://example.com") == 7
+    assert identities.property_id(cur, "https://example.com") == 7
+    assert len(cur.queries) == 1
+
+    floorplan_hash = identities.floorplan_hash("1", "1", "650")
+    assert identities.cached_id(identities.floorplans, (7, "A1"), floorplan_hash) == 10
+    assert (
+        identities.cached_id(identities.floorplans, (7, "B2"), floorplan_hash) is None
+    )
+
+    unit_hash = identities.unit_hash(10, 1, True)
+    assert identities.cached_id(identities.units, (7, None, "102"), unit_hash) == 101
+    # Changed attributes force an upsert
+    assert identities.cached_id(identities.units, (7, None, "101"), unit_hash) is None
+
+    # The open price interval is loaded as the unit's last known price state
+    price_hash = identities.price_hash("1200", "500", "12", True, "2025-12-01")
+    assert identities.price_states.get(100) == (price_hash, valid_from)
+    assert identities.price_states.get(101) is None
+
+
+def test_identity_map_unknown_property():
+    identities = IdentityMap(maxsize=10)
+    assert identities.property_id(FakeCursor([]), "https://missing.example") is None
+
+
+def test_identity_map_joins_price_intervals_only_when_loading_prices():
+    rows = [
+        (7, 10, "A1", Decimal("1.0"), Decimal("1.0"), 650, 100, None, "101", 1, False)
+    ]
+    cur = FakeCursor(rows)
+    identities = IdentityMap(maxsize=10)
+
+    assert identities.property_id(cur, "https://example.com") == 7
+    [(query, _)] = cur.queries
+    assert "price_intervals" not in query
+    assert (
+        identities.cached_id(
+            identities.units, (7, None, "101"), identities.unit_hash(10, 1, False)
+        )
+        == 100
+    )
+    assert identities.price_states.get(100) is None
+
+    assert "price_intervals" in IdentityMap(maxsize=10, load_prices=True).warm_query
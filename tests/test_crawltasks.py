@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+
+import pytest
+from scrapy import Request
+from scrapy.http import Response
+from scrapy.utils.test import get_crawler
+
+from Leverage.crawltasks import CrawlTask, CrawlTaskQueue
+from Leverage.spiders.crawlers.dolben_spider import DolbenSpider
+
+URL = "https://www.example-apartments.com/"
+OTHER_URL = "https://www.other-apartments.com/"
+THIRD_URL = "https://www.third-apartments.com/"
+
+
+class FakeQueue:
+    def __init__(self, tasks):
+        self._tasks = tasks
+
+    async def tasks(self):
+        for task in self._tasks:
+            yield task
+
+
+def collect(agen):
+    async def run():
+        return [result async for result in agen]
+
+    return asyncio.run(run())
+
+
+def make_spider(**kwargs):
+    crawler = get_crawler(DolbenSpider)
+    crawler.stats.open_spider()
+    # Skip DatabaseSpider.from_crawler, which needs Postgres
+    spider = DolbenSpider(site_ids={}, planned_properties={}, **kwargs)
+    spider._set_crawler(crawler)
+    return spider
+
+
+def test_start_yields_a_request_per_claimed_task():
+    spider = make_spider(
+        task_queue=FakeQueue(
+            [CrawlTask(1, 10, URL, "2221"), CrawlTask(2, 20, OTHER_URL)]
+        )
+    )
+    known, new = collect(spider.start())
+
+    assert known.url == URL
+    assert known.cb_kwargs == {"site_id": "2221"}
+    assert new.url == OTHER_URL
+    assert spider.planned_properties == {URL: 10, OTHER_URL: 20}
+    assert spider.site_ids == {URL: "2221"}
+
+
+def test_start_without_queue_uses_planned_properties():
+    spider = make_spider(properties=[{"property_id": 10, "url": URL, "site_id": None}])
+    (request,) = collect(spider.start())
+    assert request.url == URL
+    assert request.meta["property_url"] == URL
+    assert spider.planned_properties == {URL: 10}
+
+
+def test_successful_responses_complete_their_task():
+    crawler = get_crawler()
+    crawler.stats.open_spider()
+    queue = CrawlTaskQueue("dbname=test", "dolben", crawler.stats, worker="w1")
+    queue.leased = {URL: 1, OTHER_URL: 2, THIRD_URL: 3}
+
+    def respond(url, status=200, property_url=None):
+        request = Request(url, meta={"property_url": property_url or url})
+        queue.response_received(Response(url, status=status), request, None)
+
+    # Completed whether or not the property yields items
+    respond(URL)
+    respond(URL)
+    respond(OTHER_URL, status=503)
+    respond("https://unplanned.com/")
+    respond(f"{THIRD_URL}floorplans", property_url=THIRD_URL)
+
+    assert queue.done == [1, 3]
+    assert queue.leased == {OTHER_URL: 2}
+    assert crawler.stats.get_value("crawl_tasks/done") == 2
+
+
+class SeedCursor:
+    def __init__(self, latest_round):
+        self.latest_round = latest_round
+        self.executed = []
+        self.seeded = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def executemany(self, query, params):
+        self.seeded.extend(params)
+
+    def fetchone(self):
+        return self.latest_round
+
+
+class SeedConnection:
+    def __init__(self, latest_round):
+        self.cur = SeedCursor(latest_round)
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    def cursor(self):
+        return self.cur
+
+
+PROPERTIES = [
+    {"property_id": 10, "url": URL, "score": 2.5},
+    {"property_id": 20, "url": OTHER_URL},
+    {"property_id": 30, "url": None},
+]
+
+
+@pytest.mark.parametrize(
+    "latest_round, round_id",
+    [(None, 1), ((4, False), 5)],
+)
+def test_seed_starts_a_round_once_the_last_is_finished(latest_round, round_id):
+    queue = CrawlTaskQueue("dbname=test", "dolben", worker="w1")
+    conn = SeedConnection(latest_round)
+
+    # Properties may be streamed
+    assert queue.seed(conn, lambda: iter(PROPERTIES)) == 2
+    assert queue.round_id == round_id
+    assert [
+        (params["round_id"], params["property_id"], params["priority"])
+        for params in conn.cur.seeded
+    ] == [(round_id, 10, 2.5), (round_id, 20, 0)]
+
+
+def test_seed_joins_an_open_round():
+    queue = CrawlTaskQueue("dbname=test", "dolben", worker="w1")
+    conn = SeedConnection((4, True))
+
+    assert queue.seed(conn, lambda: pytest.fail("open rounds are not reseeded")) == 0
+    assert queue.round_id == 4
+    assert queue.params()["round_id"] == 4
+    assert conn.cur.seeded == []
+
+
+def test_start_streams_properties_without_plan_or_queue():
+    spider = make_spider()
+
+    async def stream_properties():
+        yield {"property_id": 10, "url": URL, "site_id": "2221"}
+        yield {"property_id": 20, "url": OTHER_URL, "site_id": None}
+
+    spider.stream_properties = stream_properties
+    known, new = collect(spider.start())
+
+    assert known.cb_kwargs == {"site_id": "2221"}
+    assert new.url == OTHER_URL
+    assert spider.site_ids == {URL: "2221"}
+    # Only planned crawls are recorded, streaming keeps no per-property state
+    assert spider.planned_properties == {}
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+import pytest
+
+from Leverage.dbstats import LatencyHistogram, StatementStats
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rolled_back = 0
+
+    @contextmanager
+    def transaction(self, force_rollback=False):
+        yield
+        if force_rollback:
+            self.rolled_back += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = -1
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        self.rowcount = 1
+
+    def fetchall(self):
+        return [("Seq Scan on floorplans",), ("Execution Time: 1.0 ms",)]
+
+
+def test_histogram_percentiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.050, rel=0.05)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.05)
+    assert histogram.percentile(100) == pytest.approx(0.100)
+
+
+def test_execute_records_rows_and_samples_slow_statements():
+    stats = FakeStats()
+    db_stats = StatementStats(stats, slow_ms=0, explain=True, max_slow_samples=1)
+    connection = FakeConnection()
+    cur = FakeCursor(connection)
+
+    db_stats.execute(cur, "upsert_floorplan", "INSERT ...", {"plan_name": "A1"})
+    db_stats.execute(cur, "upsert_floorplan", "INSERT ...", {"plan_name": "B2"})
+    db_stats.dump()
+
+    # The plan is taken on its own cursor in a rolled back transaction
+    assert cur.executed == ["INSERT ...", "INSERT ..."]
+    assert connection.rolled_back == 1
+
+    assert stats.values["dbstats/upsert_floorplan/count"] == 2
+    assert stats.values["dbstats/upsert_floorplan/rows"] == 2
+    [sample] = stats.values["dbstats/upsert_floorplan/slow_samples"]
+    assert "A1" in sample["params"]
+    assert sample["plan"].startswith("Seq Scan")
@@ -0,0 +1,62 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from Leverage.items import PropertyItem, UnitItem
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from Leverage.exporters import ParquetItemExporter
+
+
+def make_unit(number):
+    return UnitItem(
+        scraped_at="2025-11-01T12:00:00+00:00",
+        property_url="https://example.com/apartments",
+        floorplan_name="A1",
+        unit_number=str(number),
+        rent_usd="$1,200",
+        is_available=True,
+        available_date="2025-12-01",
+        num_bedrooms="1",
+        square_footage="750",
+    )
+
+
+def export(items, **kwargs):
+    file = io.BytesIO()
+    exporter = ParquetItemExporter(file, **kwargs)
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+    file.seek(0)
+    return pq.ParquetFile(file)
+
+
+def test_parquet_exporter_writes_typed_row_groups():
+    parquet = export([make_unit(i) for i in range(5)], row_group_size=2)
+
+    assert parquet.metadata.num_rows == 5
+    assert parquet.metadata.num_row_groups == 3
+
+    table = parquet.read()
+    row = table.slice(0, 1).to_pylist()[0]
+    assert row["rent_usd"] == Decimal("1200.00")
+    assert row["available_date"] == date(2025, 12, 1)
+    assert row["square_footage"] == 750
+    assert row["is_available"] is True
+
+    encodings = (
+        parquet.metadata.row_group(0)
+        .column(table.schema.get_field_index("property_url"))
+        .encodings
+    )
+    assert "RLE_DICTIONARY" in encodings
+
+
+def test_parquet_exporter_rejects_mixed_item_classes():
+    with pytest.raises(ValueError):
+        export([make_unit(1), PropertyItem(url="https://example.com")])
@@ -0,0 +1,74 @@
+import gzip
+import json
+
+import pytest
+from scrapy.utils.test import get_crawler
+
+from Leverage.feedstorage import RotatingFeedStorage
+
+
+def write_lines(storage, count):
+    file = storage.open(spider=None)
+    for i in range(count):
+        file.write(json.dumps({"n": i}).encode() + b"\n")
+    file.close()
+    return file
+
+
+def test_rotates_by_item_count_into_readable_segments(tmp_path):
+    uri = f"rotating:{tmp_path}/out/feed.jsonl"
+    storage = RotatingFeedStorage(
+        uri, feed_options={"compression": "gzip", "rotate_items": 3}
+    )
+    file = write_lines(storage, 10)
+
+    assert [path.rsplit("/", 1)[1] for path in file.segments] == [
+        "feed.00000.jsonl.gz",
+        "feed.00001.jsonl.gz",
+        "feed.00002.jsonl.gz",
+        "feed.00003.jsonl.gz",
+    ]
+    assert not list((tmp_path / "out").glob("*.part"))
+
+    numbers = []
+    for path in file.segments:
+        with gzip.open(path) as f:
+            numbers.extend(json.loads(line)["n"] for line in f)
+    assert numbers == list(range(10))
+
+
+def test_segments_are_counted_once_the_file_is_stored(tmp_path):
+    crawler = get_crawler()
+    crawler.stats.open_spider()
+    storage = RotatingFeedStorage.from_crawler(
+        crawler,
+        f"rotating:{tmp_path}/feed.jsonl",
+        feed_options={"compression": "none", "rotate_items": 4},
+    )
+    file = write_lines(storage, 10)
+    # Nothing is counted from the writer thread
+    assert crawler.stats.get_value("feedstorage/segments") is None
+
+    assert storage.record_segments("closed", file) == "closed"
+    assert crawler.stats.get_value("feedstorage/segments") == 3
+
+
+def test_rotates_by_size_with_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    uri = f"rotating:{tmp_path}/feed.jsonl"
+    storage = RotatingFeedStorage(
+        uri, feed_options={"compression": "zstd", "rotate_bytes": 40}
+    )
+    file = write_lines(storage, 10)
+
+    assert len(file.segments) > 1
+    lines = []
+    for path in file.segments:
+        with zstandard.open(path, "rb") as f:
+            lines.extend(f.read().splitlines())
+    assert [json.loads(line)["n"] for line in lines] == list(range(10))
+
+
+def test_rejects_unknown_compression():
+    with pytest.raises(ValueError):
+        RotatingFeedStorage("rotating:feed.jsonl", feed_options={"compression": "lz4"})
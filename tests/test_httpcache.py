@@ -0,0 +1,94 @@
+from scrapy import Spider
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.http import FormRequest, Request, Response
+from scrapy.utils.test import get_crawler
+
+TEMPLATE_URL = "https://app.repli360.com/admin/template-render"
+UNITS_URL = "https://app.repli360.com/admin/getUnitListByFloor"
+SCRIPT_URL = "https://example.com/rrac-website-script.js"
+
+
+def make_middleware(tmp_path, url_ttls):
+    crawler = get_crawler(
+        Spider,
+        {
+            "HTTPCACHE_ENABLED": True,
+            "HTTPCACHE_DIR": str(tmp_path),
+            "HTTPCACHE_POLICY": "Leverage.httpcache.URLTTLPolicy",
+            "HTTPCACHE_URL_TTLS": url_ttls,
+            "HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS": ["no-cache"],
+        },
+    )
+    crawler.spider = crawler._create_spider("test")
+    crawler.stats.open_spider()
+    middleware = HttpCacheMiddleware.from_crawler(crawler)
+    middleware.spider_opened(crawler.spider)
+    return middleware
+
+
+def fetch(middleware, request, response):
+    """
+    Send a request through the cache, "downloading" response on a miss.
+    """
+    cached = middleware.process_request(request)
+    if cached is not None:
+        return cached
+    return middleware.process_response(
+        request, response.replace(url=request.url, request=request)
+    )
+
+
+def template_request(site_id):
+    return FormRequest(TEMPLATE_URL, formdata={"site_id": site_id})
+
+
+def test_post_cached_per_body_for_ttl(tmp_path):
+    middleware = make_middleware(tmp_path, {r"/admin/template-render$": 3600})
+    stats = middleware.stats
+    # No validators or expiry, and a "no-cache" the settings ignore
+    response = Response(
+        TEMPLATE_URL, body=b"site 1", headers={"Cache-Control": "no-cache"}
+    )
+
+    fetch(middleware, template_request("1"), response)
+    cached = fetch(
+        middleware, template_request("1"), Response(TEMPLATE_URL, body=b"new")
+    )
+    assert cached.body == b"site 1"
+    assert "cached" in cached.flags
+
+    # A different form body is a different cache entry
+    other = fetch(
+        middleware, template_request("2"), Response(TEMPLATE_URL, body=b"site 2")
+    )
+    assert other.body == b"site 2"
+    assert stats.get_value("httpcache/hit") == 1
+    assert stats.get_value("httpcache/miss") == 2
+
+
+def test_unlisted_urls_are_not_cached(tmp_path):
+    middleware = make_middleware(tmp_path, {r"/admin/template-render$": 3600})
+    request = FormRequest(UNITS_URL, formdata={"floorPlanID": "B2A"})
+
+    fetch(middleware, request, Response(UNITS_URL, body=b"first"))
+    again = FormRequest(UNITS_URL, formdata={"floorPlanID": "B2A"})
+    assert middleware.process_request(again) is None
+    assert middleware.stats.get_value("httpcache/miss") is None
+    assert middleware.stats.get_value("httpcache/hit") is None
+
+
+def test_expired_entry_revalidates_with_etag(tmp_path):
+    middleware = make_middleware(tmp_path, {r"/rrac-website-script": 0})
+    response = Response(
+        SCRIPT_URL, body=b"var site_id = '7';", headers={"ETag": '"abc"'}
+    )
+    fetch(middleware, Request(SCRIPT_URL), response)
+
+    request = Request(SCRIPT_URL)
+    assert middleware.process_request(request) is None
+    assert request.headers[b"If-None-Match"] == b'"abc"'
+
+    not_modified = Response(SCRIPT_URL, status=304, request=request)
+    result = middleware.process_response(request, not_modified)
+    assert result.body == b"var site_id = '7';"
+    assert middleware.stats.get_value("httpcache/revalidate") == 1
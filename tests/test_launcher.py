@@ -0,0 +1,69 @@
+import json
+from datetime import UTC, datetime
+
+from Leverage.launcher import merge_stats, shard_arguments, shard_settings, shard_uri
+
+
+def test_merge_stats():
+    first = {
+        "start_time": datetime(2026, 3, 1, 12, 0, tzinfo=UTC),
+        "finish_time": datetime(2026, 3, 1, 12, 30, tzinfo=UTC),
+        "finish_reason": "finished",
+        "item_scraped_count": 100,
+        "memusage/max": 300,
+        "dbstats/upsert_units/p95_ms": 12.5,
+        "udr/fallback_rate": 0.2,
+    }
+    second = {
+        "start_time": datetime(2026, 3, 1, 12, 1, tzinfo=UTC),
+        "finish_time": datetime(2026, 3, 1, 12, 45, tzinfo=UTC),
+        "finish_reason": "closespider_timeout",
+        "item_scraped_count": 50,
+        "memusage/max": 200,
+        "dbstats/upsert_units/p95_ms": 20.0,
+        "udr/fallback_rate": 0.4,
+        "log_count/ERROR": 3,
+    }
+
+    merged = merge_stats([first, second])
+    assert merged["start_time"] == first["start_time"]
+    assert merged["finish_time"] == second["finish_time"]
+    assert merged["finish_reason"] == ["closespider_timeout", "finished"]
+    assert merged["item_scraped_count"] == 150
+    assert merged["memusage/max"] == 300
+    assert merged["dbstats/upsert_units/p95_ms"] == 20.0
+    assert merged["udr/fallback_rate"] == 0.3
+    assert merged["log_count/ERROR"] == 3
+
+
+def test_shards_get_their_own_feeds_and_budget():
+    assert (
+        shard_uri("rotating:output/%(name)s_data_%(time)s.jsonl", 2)
+        == "rotating:output/%(name)s_data_%(time)s.shard2.jsonl"
+    )
+    assert shard_arguments({"request_budget": "1000"}, 1, 4) == {
+        "request_budget": 250.0,
+        "shard": 1,
+        "shards": 4,
+    }
+
+
+def test_shard_settings_split_rate_limits_and_keep_feed_overrides():
+    overrides = shard_settings(
+        {
+            "FEEDS": json.dumps({"output/units.jsonl": {"format": "jsonlines"}}),
+            "HOST_RATE_LIMITS": json.dumps(
+                {"api": {"hosts": ["api.example.com"], "rate": 2, "burst": 8}}
+            ),
+        },
+        1,
+        4,
+    )
+
+    assert overrides["FEEDS"] == {"output/units.shard1.jsonl": {"format": "jsonlines"}}
+    assert overrides["HOST_RATE_LIMITS"] == {
+        "api": {"hosts": ["api.example.com"], "rate": 0.5, "burst": 2.0}
+    }
+    # Project default of rate 0.5, burst 2
+    assert overrides["HOST_RATE_LIMIT_DEFAULT"] == {"rate": 0.125, "burst": 1.0}
+    assert overrides["CRAWL_TASK_QUEUE"] is False
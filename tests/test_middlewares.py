@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from Leverage.middlewares import HostRateLimitMiddleware, TokenBucket
+
+API_URL = "https://app.repli360.com/admin/getUnitListByFloor"
+
+
+def make_middleware(**settings):
+    crawler = get_crawler(
+        settings_dict={
+            "HOST_RATE_LIMITS": {
+                "repli360": {"hosts": ["repli360.com"], "rate": 2, "burst": 2}
+            },
+            "HOST_RATE_LIMIT_DEFAULT": None,
+            **settings,
+        }
+    )
+    crawler.stats.open_spider()
+    return HostRateLimitMiddleware.from_crawler(crawler)
+
+
+def test_bucket_allows_burst_then_paces_in_order():
+    bucket = TokenBucket("api", rate=2, burst=2)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    # One second later two tokens were refilled, both already reserved
+    assert bucket.reserve(now + 1) == 0.5
+
+
+def test_backoff_halves_rate_once_and_honors_retry_after():
+    bucket = TokenBucket("api", rate=2, burst=2)
+    now = bucket.updated
+    assert bucket.backoff(now, 0.5, retry_after=30)
+    # A second 429 for a request sent before the cut does not cut again
+    assert not bucket.backoff(now + 0.1, 0.5, retry_after=None)
+    assert bucket.rate == 1
+    assert bucket.reserve(now + 0.1) == pytest.approx(29.9)
+
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == 2
+
+
+def test_group_hosts_share_bucket_and_slot():
+    middleware = make_middleware()
+    request = Request(API_URL)
+    assert middleware.bucket_for(request).name == "repli360"
+    assert middleware.bucket_for(Request("https://example.com/")) is None
+
+    asyncio.run(middleware.process_request(request))
+    assert request.meta["download_slot"] == "repli360"
+    assert middleware.stats.get_value("ratelimit/repli360/requests") == 1
+
+
+def test_default_bucket_per_host():
+    middleware = make_middleware(HOST_RATE_LIMIT_DEFAULT={"rate": 1, "burst": 1})
+    first = middleware.bucket_for(Request("https://a.example.com/"))
+    second = middleware.bucket_for(Request("https://b.example.com/"))
+    assert (first.name, second.name) == ("a.example.com", "b.example.com")
+
+
+def test_waiting_requests_are_counted():
+    middleware = make_middleware(
+        HOST_RATE_LIMITS={"api": {"hosts": ["repli360.com"], "rate": 50, "burst": 1}}
+    )
+
+    async def run():
+        await asyncio.gather(
+            *(middleware.process_request(Request(API_URL)) for _ in range(3))
+        )
+
+    asyncio.run(run())
+    stats = middleware.stats
+    assert stats.get_value("ratelimit/api/delayed") == 2
+    assert stats.get_value("ratelimit/api/max_queue_depth") == 2
+    assert stats.get_value("ratelimit/api/queue_depth") == 0
+
+
+class FakeEngine:
+    def __init__(self):
+        self.crawled = []
+
+    def crawl(self, request):
+        self.crawled.append(request)
+
+
+def test_requests_beyond_max_waiting_go_back_to_the_scheduler():
+    middleware = make_middleware(
+        HOST_RATE_LIMITS={"api": {"hosts": ["repli360.com"], "rate": 50, "burst": 1}},
+        HOST_RATE_LIMIT_MAX_WAITING=1,
+    )
+    middleware.crawler.engine = engine = FakeEngine()
+    middleware.crawler.crawling = True
+
+    def errback(failure):
+        pass
+
+    deferred = Request(API_URL, errback=errback)
+
+    async def run():
+        results = await asyncio.gather(
+            middleware.process_request(Request(API_URL)),
+            middleware.process_request(Request(API_URL), spider=None),
+            middleware.process_request(deferred),
+            return_exceptions=True,
+        )
+        # Until the deferred request's turn has come
+        await asyncio.sleep(0.1)
+        return results
+
+    results = asyncio.run(run())
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], IgnoreRequest)
+    assert deferred.errback is None
+    (retry,) = engine.crawled
+    assert retry.url == API_URL
+    assert retry.errback is errback
+    assert retry.dont_filter
+    stats = middleware.stats
+    assert stats.get_value("ratelimit/api/deferred") == 1
+    assert stats.get_value("ratelimit/api/max_queue_depth") == 1
+
+
+def test_throttled_response_backs_off():
+    middleware = make_middleware()
+    request = Request(API_URL)
+    response = Response(API_URL, status=429, headers={"Retry-After": "120"})
+
+    assert middleware.process_response(request, response, spider=None) is response
+    bucket = middleware.buckets["repli360"]
+    assert bucket.rate == 1
+    assert bucket.blocked_until > bucket.updated + 119
+    assert middleware.stats.get_value("ratelimit/repli360/backoffs") == 1
+
+    # Cached responses say nothing about the server's load
+    cached = Response(API_URL, status=200, flags=["cached"])
+    middleware.process_response(request, cached)
+    assert bucket.rate == 1
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+from Leverage.spiders.crawlers import PagePool
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, start=0):
+        self.values[key] = self.values.get(key, start) + count
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.context = SimpleNamespace(browser=browser)
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    crawler = SimpleNamespace(spidercls=SimpleNamespace(name="udr"), stats=FakeStats())
+    return PagePool(crawler, **kwargs)
+
+
+def test_pages_are_reused_then_recycled():
+    async def run():
+        pool = make_pool(contexts=2, max_navigations=2)
+        browser = FakeBrowser()
+
+        first = pool.request_meta()
+        second = pool.request_meta()
+        assert "playwright_page" not in first
+        assert {first["playwright_context"], second["playwright_context"]} == {
+            "udr-0",
+            "udr-1",
+        }
+
+        page = FakePage(browser)
+        pool.release(page, first["playwright_context"])
+        reused = pool.request_meta()
+        assert reused["playwright_page"] is page
+        assert reused["playwright_context"] == "udr-0"
+
+        # Second navigation reaches max_navigations
+        pool.release(page, reused["playwright_context"])
+        await asyncio.sleep(0)
+        assert page.closed
+        assert pool.idle == []
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.crawler.stats.values == {
+        "page_pool/pages_created": 2,
+        "page_pool/pages_reused": 1,
+        "page_pool/pages_recycled": 1,
+    }
+
+
+def test_browser_restarts_once_in_flight_pages_are_released(monkeypatch):
+    monkeypatch.setattr(
+        "Leverage.spiders.crawlers._pagepool.browser_rss_mb", lambda: 4096
+    )
+
+    async def run():
+        pool = make_pool(max_rss_mb=1024, rss_check_every=1)
+        browser = FakeBrowser()
+        pool.request_meta()
+        pool.request_meta()
+
+        idle_page = FakePage(browser)
+        pool.release(idle_page, "udr-0")
+        # Over the limit: idle pages are closed, new requests wait
+        assert pool.restarting
+        assert not pool.ready.is_set()
+        assert browser.is_connected()
+
+        pool.release(FakePage(browser), "udr-1")
+        await pool.wait_ready()
+        assert not browser.is_connected()
+        assert idle_page.closed
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.crawler.stats.values["page_pool/browser_restarts"] == 1
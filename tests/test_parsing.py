@@ -0,0 +1,174 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.utils.test import get_crawler
+
+from Leverage.spiders.crawlers.repli360_spider import Repli360Spider
+from Leverage.spiders.parsing import (
+    DifferentialParser,
+    JSONStream,
+    LxmlBackend,
+    ParselBackend,
+    build_parser,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "repli360"
+START_URL = "https://www.sample-apartments.com/"
+
+# Queries run on every recorded page, besides the spider's own
+QUERIES = [
+    ("css", "div"),
+    ("css", "a::attr(href)"),
+    ("css", "[onclick]::attr(onclick)"),
+    ("css", "td span::text"),
+    ("css", "p::text"),
+    ("xpath", "//*[@data-widget-config]/@data-widget-config"),
+    ("xpath", "//td[span[contains(text(), 'Unit Number')]]/text()"),
+    ("xpath", "count(//tr)"),
+    ("xpath", "boolean(//script)"),
+    ("xpath", "//*[re:test(@id, '^goto_lease_\\d+$')]"),
+]
+
+
+def recorded_pages():
+    pages = {path.name: path.read_text() for path in FIXTURES.glob("*.html")}
+    table = json.loads((FIXTURES / "unit_list.json").read_text())
+    pages["unit_list.json"] = table["str"]
+    return pages
+
+
+def make_spider(**settings):
+    crawler = get_crawler(Repli360Spider, settings_dict=settings)
+    crawler.stats.open_spider()
+    spider = Repli360Spider()
+    spider._set_crawler(crawler)
+    return spider
+
+
+def crawl_fixtures(spider):
+    """
+    Items and requests of the spider's parsing callbacks on the recorded pages.
+    """
+    landing = HtmlResponse(START_URL, body=(FIXTURES / "landing.html").read_bytes())
+    promo = spider.parse_special(landing)
+
+    render = HtmlResponse(
+        spider.TEMPLATE_RENDER_URL,
+        body=(FIXTURES / "template_render.html").read_bytes(),
+    )
+
+    async def requests():
+        return [
+            request
+            async for request in spider.parse_property(
+                render, "2221", "", start_url=START_URL
+            )
+        ]
+
+    unit_requests = asyncio.run(requests())
+    table = TextResponse(
+        "https://app.repli360.com/admin/getUnitListByFloor",
+        body=(FIXTURES / "unit_list.json").read_bytes(),
+    )
+    units = [
+        dict(unit, scraped_at=None)
+        for unit in spider.parse_unit_table(
+            table, floorplan_item=unit_requests[0].cb_kwargs["floorplan_item"]
+        )
+    ]
+    return (
+        dict(promo, scraped_at=None),
+        [
+            (request.body, dict(request.cb_kwargs["floorplan_item"]))
+            for request in unit_requests
+        ],
+        units,
+    )
+
+
+@pytest.mark.parametrize("name", sorted(recorded_pages()))
+def test_backends_agree_on_recorded_pages(name):
+    parser = DifferentialParser(LxmlBackend(), ParselBackend())
+    page = parser.parse(recorded_pages()[name])
+    for method, query in QUERIES:
+        getattr(parser, method)(page, query)
+    # Nested queries on the results
+    for node in parser.css(page, "tr, .rracFloorplan"):
+        parser.css_getall(node, "td::text, .decp p::text")
+        parser.xpath_getall(node, ".//text()")
+        assert parser.attrib(node) == node[1].attrib
+    assert parser.divergences == []
+
+
+def test_spider_output_same_for_every_backend():
+    outputs = {
+        backend: crawl_fixtures(make_spider(HTML_PARSER_BACKEND=backend))
+        for backend in ("parsel", "lxml")
+    }
+    assert outputs["lxml"] == outputs["parsel"]
+
+    promo, unit_requests, units = outputs["lxml"]
+    assert promo["text"] == "Spring Special\nGet\nRestrictions apply."
+    assert [fp["floorplan_name"] for _, fp in unit_requests] == ["A1", "B2", "Studio"]
+    assert b"floorPlanID=C4" in unit_requests[1][0]
+    assert [unit["unit_number"] for unit in units] == ["1104", "2210", "3302"]
+    assert units[1]["rent_usd"] == "1530"
+
+
+def test_differential_mode_flags_divergence():
+    class BrokenBackend(LxmlBackend):
+        def get(self, node):
+            return super().get(node).upper()
+
+    spider = make_spider(HTML_PARSER_BACKEND="lxml", HTML_PARSER_DIFFERENTIAL=True)
+    assert isinstance(spider.html_parser, DifferentialParser)
+    crawl_fixtures(spider)
+    assert spider.crawler.stats.get_value("parsing/divergences") is None
+
+    spider.html_parser.primary = BrokenBackend()
+    crawl_fixtures(spider)
+    assert spider.crawler.stats.get_value("parsing/divergences") > 0
+    _query, values, reference_values = spider.html_parser.divergences[0]
+    assert values == [value.upper() for value in reference_values]
+
+
+def test_build_parser():
+    assert isinstance(build_parser(), ParselBackend)
+    assert isinstance(make_spider().html_parser, ParselBackend)
+    assert isinstance(build_parser("lxml", differential=True).primary, LxmlBackend)
+    with pytest.raises(ValueError, match="Unknown HTML parser backend"):
+        build_parser("selectolax")
+
+
+def test_json_stream_decodes_lazy_arrays_element_by_element():
+    document = {"a": [1, {"b": 2}], "plans": [{"id": 1}, {"id": 2}, []], "c": None}
+    text = f"  {json.dumps(document)};</script>"
+
+    decoded = {}
+    for key, value in JSONStream(text).items(lazy_keys={"plans"}):
+        if key == "plans":
+            assert next(value) == {"id": 1}
+            # The rest is skipped once the next pair is read
+            continue
+        decoded[key] = value
+    assert decoded == {"a": [1, {"b": 2}], "c": None}
+
+    stream = JSONStream(text)
+    items = {
+        key: list(value) if key == "plans" else value
+        for key, value in stream.items({"plans"})
+    }
+    assert items == document
+    assert text[stream.pos :] == ";</script>"
+    assert list(JSONStream("{ }").items()) == []
+
+
+@pytest.mark.parametrize("text", ["", "[1]", '{"a" 1}', '{"a": [1 2]}', '{"b": 1,}'])
+def test_json_stream_rejects_malformed_objects(text):
+    with pytest.raises(json.JSONDecodeError):
+        for key, value in JSONStream(text).items({"a"}):
+            if key == "a":
+                list(value)
@@ -0,0 +1,625 @@
+import asyncio
+import logging
+import re
+from contextlib import asynccontextmanager, nullcontext
+from pathlib import Path
+from types import SimpleNamespace
+
+import psycopg
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+from twisted.internet.task import Clock, LoopingCall
+
+from Leverage import pipelines
+from Leverage.items import PropertyItem, UnitItem
+from Leverage.pipelines import (
+    AsyncUnitItemPipeline,
+    BatchUnitItemPipeline,
+    IngestFunctionUnitItemPipeline,
+    PostgresConnectionPipeline,
+    PropertyItemPipeline,
+    PropertyReconcilePipeline,
+    UnitItemPipeline,
+    WriteBackpressure,
+    get_partitions_ahead,
+)
+from Leverage.spiders.indexers._indexer import IndexerSpider
+from Leverage.spool import decode_item, read_records, sealed_segments
+
+
+class FakeStats:
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1, start=0):
+        self.values[key] = self.values.get(key, start) + count
+
+    def get_value(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set_value(self, key, value):
+        self.values[key] = value
+
+    def max_value(self, key, value):
+        self.values[key] = max(self.values.get(key, value), value)
+
+
+def make_unit(scraped_at, rent="1200"):
+    return UnitItem(
+        scraped_at=scraped_at,
+        rent_usd=rent,
+        deposit_usd="500",
+        min_lease_term_months="12",
+        is_available=True,
+        available_date="2025-12-01",
+    )
+
+
+def drive(statements, results=()):
+    """
+    Run a statement generator, sending it results in order (None when out).
+    """
+    results = iter(results)
+    executed = []
+    result = None
+    try:
+        while True:
+            _, query, params = statements.send(result)
+            executed.append((query, params))
+            result = next(results, None)
+    except StopIteration as e:
+        return executed, e.value
+
+
+def test_price_interval_statements_extend_unchanged_state():
+    pipeline = UnitItemPipeline(
+        FakeStats(), cache_size=10, price_history_mode="interval"
+    )
+
+    # Unknown unit without a matching open interval: close any and open one
+    statements, state = drive(pipeline.price_interval_statements(make_unit("t1"), 5))
+    assert [query for query, _ in statements] == [
+        pipeline.EXTEND_MATCHING_PRICE_INTERVAL_QUERY,
+        pipeline.CLOSE_PRICE_INTERVAL_QUERY,
+        pipeline.OPEN_PRICE_INTERVAL_QUERY,
+    ]
+    assert state[1] == "t1"
+    pipeline.identities.price_states.put(5, state)
+
+    # Same state: only bump last_seen of the interval opened at t1
+    statements, state = drive(pipeline.price_interval_statements(make_unit("t2"), 5))
+    assert len(statements) == 1
+    query, params = statements[0]
+    assert query == pipeline.EXTEND_PRICE_INTERVAL_QUERY
+    assert params["valid_from"] == "t1"
+    assert params["scraped_at"] == "t2"
+
+    # Changed rent: close and reopen
+    statements, state = drive(
+        pipeline.price_interval_statements(make_unit("t3", rent="1250"), 5)
+    )
+    assert len(statements) == 2
+    assert state[1] == "t3"
+
+
+def test_price_interval_statements_extend_open_interval_after_eviction():
+    pipeline = UnitItemPipeline(
+        FakeStats(), cache_size=10, price_history_mode="interval"
+    )
+    _, opened = drive(pipeline.price_interval_statements(make_unit("t1"), 5))
+
+    # The open interval from t1 still has the same values
+    statements, state = drive(
+        pipeline.price_interval_statements(make_unit("t2"), 5), [("t1",)]
+    )
+    assert [query for query, _ in statements] == [
+        pipeline.EXTEND_MATCHING_PRICE_INTERVAL_QUERY
+    ]
+    assert statements[0][1]["scraped_at"] == "t2"
+    assert state == (opened[0], "t1")
+    assert pipeline.stats.get_value("unit_pipeline/price_intervals_extended") == 1
+
+
+def make_property(url, city="Denver"):
+    return PropertyItem(
+        company_name="UDR",
+        property_name="The Flats",
+        url=url,
+        template_engine="udr",
+        address="1 Main St",
+        city=city,
+        state="CO",
+        postal_code="80202",
+    )
+
+
+def test_reconcile_diff_writes_only_new_and_changed():
+    pipeline = PropertyReconcilePipeline(FakeStats(), cache_size=10)
+    for item in [
+        make_property("https://udr.com/a"),
+        make_property("https://udr.com/b", city="Boulder"),
+        make_property("https://udr.com/c"),
+        make_property("https://udr.com/d/"),
+    ]:
+        pipeline.process_item(item, spider=None)
+
+    # Rows as EXISTING_PROPERTIES_QUERY returns them. Trailing blanks are
+    # ignored, since character(n) columns come back blank-padded.
+    row = ("The Flats", "udr", "1 Main St", "Denver", "CO", "80202")
+    existing = {
+        "https://udr.com/a": ("The Flats ", *row[1:], True),
+        "https://udr.com/b": (*row, True),
+        "https://udr.com/d": (*row, False),
+        "https://udr.com/gone": (*row, True),
+    }
+
+    changed, unchanged = pipeline.diff(pipeline.seen["UDR"], existing)
+    assert sorted(params["url"] for params in changed) == [
+        "https://udr.com/b",  # city changed
+        "https://udr.com/c",  # new
+        "https://udr.com/d",  # reactivated
+    ]
+    assert unchanged == 1
+
+
+def test_reconcile_replaces_property_pipeline_on_indexer_runs():
+    crawler = get_crawler(IndexerSpider)
+    assert isinstance(
+        PropertyReconcilePipeline.from_crawler(crawler), PropertyReconcilePipeline
+    )
+    with pytest.raises(NotConfigured):
+        PropertyItemPipeline.from_crawler(crawler)
+
+    crawler = get_crawler()
+    assert isinstance(PropertyItemPipeline.from_crawler(crawler), PropertyItemPipeline)
+    with pytest.raises(NotConfigured):
+        PropertyReconcilePipeline.from_crawler(crawler)
+
+
+def test_reconcile_skips_deactivation_on_partial_runs():
+    stats = FakeStats()
+    pipeline = PropertyReconcilePipeline(stats, cache_size=10, min_seen_ratio=0.5)
+    existing = {f"https://udr.com/{i}": (True,) for i in range(10)}
+
+    assert not pipeline.should_deactivate("UDR", {"https://udr.com/1": {}}, existing)
+    seen = {f"https://udr.com/{i}": {} for i in range(6)}
+    assert pipeline.should_deactivate("UDR", seen, existing)
+
+    stats.inc_value("log_count/ERROR")
+    assert not pipeline.should_deactivate("UDR", seen, existing)
+
+
+class FakeConnection:
+    def transaction(self):
+        return nullcontext()
+
+    def cursor(self):
+        return nullcontext()
+
+
+def make_spider():
+    return SimpleNamespace(crawler=SimpleNamespace(postgres_conn=FakeConnection()))
+
+
+class RecordingBatchPipeline(BatchUnitItemPipeline):
+    def __init__(self, fail=False, **kwargs):
+        super().__init__(FakeStats(), **kwargs)
+        self.batches = []
+        self.fail = fail
+
+    def merge_batch(self, cur, batch):
+        if self.fail:
+            raise psycopg.errors.DeadlockDetected("deadlock detected")
+        self.batches.append([row[6] for row in batch])
+
+
+def make_batch_unit(number):
+    return UnitItem(
+        scraped_at="2025-11-01T00:00:00+00:00",
+        property_url="https://example.com",
+        floorplan_name="A1",
+        unit_number=str(number),
+        rent_usd="1200",
+    )
+
+
+def test_staging_row_follows_staging_columns():
+    pipeline = BatchUnitItemPipeline(FakeStats(), batch_size=10, batch_seconds=0)
+    item = UnitItem(
+        scraped_at="t1",
+        property_url="https://example.com",
+        floorplan_name="A1",
+        num_bedrooms="1",
+        num_bathrooms="1.5",
+        square_footage="700",
+        unit_number="101",
+        floor_number="1",
+        building_name="B",
+        top_floor=False,
+        rent_usd="1200",
+        deposit_usd="500",
+        min_lease_term_months="12",
+        is_available=True,
+        available_date="2025-12-01",
+    )
+    row = dict(zip(pipeline.STAGING_COLUMNS, pipeline.staging_row(item), strict=True))
+    assert row == {
+        "scraped_at": "t1",
+        "property_url": "https://example.com",
+        "plan_name": "A1",
+        "bedrooms": "1",
+        "bathrooms": "1.5",
+        "square_footage": "700",
+        "unit_number": "101",
+        "floor_number": "1",
+        "building_name": "B",
+        "is_on_top_floor": False,
+        "rent_usd": "1200",
+        "deposit_usd": "500",
+        "min_lease_term_months": "12",
+        "is_available": True,
+        "available_date": "2025-12-01",
+    }
+    # Missing fields are staged as NULL
+    assert (
+        pipeline.staging_row(UnitItem(property_url="https://example.com"))[2:]
+        == (None,) * 13
+    )
+
+
+def test_batch_pipeline_flushes_by_size():
+    pipeline = RecordingBatchPipeline(batch_size=2, batch_seconds=0)
+    spider = make_spider()
+    pipeline.open_spider(spider)
+    for number in range(5):
+        pipeline.process_item(make_batch_unit(number), spider)
+    assert pipeline.batches == [["0", "1"], ["2", "3"]]
+
+    pipeline.close_spider(spider)
+    assert pipeline.batches[-1] == ["4"]
+    assert pipeline.stats.get_value("unit_pipeline/items_flushed") == 5
+    assert pipeline.stats.get_value("unit_pipeline/merge_items_per_sec") > 0
+
+
+def test_batch_pipeline_flushes_by_time(monkeypatch):
+    clock = Clock()
+
+    class ClockLoopingCall(LoopingCall):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.clock = clock
+
+    monkeypatch.setattr(pipelines, "LoopingCall", ClockLoopingCall)
+    pipeline = RecordingBatchPipeline(batch_size=100, batch_seconds=30)
+    spider = make_spider()
+    pipeline.open_spider(spider)
+    pipeline.process_item(make_batch_unit(1), spider)
+
+    clock.advance(29)
+    assert pipeline.batches == []
+    clock.advance(1)
+    assert pipeline.batches == [["1"]]
+
+    pipeline.close_spider(spider)
+    assert not pipeline.flush_loop.running
+    assert pipeline.batches == [["1"]]
+
+
+def test_batch_pipeline_dead_letters_failed_batches(tmp_path):
+    pipeline = RecordingBatchPipeline(
+        fail=True, batch_size=2, batch_seconds=0, dead_letter_dir=str(tmp_path)
+    )
+    spider = make_spider()
+    for number in range(3):
+        pipeline.process_item(make_batch_unit(number), spider)
+    pipeline.close_spider(spider)
+
+    assert pipeline.stats.get_value("unit_pipeline/failed_batches") == 2
+    assert pipeline.stats.get_value("unit_pipeline/failed_items") == 3
+    # Spooled as UnitItems, so the spool loader can replay them
+    records = [
+        decode_item(payload)
+        for segment in sealed_segments(str(tmp_path))
+        for payload, _ in read_records(str(tmp_path / segment))
+    ]
+    assert records == [
+        ("UnitItem", dict(make_batch_unit(number))) for number in range(3)
+    ]
+
+
+def test_batch_pipeline_needs_dead_letter_dir():
+    crawler = get_crawler(settings_dict={"UNIT_PIPELINE_DEAD_LETTER_DIR": ""})
+    with pytest.raises(NotConfigured, match="UNIT_PIPELINE_DEAD_LETTER_DIR"):
+        BatchUnitItemPipeline.from_crawler(crawler)
+
+    # Without one, failed batches are dropped and the flush loop goes on
+    pipeline = RecordingBatchPipeline(fail=True, batch_size=1, batch_seconds=0)
+    pipeline.process_item(make_batch_unit(1), make_spider())
+    assert pipeline.stats.get_value("unit_pipeline/failed_items") == 1
+    assert pipeline.dead_letter is None
+
+
+def test_batch_merge_keeps_units_without_a_plan_name():
+    merge = BatchUnitItemPipeline.MERGE_APARTMENT_UNITS
+    assert "f.plan_name IS NOT DISTINCT FROM s.plan_name" in merge
+    assert "f.plan_name IS NULL" in BatchUnitItemPipeline.MERGE_FLOORPLANS
+
+
+class FakeEngine:
+    def __init__(self):
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def unpause(self):
+        self.paused = False
+
+
+def test_write_backpressure_pauses_until_half_drained():
+    crawler = SimpleNamespace(engine=FakeEngine(), stats=FakeStats())
+    writes = WriteBackpressure(crawler, max_in_flight=4)
+
+    async def run():
+        slots = [writes.slot() for _ in range(4)]
+        for slot in slots[:3]:
+            await slot.__aenter__()
+        assert not crawler.engine.paused
+        await slots[3].__aenter__()
+        assert crawler.engine.paused
+
+        # Resumes at max_in_flight // 2 writes left
+        await slots[0].__aexit__(None, None, None)
+        assert crawler.engine.paused
+        await slots[1].__aexit__(None, None, None)
+        assert not crawler.engine.paused
+        for slot in slots[2:]:
+            await slot.__aexit__(None, None, None)
+
+    asyncio.run(run())
+    assert writes.in_flight == 0
+    assert crawler.stats.get_value("postgres_pool/engine_paused") == 1
+    assert crawler.stats.get_value("postgres_pool/max_in_flight") == 4
+
+
+class FakeAsyncCursor:
+    """
+    Answers the identity map warm-up and the unit upserts with new IDs.
+    """
+
+    def __init__(self, executed):
+        self.executed = executed
+        self.description = None
+        self.rowcount = 1
+        self.result = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.executed.append(query)
+        self.description = None
+        if "FROM properties p" in query:
+            # Known property without floorplans yet
+            self.result = [(7,) + (None,) * 10]
+            self.description = ()
+        elif "RETURNING" in query:
+            self.result = [(len(self.executed),)]
+            self.description = ()
+        # Let other items run between statements
+        await asyncio.sleep(0)
+
+    async def fetchone(self):
+        return self.result[0]
+
+    async def fetchall(self):
+        return self.result
+
+
+class FakeAsyncConnection:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def cursor(self):
+        return FakeAsyncCursor(self.executed)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakePool:
+    def __init__(self):
+        self.executed = []
+        self.in_use = self.max_in_use = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        try:
+            yield FakeAsyncConnection(self.executed)
+        finally:
+            self.in_use -= 1
+
+
+def make_async_spider():
+    crawler = SimpleNamespace(engine=FakeEngine(), stats=FakeStats())
+    crawler.postgres_pool = FakePool()
+    crawler.postgres_writes = WriteBackpressure(crawler, max_in_flight=10)
+    return SimpleNamespace(crawler=crawler)
+
+
+def test_async_unit_pipeline_writes_and_caches_units():
+    pipeline = AsyncUnitItemPipeline(FakeStats(), cache_size=10)
+    spider = make_async_spider()
+    units = [
+        UnitItem(
+            property_url="https://example.com",
+            floorplan_name="A1",
+            unit_number=str(number),
+            scraped_at="t1",
+            rent_usd="1200",
+        )
+        for number in (1, 2)
+    ]
+
+    async def run(items):
+        return await asyncio.gather(
+            *(pipeline.process_item(item, spider) for item in items)
+        )
+
+    assert asyncio.run(run(units)) == units
+    executed = spider.crawler.postgres_pool.executed
+    # The floorplan created by the first item is reused by the second
+    assert executed.count(pipeline.UPSERT_FLOORPLAN_QUERY) == 1
+    assert executed.count(pipeline.UPSERT_APARTMENT_UNIT_QUERY) == 2
+    assert executed.count(pipeline.INSERT_PRICE_HISTORY_QUERY) == 2
+    assert pipeline.property_locks == {}
+    # The second item waited on the property lock without a connection
+    assert spider.crawler.postgres_pool.max_in_use == 1
+
+    # Cached units only need their price recorded
+    executed.clear()
+    asyncio.run(run(units[:1]))
+    assert executed == [pipeline.INSERT_PRICE_HISTORY_QUERY]
+    assert pipeline.stats.get_value("unit_pipeline/unit_upserts_skipped") == 1
+
+
+@pytest.mark.parametrize("months", [0, -1])
+def test_partitions_ahead_must_be_positive(months):
+    crawler = get_crawler(settings_dict={"PRICE_HISTORY_PARTITIONS_AHEAD": months})
+    with pytest.raises(ValueError, match="PRICE_HISTORY_PARTITIONS_AHEAD"):
+        get_partitions_ahead(crawler)
+
+    crawler = get_crawler(
+        settings_dict={"PRICE_HISTORY_PARTITIONS_AHEAD": months, "DB_DSN": "x"}
+    )
+    with pytest.raises(ValueError, match="PRICE_HISTORY_PARTITIONS_AHEAD"):
+        PostgresConnectionPipeline.from_crawler(crawler)
+
+
+def test_partitions_ahead_setting():
+    assert get_partitions_ahead(get_crawler()) == 2
+    crawler = get_crawler(settings_dict={"PRICE_HISTORY_PARTITIONS_AHEAD": "6"})
+    assert get_partitions_ahead(crawler) == 6
+
+
+class PartitionsCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return (1,)
+
+
+class PartitionsConnection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return PartitionsCursor(self.executed)
+
+
+def test_open_spider_creates_price_history_partitions(monkeypatch):
+    conn = PartitionsConnection()
+    connects = []
+
+    def connect(dsn, **kwargs):
+        connects.append((dsn, kwargs))
+        return conn
+
+    monkeypatch.setattr(pipelines.psycopg, "connect", connect)
+    crawler = get_crawler(
+        settings_dict={
+            "DB_DSN": "postgresql://test",
+            "PRICE_HISTORY_PARTITIONS_AHEAD": 4,
+        }
+    )
+    pipeline = PostgresConnectionPipeline.from_crawler(crawler)
+    spider = SimpleNamespace(crawler=crawler, logger=logging.getLogger("test"))
+    pipeline.open_spider(spider)
+
+    assert connects == [("postgresql://test", {"autocommit": True})]
+    assert crawler.postgres_conn is conn
+    [(query, params)] = conn.executed
+    assert "create_price_history_partitions" in query
+    assert params == (4,)
+
+
+# Types Postgres reports for the ingest_unit_observation() parameters
+CAST_TYPES = {
+    "text": "text",
+    "timestamptz": "timestamp with time zone",
+    "varchar": "character varying",
+    "integer": "integer",
+    "numeric": "numeric",
+    "smallint": "smallint",
+    "boolean": "boolean",
+    "date": "date",
+}
+
+
+def test_ingest_query_casts_every_argument_to_its_parameter_type():
+    migration = (
+        Path(__file__).parents[1] / "sql/migrations/0003_ingest_unit_observation.sql"
+    ).read_text()
+    signature = re.search(r"ingest_unit_observation\((.*?)\) RETURNS", migration)[1]
+    parameters = dict(
+        re.match(r"(\w+) (.+?)(?: DEFAULT .*)?$", parameter.strip()).groups()
+        for parameter in signature.split(",")
+    )
+
+    pipeline = IngestFunctionUnitItemPipeline(FakeStats())
+    arguments = re.findall(r"(\w+) => %\((\w+)\)s::(\w+)", pipeline.INGEST_UNIT_QUERY)
+    assert len(arguments) == pipeline.INGEST_UNIT_QUERY.count("%(")
+    assert {name: CAST_TYPES[cast] for name, _, cast in arguments} == parameters
+
+    params = pipeline.ingest_params(make_batch_unit(1))
+    assert sorted(key for _, key, _ in arguments) == sorted(params)
+    assert params["unit_number"] == "1"
+    assert params["interval_mode"] is False
+
+
+class IngestCursor(PartitionsCursor):
+    rowcount = 1
+
+    def execute(self, query, params=None, prepare=None):
+        self.executed.append((query, params, prepare))
+
+    def fetchone(self):
+        return (7,)
+
+
+class IngestConnection(PartitionsConnection):
+    def cursor(self):
+        return IngestCursor(self.executed)
+
+
+def test_ingest_pipeline_prepares_one_call_per_item():
+    conn = IngestConnection()
+    spider = SimpleNamespace(crawler=SimpleNamespace(postgres_conn=conn))
+    pipeline = IngestFunctionUnitItemPipeline(
+        FakeStats(), price_history_mode="interval"
+    )
+
+    item = make_batch_unit(1)
+    assert pipeline.process_item(item, spider) is item
+    [(query, params, prepare)] = conn.executed
+    assert query == pipeline.INGEST_UNIT_QUERY
+    assert prepare
+    assert params["interval_mode"] is True
+    assert pipeline.stats.get_value("unit_pipeline/ingest_calls") == 1
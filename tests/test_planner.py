@@ -0,0 +1,104 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from Leverage.planner import (
+    CrawlPlanner,
+    CrawlStatsExtension,
+    PropertyPlan,
+    budget_properties,
+)
+
+NOW = datetime(2026, 3, 1, 12, tzinfo=UTC)
+
+
+def plan(property_id, changes=0, days=30.0, crawled_days_ago=1.0, failure_rate=0.0):
+    last_crawled_at = None
+    if crawled_days_ago is not None:
+        last_crawled_at = NOW - timedelta(days=crawled_days_ago)
+    return PropertyPlan(
+        property_id,
+        f"https://example.com/{property_id}",
+        change_events=changes,
+        observed_days=days,
+        last_crawled_at=last_crawled_at,
+        failure_rate=failure_rate,
+    )
+
+
+def test_volatile_properties_score_higher():
+    planner = CrawlPlanner()
+    volatile = planner.score(plan(1, changes=30), NOW)
+    stable = planner.score(plan(2, changes=0), NOW)
+    assert 0 < stable < volatile < 1
+
+
+def test_score_grows_with_time_since_last_crawl():
+    planner = CrawlPlanner()
+    scores = [
+        planner.score(plan(1, changes=10, crawled_days_ago=days), NOW)
+        for days in (0, 1, 7, 60)
+    ]
+    assert scores[0] == 0
+    assert scores == sorted(scores)
+    assert scores[-1] == pytest.approx(1, abs=0.01)
+
+
+def test_failures_lower_the_score_but_never_to_zero():
+    planner = CrawlPlanner()
+    healthy = planner.score(plan(1, changes=10), NOW)
+    flaky = planner.score(plan(2, changes=10, failure_rate=0.5), NOW)
+    broken = planner.score(plan(3, changes=10, failure_rate=1.0), NOW)
+    assert flaky == pytest.approx(healthy / 2)
+    assert broken == pytest.approx(healthy * CrawlPlanner.MIN_RELIABILITY)
+
+
+def test_select_orders_by_score_and_applies_limits():
+    crawler = get_crawler()
+    crawler.stats.open_spider()
+    planner = CrawlPlanner(crawler.stats, min_score=0.1)
+    plans = [
+        plan(1, changes=0, crawled_days_ago=0.1),  # Stable, just crawled
+        plan(2, changes=30),
+        plan(3, crawled_days_ago=None),  # Never crawled
+        plan(4, changes=5),
+    ]
+
+    selected = planner.select(plans, now=NOW)
+    assert [p.property_id for p in selected] == [3, 2, 4]
+    # Plans streamed from the database are consumed once
+    assert [p.property_id for p in planner.select(iter(plans), 2, now=NOW)] == [3, 2]
+    assert crawler.stats.get_value("planner/candidates") == 3
+    assert crawler.stats.get_value("planner/selected") == 2
+
+
+def test_budget_properties_uses_the_tighter_budget():
+    assert budget_properties(None, None, 8, 16) is None
+    assert budget_properties(100, None, 8, 16) == 12
+    assert budget_properties(None, 3600, 8, 16) == 225
+    assert budget_properties(1000, 3600, 8, 16) == 125
+
+
+def test_outcomes_skip_unreached_properties_when_not_finished():
+    ext = CrawlStatsExtension("dbname=test")
+    for url, status in [
+        ("https://example.com/1", 200),
+        ("https://example.com/2", 404),
+        ("https://example.com/3", 200),
+    ]:
+        request = Request(url, meta={"property_url": url})
+        ext.response_received(Response(url, status=status), request, None)
+    # Follow-up requests of a property don't count
+    follow_up = Request("https://example.com/2/units")
+    ext.response_received(Response(follow_up.url), follow_up, None)
+    planned = {"https://example.com/1": 1, "https://example.com/2": 2}
+
+    assert ext.outcomes(planned, finished=True) == [
+        {"property_id": 1, "failed": False},
+        {"property_id": 2, "failed": True},
+    ]
+    assert ext.outcomes(planned, finished=False) == [
+        {"property_id": 1, "failed": False},
+    ]
@@ -0,0 +1,78 @@
+import asyncio
+
+from scrapy.utils.test import get_crawler
+
+from Leverage.spiders.crawlers.portfolio_spider import PortfolioSpider
+from Leverage.spiders.crawlers.udr_spider import UDRSpider
+
+REPLI360_URL = "https://www.example-apartments.com/"
+UDR_URL = "https://www.udr.com/seattle-apartments/example/"
+BESPARK_URL = "https://www.bespark-apartments.com/"
+
+
+def collect(agen):
+    async def run():
+        return [result async for result in agen]
+
+    return asyncio.run(run())
+
+
+def make_spider(properties):
+    crawler = get_crawler(PortfolioSpider)
+    crawler.stats.open_spider()
+    # Skip DatabaseSpider.from_crawler, which needs Postgres
+    spider = PortfolioSpider(site_ids={}, planned_properties={}, properties=properties)
+    spider._set_crawler(crawler)
+    spider.engines = {
+        name: spider.build_engine(engine_cls)
+        for name, engine_cls in PortfolioSpider.ENGINES.items()
+    }
+    return spider
+
+
+def test_properties_are_dispatched_to_their_engine():
+    spider = make_spider(
+        [
+            {
+                "property_id": 1,
+                "url": REPLI360_URL,
+                "site_id": "2221",
+                "template_engine": "repli360",
+            },
+            {
+                "property_id": 2,
+                "url": UDR_URL,
+                "site_id": None,
+                "template_engine": "udr",
+            },
+            {
+                "property_id": 3,
+                "url": BESPARK_URL,
+                "site_id": None,
+                "template_engine": "bespark",
+            },
+        ]
+    )
+    repli360, udr = collect(spider.start())
+
+    assert repli360.url == REPLI360_URL
+    assert repli360.cb_kwargs == {"site_id": "2221"}
+    assert repli360.callback.__self__ is spider.engines["repli360"]
+    assert udr.url == UDR_URL
+    assert udr.callback.__self__ is spider.engines["udr"]
+    # Engines share the spider's state and crawler
+    assert spider.engines["repli360"].site_ids is spider.site_ids
+    assert spider.engines["udr"].crawler is spider.crawler
+
+    stats = spider.crawler.stats
+    assert stats.get_value("portfolio/properties/repli360") == 1
+    assert stats.get_value("portfolio/properties/udr") == 1
+    assert stats.get_value("portfolio/unsupported_engine") == 1
+
+
+def test_engine_settings_and_blocklists_are_combined():
+    assert PortfolioSpider.custom_settings["HTTPCACHE_ENABLED"] is True
+    assert UDRSpider.blocked_domains <= PortfolioSpider.blocked_domains
+    assert PortfolioSpider.property_filter_params() == {
+        "template_engines": ["repli360", "udr"]
+    }
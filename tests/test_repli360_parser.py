@@ -0,0 +1,105 @@
+import json
+
+import pytest
+from scrapy import Selector
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from Leverage.items import UnitItem
+from Leverage.spiders.crawlers.repli360_spider import Repli360Spider
+
+UNIT_ROW = """
+<tr class="unitlisting">
+  <td><span>Unit Number</span> 101 </td>
+  <td><span>Building Number</span>
+    <!-- building -->
+    B1
+  </td>
+  <td><span class="label">Starting At</span> $1,200 </td>
+  <td><span>Deposit</span>$500</td>
+  <td><span>Availability</span> Available Now </td>
+  <td><a id="goto_lease_101" href="/lease?BuildingID=2&amp;Term=12">Lease</a></td>
+</tr>
+"""
+
+ROWS = [
+    UNIT_ROW,
+    # Rent matrix instead of direct text
+    """
+    <tr class="unitlisting">
+      <td><span>Unit Number</span>2204</td>
+      <td><span>Total Monthly Leasing Price Starting At</span>
+        <a href="#"><span class="term_plan_matrix_wrapper btn">$2,045</span></a>
+      </td>
+      <td><span>Availability</span><div><b> 12-01-2025 </b> later</div></td>
+      <td><a id="goto_lease_2204">Lease</a><a id="goto_lease_x" href="/lease?Term=6">Lease</a></td>
+    </tr>
+    """,
+    # Labels spread over several spans, empty and missing values
+    """
+    <tr class="unitlisting">
+      <td><span><i>icon</i>Unit Number</span><span>extra</span><p>  </p></td>
+      <td><span>Deposit</span><span class="term_plan_matrix_wrapper">  </span></td>
+      <td><span>Starting At</span></td>
+      <td><span>Availability</span><!-- none --><em>Soon</em></td>
+      <td><span>Building Number</span> A <b>x</b> , B </td>
+    </tr>
+    """,
+    # The same label in two cells, nested tables
+    """
+    <tr class="unitlisting">
+      <td><span>Unit Number</span>7</td>
+      <td><span>Unit Number</span>8</td>
+      <td><table><tr><td><span>Deposit</span>$1,000.00</td></tr></table></td>
+      <td><a id="goto_lease_7" href="/lease">Lease</a></td>
+    </tr>
+    """,
+    # Nothing labelled
+    '<tr class="unitlisting"><td>101</td><td>$1,200</td></tr>',
+]
+
+
+def make_spider():
+    crawler = get_crawler(Repli360Spider)
+    crawler.stats.open_spider()
+    spider = Repli360Spider()
+    spider._set_crawler(crawler)
+    return spider
+
+
+def unit_rows(html):
+    return Selector(text=f"<table>{html}</table>").css("tr.unitlisting")
+
+
+def test_parse_listing():
+    spider = make_spider()
+    (row,) = unit_rows(UNIT_ROW)
+    assert spider._parse_listing(row) == {
+        "unit_number": "101",
+        "building_name": "2",
+        "rent_usd": "1200",
+        "deposit_usd": "500",
+        "available_date": "Available Now",
+        "min_lease_term_months": "12",
+    }
+
+
+@pytest.mark.parametrize("html", ROWS)
+def test_parse_listing_matches_label_parser(html):
+    spider = make_spider()
+    for row in unit_rows(html):
+        assert spider._parse_listing(row) == spider._parse_listing_by_label(row)
+
+
+def test_parse_unit_table():
+    spider = make_spider()
+    response = TextResponse(
+        "https://app.repli360.com/admin/getUnitListByFloor",
+        body=json.dumps({"str": f"<table>{UNIT_ROW}</table>"}).encode(),
+    )
+    (unit,) = spider.parse_unit_table(
+        response, floorplan_item=UnitItem(floorplan_name="A1")
+    )
+    assert unit["unit_number"] == "101"
+    assert unit["rent_usd"] == "1200"
+    assert unit["is_available"] is True
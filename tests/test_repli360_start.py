@@ -0,0 +1,98 @@
+import asyncio
+from pathlib import Path
+
+from scrapy.http import HtmlResponse, Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from Leverage.items import PromoItem, PropertySiteItem
+from Leverage.spiders.crawlers.repli360_spider import Repli360Spider
+
+KNOWN_URL = "https://www.known-apartments.com/"
+NEW_URL = "https://www.new-apartments.com/"
+FIXTURES = Path(__file__).parent / "fixtures" / "repli360"
+
+
+def make_spider(**kwargs):
+    crawler = get_crawler(Repli360Spider)
+    crawler.stats.open_spider()
+    spider = Repli360Spider(**kwargs)
+    spider._set_crawler(crawler)
+    return spider
+
+
+def collect(agen):
+    async def run():
+        return [result async for result in agen]
+
+    return asyncio.run(run())
+
+
+def test_start_skips_script_for_stored_site_id():
+    spider = make_spider(start_urls=[KNOWN_URL, NEW_URL], site_ids={KNOWN_URL: "2221"})
+    known, new = collect(spider.start())
+
+    # The landing page is still fetched, for its promotions
+    assert known.url == KNOWN_URL
+    assert known.callback == spider.parse
+    assert known.cb_kwargs == {"site_id": "2221"}
+    assert new.url == NEW_URL
+    assert new.cb_kwargs == {}
+    assert spider.crawler.stats.get_value("repli360/site_id_reused") == 1
+
+
+def test_known_site_crawl_still_emits_promos():
+    spider = make_spider(site_ids={KNOWN_URL: "2221"})
+    request = asyncio.run(spider.property_request(KNOWN_URL))
+    response = HtmlResponse(
+        KNOWN_URL,
+        body=(FIXTURES / "landing.html").read_bytes(),
+        request=request,
+    )
+
+    promo, render = collect(spider.parse(response, **request.cb_kwargs))
+    assert isinstance(promo, PromoItem)
+    assert promo["property_url"] == KNOWN_URL
+    assert promo["text"].startswith("Spring Special")
+    # Straight to the template render, without the script
+    assert render.url == spider.TEMPLATE_RENDER_URL
+    assert b"site_id=2221" in render.body
+    assert render.cb_kwargs["start_url"] == KNOWN_URL
+    assert render.cb_kwargs["stored_site_id"] is True
+
+
+def test_parse_script_emits_site_id_only_when_changed():
+    spider = make_spider(site_ids={KNOWN_URL: "2221"})
+    script = b"var site_id = '3000'; var desiredMoveinDate = '';"
+    response = TextResponse("https://app.repli360.com/rrac-website-script", body=script)
+
+    site, request = collect(spider.parse_script(response, start_url=KNOWN_URL))
+    assert site == PropertySiteItem(property_url=KNOWN_URL, site_id="3000")
+    assert request.cb_kwargs["site_id"] == "3000"
+
+    spider.site_ids[KNOWN_URL] = "3000"
+    (request,) = collect(spider.parse_script(response, start_url=KNOWN_URL))
+    assert request.url == spider.TEMPLATE_RENDER_URL
+
+
+def test_empty_floorplans_for_stored_site_id_rediscover():
+    spider = make_spider()
+    request = Request(spider.TEMPLATE_RENDER_URL, method="POST")
+    response = HtmlResponse(
+        spider.TEMPLATE_RENDER_URL, body=b"<html></html>", request=request
+    )
+
+    (rediscover,) = collect(
+        spider.parse_property(
+            response, "2221", "", start_url=KNOWN_URL, stored_site_id=True
+        )
+    )
+    assert rediscover.url == KNOWN_URL
+    assert rediscover.callback == spider.parse
+    # Promotions were emitted by the first landing page fetch
+    assert rediscover.cb_kwargs == {"rediscover": True}
+    assert spider.crawler.stats.get_value("repli360/site_id_rediscovered") == 1
+
+    # Discovery itself never loops
+    assert (
+        collect(spider.parse_property(response, "2221", "", start_url=KNOWN_URL)) == []
+    )
@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from Leverage.items import PropertyItem, UnitItem
+from Leverage.spool import (
+    SpoolWriter,
+    decode_item,
+    encode_item,
+    read_records,
+    recover_segments,
+    sealed_segments,
+)
+from Leverage.spool_loader import SpoolLoader
+
+
+def make_unit(number):
+    return UnitItem(
+        scraped_at="2025-11-01T00:00:00+00:00",
+        property_url="https://example.com",
+        unit_number=str(number),
+        rent_usd="1200",
+    )
+
+
+def test_encode_decode_roundtrip():
+    item = PropertyItem(url="https://example.com", company_name="Acme")
+    assert decode_item(encode_item(item)) == (
+        "PropertyItem",
+        {"url": "https://example.com", "company_name": "Acme"},
+    )
+
+
+def test_writer_rotates_and_seals_segments(tmp_path):
+    writer = SpoolWriter(str(tmp_path), segment_bytes=200, fsync_records=2)
+    writer.open()
+    for number in range(10):
+        writer.append(encode_item(make_unit(number)))
+    writer.close()
+
+    segments = sealed_segments(str(tmp_path))
+    assert len(segments) > 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".open")]
+
+    numbers = [
+        decode_item(payload)[1]["unit_number"]
+        for segment in segments
+        for payload, _ in read_records(os.path.join(tmp_path, segment))
+    ]
+    assert numbers == [str(number) for number in range(10)]
+
+
+def test_recover_truncates_torn_tail(tmp_path):
+    writer = SpoolWriter(str(tmp_path))
+    writer.open()
+    writer.append(encode_item(make_unit(1)))
+    writer.append(encode_item(make_unit(2)))
+    writer.sync()
+    # Simulate a crash halfway through a third record
+    writer.file.write(b"\x00\x00\x01\x00garbage")
+    writer.file.close()
+    # A dead writer's segment, as left behind by a crashed crawl
+    dead = os.path.join(tmp_path, "00000000000000000001-999999999.open")
+    os.replace(writer.path, dead)
+
+    [sealed] = recover_segments(str(tmp_path))
+    records = list(read_records(sealed))
+    assert len(records) == 2
+    assert os.path.getsize(sealed) == records[-1][1]
+
+
+class RecordingLoader(SpoolLoader):
+    def __init__(self, directory, fail_on_batch=None):
+        super().__init__(directory, conn=None, batch_size=3)
+        self.batches = []
+        self.fail_on_batch = fail_on_batch
+
+    def load_batch(self, batch):
+        if len(self.batches) == self.fail_on_batch:
+            raise RuntimeError("database went away")
+        self.batches.append([item["unit_number"] for _, item in batch])
+
+
+def test_loader_resumes_from_checkpoint(tmp_path):
+    writer = SpoolWriter(str(tmp_path))
+    writer.open()
+    for number in range(7):
+        writer.append(encode_item(make_unit(number)))
+    writer.close()
+
+    crashed = RecordingLoader(str(tmp_path), fail_on_batch=1)
+    with pytest.raises(RuntimeError):
+        crashed.drain()
+    assert crashed.batches == [["0", "1", "2"]]
+
+    resumed = RecordingLoader(str(tmp_path))
+    assert resumed.drain() == 4
+    assert resumed.batches == [["3", "4", "5"], ["6"]]
+    assert sealed_segments(str(tmp_path)) == []
+
+
+class PickyLoader(SpoolLoader):
+    def __init__(self, directory):
+        super().__init__(directory, conn=None, batch_size=3)
+        self.loaded = []
+
+    def load_batch(self, batch):
+        for _, item in batch:
+            if item["unit_number"] == "bad":
+                raise ValueError("Failed to retrieve company_id")
+        self.loaded.extend(item["unit_number"] for _, item in batch)
+
+
+def test_loader_quarantines_bad_records(tmp_path):
+    writer = SpoolWriter(str(tmp_path))
+    writer.open()
+    for number in ["0", "bad", "2", "3"]:
+        writer.append(encode_item(make_unit(number)))
+    writer.append(b"\xff not json")
+    writer.append(encode_item(make_unit(5)))
+    writer.close()
+
+    loader = PickyLoader(str(tmp_path))
+    assert loader.drain() == 4
+    assert loader.loaded == ["0", "2", "3", "5"]
+    assert loader.stats["spool_loader/quarantined"] == 2
+    assert sealed_segments(str(tmp_path)) == []
+
+    quarantine = tmp_path / SpoolLoader.QUARANTINE_DIR
+    payloads = [
+        payload
+        for segment in sealed_segments(str(quarantine))
+        for payload, _ in read_records(str(quarantine / segment))
+    ]
+    assert decode_item(payloads[0]) == ("UnitItem", dict(make_unit("bad")))
+    assert payloads[1] == b"\xff not json"
@@ -0,0 +1,114 @@
+import json
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from Leverage.spiders.crawlers import PagePool
+from Leverage.spiders.crawlers.udr_spider import UDRSpider
+
+URL = "https://www.udr.com/seattle-apartments/example/"
+
+VIEW_MODEL = {
+    "allSpecials": [{"id": 7, "content": "One month free", "floorplanId": 3}],
+    "floorPlans": [
+        {
+            "id": 3,
+            "units": [
+                {
+                    "marketingName": "101",
+                    "rent": 2150,
+                    "earliestMoveInDate": "/Date(1773446400000+0000)/",
+                    "building": "N/A",
+                }
+            ],
+        }
+    ],
+}
+
+
+def make_spider():
+    crawler = get_crawler(UDRSpider)
+    crawler.stats.open_spider()
+    # Skip DatabaseSpider.from_crawler, which needs Postgres
+    spider = UDRSpider()
+    spider._set_crawler(crawler)
+    spider.page_pool = PagePool.from_crawler(crawler)
+    return spider
+
+
+def make_response(body, meta=None):
+    request = Request(URL, meta=meta or {})
+    return HtmlResponse(URL, body=body, encoding="utf-8", request=request)
+
+
+def page_with_view_model(view_model_json):
+    return (
+        "<html><head><script>\n"
+        "window.udr = window.udr || {};\n"
+        f"window.udr.jsonObjPropertyViewModel = {view_model_json};\n"
+        "</script></head><body></body></html>"
+    )
+
+
+def test_fast_path_parses_server_rendered_view_model():
+    spider = make_spider()
+    results = list(
+        spider.parse(make_response(page_with_view_model(json.dumps(VIEW_MODEL))))
+    )
+
+    assert [type(r).__name__ for r in results] == ["PromoItem", "UnitItem"]
+    unit = results[1]
+    assert unit["unit_number"] == "101"
+    assert unit["available_date"] == "2026-03-14"
+    assert unit["building_name"] is None
+    assert spider.crawler.stats.get_value("udr/fast_path_parsed") == 1
+
+
+def test_missing_or_malformed_view_model_falls_back_to_playwright():
+    spider = make_spider()
+    for body in ("<html><body>Loading…</body></html>", page_with_view_model("{bad")):
+        (request,) = spider.parse(make_response(body))
+        assert request.url == URL
+        assert request.meta["playwright"] is True
+        assert request.dont_filter
+
+    assert spider.crawler.stats.get_value("udr/playwright_fallbacks") == 2
+
+
+def test_rendered_page_without_view_model_does_not_fall_back_again():
+    spider = make_spider()
+    spider.page_pool.in_flight = 1
+    meta = {"playwright": True, "playwright_context": "udr-0"}
+    assert list(spider.parse(make_response("<html></html>", meta))) == []
+    assert spider.crawler.stats.get_value("udr/playwright_fallbacks") is None
+
+
+def test_minified_view_model_streams_in_document_order():
+    spider = make_spider()
+    view_model = {
+        "community": {"name": "Example", "floorPlans": []},
+        "floorPlans": VIEW_MODEL["floorPlans"] * 2,
+        "allSpecials": VIEW_MODEL["allSpecials"],
+    }
+    body = (
+        "<html><head><script>var vm = window.udr.jsonObjPropertyViewModel || {};</script>"
+        f"<script>window.udr.jsonObjPropertyViewModel={json.dumps(view_model)};</script>"
+        "</head><body><script>{}</script></body></html>"
+    )
+    results = list(spider.parse(make_response(body)))
+
+    assert [type(r).__name__ for r in results] == ["UnitItem", "UnitItem", "PromoItem"]
+    assert results[0]["property_url"] == URL
+    assert results[2]["text"] == "One month free"
+    assert spider.crawler.stats.get_value("udr/fast_path_parsed") == 1
+
+
+def test_view_model_truncated_after_items_does_not_fall_back():
+    spider = make_spider()
+    view_model = json.dumps(VIEW_MODEL)
+    truncated = view_model[: view_model.index("]}]") + 3] + ', {"units": [{'
+    results = list(spider.parse(make_response(page_with_view_model(truncated))))
+
+    assert [type(r).__name__ for r in results] == ["PromoItem", "UnitItem"]
+    assert spider.crawler.stats.get_value("udr/view_model_errors") == 1
+    assert spider.crawler.stats.get_value("udr/playwright_fallbacks") is None